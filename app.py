@@ -1,5 +1,6 @@
 import os
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for
+import uuid
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, jsonify, abort
 from werkzeug.utils import secure_filename
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
@@ -11,19 +12,21 @@ from flask_admin.contrib.sqla import ModelView
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError
 
-from functions.txt_to_pdf import convert_text_to_pdf
-from functions.imagem_to_pdf import imagem_para_pdf
-from functions.html_to_pdf import html_para_pdf
-from modules.pdf_manager import mesclar_pdfs
-from modules.pdf_generator import PdfGenerator
-from configs.config_manager import carregar_config
+from modules.pdf_manager import ler_operacoes
+from configs.config_manager import perfis
+from modules.job_queue import JobQueue, CONCLUIDO, FALHOU, executar_conversao, copiar_resultado
+from modules.result_cache import cache_resultados, chave_conversao
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['SECRET_KEY'] = 'supersecretkey'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['OUTPUT_FOLDER'] = 'outputs'
+app.config['JOBS_DATABASE'] = 'jobs.sqlite'
+app.config['JOB_WORKERS'] = max(1, (os.cpu_count() or 2) // 2)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -106,6 +109,104 @@ def init_db():
             db.session.add(premium_plan)
             db.session.commit()
 
+def _on_job_finished(job):
+    """Refunds the quota reserved by enqueue_job when a background job fails."""
+    if job['status'] != FALHOU or job['usuario_id'] is None:
+        return
+    with app.app_context():
+        user = User.query.get(job['usuario_id'])
+        if user:
+            user.quota_left += 1
+            db.session.commit()
+
+# Started lazily (submit, or a job lookup) so importing the app never spawns the worker pool.
+job_queue = JobQueue(app.config['JOBS_DATABASE'], max_workers=app.config['JOB_WORKERS'], on_finish=_on_job_finished)
+result_cache = cache_resultados()
+
+def save_uploads(files):
+    """Saves uploaded files in a per-request folder so concurrent conversions never overwrite each other's inputs."""
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], uuid.uuid4().hex)
+    os.makedirs(folder, exist_ok=True)
+    filepaths = []
+    for file in files:
+        filepath = os.path.join(folder, secure_filename(file.filename))
+        file.save(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+def wants_async():
+    return request.values.get('async', '').lower() in ('1', 'true', 'on', 'sim')
+
+def wants_optimize():
+    return request.values.get('optimize', '').lower() in ('1', 'true', 'on', 'sim')
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+
+def charge_quota():
+    current_user.quota_left -= 1
+    db.session.commit()
+
+def enqueue_job(kind, params, output_name):
+    """
+    Submits a conversion to the job queue and answers with the job id. The
+    quota is reserved here, so queued jobs count against it; a job that fails
+    gets it back in _on_job_finished.
+    """
+    params['saida'] = os.path.abspath(os.path.join(app.config['OUTPUT_FOLDER'], f"{uuid.uuid4().hex}.pdf"))
+    cached = result_cache.obter(params['chave_cache'])
+    charge_quota()
+    try:
+        if cached is not None:
+            # Cache hit: the job is born finished.
+            copiar_resultado(cached, params['saida'])
+            job_id = job_queue.submit(kind, params, usuario_id=current_user.id, nome_saida=output_name, concluido=True)
+        else:
+            job_id = job_queue.submit(kind, params, usuario_id=current_user.id, nome_saida=output_name)
+    except Exception:
+        current_user.quota_left += 1
+        db.session.commit()
+        raise
+    if wants_json():
+        return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+    return redirect(url_for('job_status', job_id=job_id), code=303)
+
+def run_conversion(kind, filepaths, output_name, config=None, profile=None, **options):
+    """
+    Runs a conversion through the result cache, in the background when the
+    client asked for it. Identical inputs (same bytes, config and options)
+    reuse the stored PDF, and concurrent identical requests share one build.
+    Returns the response, or None if the conversion failed.
+    """
+    if wants_optimize():
+        options['otimizar'] = True
+    params = {'entradas': filepaths, 'config': config, 'perfil': profile, **options}
+    params['chave_cache'] = chave_conversao(kind, filepaths, config, options)
+    if wants_async():
+        return enqueue_job(kind, params, output_name)
+
+    # An open handle keeps the PDF readable even if the cache evicts it before the response is sent.
+    pdf, _ = result_cache.abrir_ou_gerar(params['chave_cache'], lambda saida: executar_conversao(kind, params, saida))
+    if pdf is None:
+        return None
+    charge_quota()
+    return send_file(pdf, mimetype='application/pdf', as_attachment=True, download_name=output_name)
+
+def user_profile():
+    """Profile for this request, as {'nome', 'usuario'}: the one named in the form (the user's own first), or 'default'."""
+    return {'nome': request.values.get('profile') or 'default', 'usuario': current_user.id}
+
+def user_config(profile):
+    """Configuration of `profile`; the conversion compiles it with perfis().compilado(**profile)."""
+    return perfis().config(**profile)
+
+def get_user_job(job_id):
+    job_queue.iniciar()  # A job left queued by a previous run starts once its owner checks on it
+    job = job_queue.get(job_id)
+    if job is None or job['usuario_id'] != current_user.id:
+        abort(404)
+    return job
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -170,26 +271,14 @@ def txt_to_pdf_latex_route():
     if not output_name.endswith('.pdf'):
         output_name += '.pdf'
 
-    filepaths = []
-    for file in files:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        filepaths.append(filepath)
-
-    config = carregar_config()
-    text_blocks = []
-    for path in filepaths:
-        with open(path, 'r', encoding='utf-8') as f:
-            text_blocks.append(f.read())
+    filepaths = save_uploads(files)
 
-    if convert_text_to_pdf(text_blocks, output_name, config, process_latex=True):
-        current_user.quota_left -= 1
-        db.session.commit()
-        return send_file(output_name, as_attachment=True)
-    else:
+    profile = user_profile()
+    response = run_conversion('txt', filepaths, output_name, config=user_config(profile), profile=profile, process_latex=True)
+    if response is None:
         flash('Error converting text to PDF')
         return redirect(url_for('index'))
+    return response
 
 @app.route('/txt-to-pdf', methods=['POST'])
 @login_required
@@ -212,26 +301,14 @@ def txt_to_pdf_route():
     if not output_name.endswith('.pdf'):
         output_name += '.pdf'
 
-    filepaths = []
-    for file in files:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        filepaths.append(filepath)
-
-    config = carregar_config()
-    text_blocks = []
-    for path in filepaths:
-        with open(path, 'r', encoding='utf-8') as f:
-            text_blocks.append(f.read())
+    filepaths = save_uploads(files)
 
-    if convert_text_to_pdf(text_blocks, output_name, config):
-        current_user.quota_left -= 1
-        db.session.commit()
-        return send_file(output_name, as_attachment=True)
-    else:
+    profile = user_profile()
+    response = run_conversion('txt', filepaths, output_name, config=user_config(profile), profile=profile)
+    if response is None:
         flash('Error converting text to PDF')
         return redirect(url_for('index'))
+    return response
 
 @app.route('/image-to-pdf', methods=['POST'])
 @login_required
@@ -254,20 +331,12 @@ def image_to_pdf_route():
     if not output_name.endswith('.pdf'):
         output_name += '.pdf'
 
-    filepaths = []
-    for file in files:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        filepaths.append(filepath)
-
-    if imagem_para_pdf(filepaths, output_name):
-        current_user.quota_left -= 1
-        db.session.commit()
-        return send_file(output_name, as_attachment=True)
-    else:
+    filepaths = save_uploads(files)
+    response = run_conversion('image', filepaths, output_name)
+    if response is None:
         flash('Error converting images to PDF')
         return redirect(url_for('index'))
+    return response
 
 @app.route('/html-to-pdf', methods=['POST'])
 @login_required
@@ -290,17 +359,12 @@ def html_to_pdf_route():
     if not output_name.endswith('.pdf'):
         output_name += '.pdf'
 
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-
-    if html_para_pdf(filepath, output_name):
-        current_user.quota_left -= 1
-        db.session.commit()
-        return send_file(output_name, as_attachment=True)
-    else:
+    filepath = save_uploads([file])[0]
+    response = run_conversion('html', [filepath], output_name)
+    if response is None:
         flash('Error converting HTML to PDF')
         return redirect(url_for('index'))
+    return response
 
 @app.route('/merge-pdfs', methods=['POST'])
 @login_required
@@ -323,20 +387,103 @@ def merge_pdfs_route():
     if not output_name.endswith('.pdf'):
         output_name += '.pdf'
 
-    filepaths = []
-    for file in files:
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        filepaths.append(filepath)
-
-    if mesclar_pdfs(filepaths, output_name):
-        current_user.quota_left -= 1
-        db.session.commit()
-        return send_file(output_name, as_attachment=True)
-    else:
+    filepaths = save_uploads(files)
+    # Optional page selection per file, in upload order: "1-3;all;2-"
+    page_ranges = request.form.get('page_ranges', '').strip()
+    options = {}
+    if page_ranges:
+        ranges = [r.strip() or None for r in page_ranges.split(';')]
+        options['intervalos'] = (ranges + [None] * len(filepaths))[:len(filepaths)]
+    response = run_conversion('merge', filepaths, output_name, **options)
+    if response is None:
         flash('Error merging PDFs')
         return redirect(url_for('index'))
+    return response
+
+@app.route('/pdf-pages', methods=['POST'])
+@login_required
+def pdf_pages_route():
+    if current_user.quota_left <= 0:
+        flash('You have no quota left. Please upgrade your plan.')
+        return redirect(url_for('index'))
+
+    if 'pdf_file' not in request.files:
+        flash('No file part')
+        return redirect(request.url)
+    file = request.files['pdf_file']
+    if file.filename == '':
+        flash('No selected file')
+        return redirect(request.url)
+
+    output_name = request.form['output_name']
+    if not output_name:
+        output_name = "output.pdf"
+    if not output_name.endswith('.pdf'):
+        output_name += '.pdf'
+
+    # Operations such as "remover 2-4; girar 1 90; branca 0; manter 3,1-2"
+    try:
+        operations = ler_operacoes(request.form.get('operations', ''))
+    except ValueError as e:
+        flash(f'Invalid page operations: {e}')
+        return redirect(url_for('index'))
+    if not operations:
+        flash('No page operations given')
+        return redirect(url_for('index'))
+
+    filepath = save_uploads([file])[0]
+    response = run_conversion('pages', [filepath], output_name, operacoes=operations)
+    if response is None:
+        flash('Error editing PDF pages')
+        return redirect(url_for('index'))
+    return response
+
+@app.route('/profiles')
+@login_required
+def list_profiles():
+    return jsonify({'profiles': perfis().listar(usuario=current_user.id)})
+
+@app.route('/profiles/<name>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def user_profile(name):
+    store = perfis()
+    if request.method == 'PUT':
+        config = request.get_json(silent=True)
+        if not isinstance(config, dict):
+            abort(400)
+        try:
+            store.salvar(name, config, usuario=current_user.id)
+        except ValueError:
+            abort(400)
+        return jsonify({'profile': name, 'config': store.obter(name, usuario=current_user.id)})
+    if request.method == 'DELETE':
+        if not store.remover(name, usuario=current_user.id):
+            abort(404)
+        return '', 204
+    config = store.obter(name, usuario=current_user.id)
+    if config is None:
+        abort(404)
+    return jsonify({'profile': name, 'config': config})
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = get_user_job(job_id)
+    info = {'job_id': job['id'], 'status': job['status'], 'error': job['erro'], 'output_name': job['nome_saida']}
+    if job['status'] == CONCLUIDO:
+        info['download_url'] = url_for('job_download', job_id=job_id)
+    if wants_json():
+        return jsonify(info)
+    return render_template('job.html', title='Conversion job', job=info)
+
+@app.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    job = get_user_job(job_id)
+    if job['status'] != CONCLUIDO:
+        abort(409)
+    return send_file(job['params']['saida'], as_attachment=True, download_name=job['nome_saida'] or 'output.pdf',
+                     etag=job['params'].get('chave_cache', True))
 
 app.config['STRIPE_PUBLIC_KEY'] = 'pk_test_... '
 app.config['STRIPE_SECRET_KEY'] = 'sk_test_... '
@@ -410,4 +557,5 @@ def stripe_webhook():
 
 if __name__ == '__main__':
     init_db()
+    job_queue.iniciar()  # Jobs left in the queue by a previous run start right away
     app.run(debug=True, use_reloader=False)
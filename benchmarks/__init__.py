@@ -0,0 +1 @@
+"""Benchmarks reproduzíveis dos conversores (ver `benchmarks.run`)."""
@@ -0,0 +1,167 @@
+"""
+Geradores determinísticos dos corpora dos benchmarks.
+
+Tudo sai de um `random.Random(semente)`, então a mesma escala gera sempre os
+mesmos textos, imagens e PDFs, byte a byte (dentro da mesma versão das
+bibliotecas), e os números de execuções diferentes são comparáveis.
+"""
+import os
+import random
+
+SEMENTE = 20240601
+
+_PALAVRAS = (
+    "documento página fórmula tabela imagem código texto sistema dados arquivo "
+    "processo resultado análise modelo estrutura conteúdo capítulo seção exemplo "
+    "valor função parâmetro configuração desempenho memória tempo saída entrada"
+).split()
+
+
+def _frase(rng, minimo=8, maximo=20):
+    palavras = [rng.choice(_PALAVRAS) for _ in range(rng.randint(minimo, maximo))]
+    return " ".join(palavras).capitalize() + "."
+
+
+def _paragrafo(rng, frases=5):
+    return " ".join(_frase(rng) for _ in range(frases))
+
+
+def prosa_longa(escala=1.0, semente=SEMENTE):
+    """Markdown corrido: parágrafos longos com ênfase, notas de rodapé e poucos títulos."""
+    rng = random.Random(semente)
+    partes = []
+    for capitulo in range(max(1, int(10 * escala))):
+        partes.append(f"# Capítulo {capitulo + 1}\n")
+        for _ in range(40):
+            texto = _paragrafo(rng)
+            if rng.random() < 0.3:
+                texto = texto.replace(" ", " **", 1).replace(".", "**.", 1)
+            partes.append(texto + "\n")
+        partes.append(f"{_frase(rng)}[^c{capitulo + 1}]\n")
+        partes.append(f"[^c{capitulo + 1}]: {_frase(rng)}\n")
+    return "\n".join(partes)
+
+
+def titulos_densos(escala=1.0, semente=SEMENTE):
+    """Muitos títulos curtos (sumário grande) com pouco texto entre eles."""
+    rng = random.Random(semente)
+    partes = []
+    for capitulo in range(max(1, int(30 * escala))):
+        partes.append(f"# {capitulo + 1}. {_frase(rng, 2, 5)[:-1]}\n")
+        for secao in range(8):
+            partes.append(f"## {capitulo + 1}.{secao + 1} {_frase(rng, 2, 5)[:-1]}\n")
+            partes.append(_paragrafo(rng, 2) + "\n")
+    return "\n".join(partes)
+
+
+def formulas_latex(escala=1.0, semente=SEMENTE):
+    """Texto com fórmulas LaTeX em bloco, repetidas em parte (como em apostilas)."""
+    rng = random.Random(semente)
+    modelos = [
+        r"\int_0^{%d} x^{%d}\,dx = \frac{%d^{%d}}{%d}",
+        r"\sum_{k=1}^{%d} k^{%d} \approx \frac{%d^{%d}}{%d}",
+        r"\frac{\partial^{%d} f}{\partial x^{%d}} = %d x^{%d} + %d",
+    ]
+    partes = []
+    for indice in range(max(1, int(60 * escala))):
+        if indice % 10 == 0:
+            partes.append(f"# Lista {indice // 10 + 1}\n")
+        a, b, c = rng.randint(1, 9), rng.randint(1, 5), rng.randint(2, 7)
+        formula = rng.choice(modelos) % (a, b, a, b + 1, c)
+        partes.append(_paragrafo(rng, 2) + "\n")
+        partes.append(f"$${formula}$$\n")
+    return "\n".join(partes)
+
+
+def tabelas_grandes(escala=1.0, semente=SEMENTE):
+    """Tabelas Markdown longas (atravessam várias páginas)."""
+    rng = random.Random(semente)
+    partes = []
+    for tabela in range(max(1, int(5 * escala))):
+        partes.append(f"# Tabela {tabela + 1}\n")
+        partes.append("| Código | Descrição | Quantidade | Valor |")
+        partes.append("|---|---|---|---|")
+        for linha in range(200):
+            partes.append(f"| {tabela + 1}-{linha + 1:04d} | {_frase(rng, 3, 6)} | {rng.randint(1, 999)} | {rng.uniform(1, 9999):.2f} |")
+        partes.append("")
+    return "\n".join(partes)
+
+
+def gerar_imagens(pasta, quantidade, tamanho=(2400, 1600), semente=SEMENTE, formatos=("JPEG", "PNG")):
+    """Grava `quantidade` imagens sintéticas (gradientes com ruído) e retorna os caminhos."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = []
+    for indice in range(quantidade):
+        formato = formatos[indice % len(formatos)]
+        base = tuple(rng.randint(0, 255) for _ in range(3))
+        img = Image.new("RGB", tamanho, base)
+        desenho = ImageDraw.Draw(img)
+        for _ in range(60):
+            x, y = rng.randint(0, tamanho[0]), rng.randint(0, tamanho[1])
+            raio = rng.randint(20, tamanho[0] // 6)
+            cor = tuple(rng.randint(0, 255) for _ in range(3))
+            desenho.ellipse((x - raio, y - raio, x + raio, y + raio), fill=cor)
+        extensao = "jpg" if formato == "JPEG" else "png"
+        caminho = os.path.join(pasta, f"imagem_{indice:04d}.{extensao}")
+        img.save(caminho, format=formato, **({"quality": 90} if formato == "JPEG" else {}))
+        caminhos.append(caminho)
+    return caminhos
+
+
+def documento_com_imagens(pasta, escala=1.0, semente=SEMENTE):
+    """Markdown com imagens grandes entre os parágrafos (exercita a redução de imagens)."""
+    rng = random.Random(semente)
+    imagens = gerar_imagens(os.path.join(pasta, "imagens_doc"), max(1, int(12 * escala)), semente=semente)
+    partes = []
+    for indice, caminho in enumerate(imagens):
+        partes.append(f"# Figura {indice + 1}\n")
+        partes.append(_paragrafo(rng, 3) + "\n")
+        partes.append(f"![Figura {indice + 1}]({caminho})\n")
+    return "\n".join(partes)
+
+
+def gerar_pdfs(pasta, quantidade, paginas=20, semente=SEMENTE):
+    """Grava `quantidade` PDFs de texto com uma fonte e um logotipo repetidos (para a mesclagem)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen.canvas import Canvas
+
+    rng = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = []
+    for indice in range(quantidade):
+        caminho = os.path.join(pasta, f"entrada_{indice:04d}.pdf")
+        canvas = Canvas(caminho, pagesize=A4, invariant=1)
+        for pagina in range(paginas):
+            canvas.setFillColorRGB(0.1, 0.2, 0.5)
+            canvas.rect(40, A4[1] - 80, 120, 40, fill=1, stroke=0)
+            canvas.setFillColorRGB(0, 0, 0)
+            canvas.setFont("Helvetica", 10)
+            y = A4[1] - 120
+            while y > 60:
+                canvas.drawString(40, y, _frase(rng, 8, 14))
+                y -= 14
+            canvas.drawString(A4[0] / 2, 30, f"{indice + 1}.{pagina + 1}")
+            canvas.showPage()
+        canvas.save()
+        caminhos.append(caminho)
+    return caminhos
+
+
+def documento_html(pasta, escala=1.0, semente=SEMENTE):
+    """Página HTML autocontida com títulos, parágrafos e uma tabela."""
+    rng = random.Random(semente)
+    corpo = []
+    for secao in range(max(1, int(20 * escala))):
+        corpo.append(f"<h2>Seção {secao + 1}</h2>")
+        corpo.extend(f"<p>{_paragrafo(rng, 4)}</p>" for _ in range(6))
+        linhas = "".join(f"<tr><td>{i}</td><td>{_frase(rng, 3, 6)}</td><td>{rng.randint(1, 999)}</td></tr>" for i in range(15))
+        corpo.append(f"<table border='1'><tr><th>#</th><th>Descrição</th><th>Valor</th></tr>{linhas}</table>")
+    caminho = os.path.join(pasta, "documento.html")
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Benchmark</title>"
+                "<style>body{font-family:sans-serif} table{border-collapse:collapse}</style></head><body>"
+                + "".join(corpo) + "</body></html>")
+    return caminho
@@ -0,0 +1,302 @@
+"""
+Benchmarks dos conversores.
+
+    python -m benchmarks.run run --escala 1 --repeticoes 3 --saida resultados.json
+    python -m benchmarks.run run --cenarios prosa_longa mesclar --baseline baseline.json
+    python -m benchmarks.run compare resultados.json baseline.json --tolerancia 0.15
+
+Os corpora são gerados de forma determinística (ver `benchmarks.corpus`) antes
+da medição. Cada repetição roda em um processo novo, com um diretório de cache
+vazio (BORGEPDF_CACHE_DIR), então fórmulas, fontes e segmentos nunca vêm de
+uma execução anterior e o pico de memória é o da própria conversão. O
+resultado é um JSON com tempo (mediana e mínimo), páginas por segundo, pico
+de RSS e tamanho da saída de cada cenário; `compare` aponta as métricas que
+pioraram além da tolerância em relação a uma baseline e termina com código 1.
+Cenários cujas ferramentas externas não estão no PATH (ex.: `latex` e
+`dvipng` para as fórmulas) são pulados em vez de medir uma conversão que
+descarta o conteúdo.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import multiprocessing
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
+
+from . import corpus
+
+# Métricas comparadas com a baseline (todas pioram quando aumentam)
+METRICAS = ("segundos", "pico_rss_mb", "tamanho_bytes")
+_BIBLIOTECAS = ("reportlab", "pypdf", "pillow", "markdown", "weasyprint", "pikepdf")
+# Marcadores internos do Markdown (stash de HTML, espaço das notas de rodapé) que nunca podem chegar ao PDF
+_MARCADORES_RE = re.compile(r"[\x02\x03]|wzxhzdk:\d+|qq\d+zz")
+
+
+# Programas externos sem os quais o cenário não mede o que promete (a conversão "funciona" sem eles)
+REQUISITOS = {"formulas_latex": ("latex", "dvipng")}
+
+
+def _gravar(pasta, nome, texto):
+    caminho = os.path.join(pasta, f"{nome}.txt")
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(texto)
+    return caminho
+
+
+# Preparação (fora da medição): nome -> função(pasta, escala) que devolve o contexto do cenário
+PREPARACAO = {
+    "prosa_longa": lambda pasta, escala: {"texto": _gravar(pasta, "prosa", corpus.prosa_longa(escala))},
+    "titulos_sumario": lambda pasta, escala: {
+        "texto": _gravar(pasta, "titulos", corpus.titulos_densos(escala)),
+        "config": {"incluir_sumario": True},
+    },
+    "formulas_latex": lambda pasta, escala: {
+        "texto": _gravar(pasta, "formulas", corpus.formulas_latex(escala)),
+        "latex": True,
+    },
+    "tabelas_grandes": lambda pasta, escala: {"texto": _gravar(pasta, "tabelas", corpus.tabelas_grandes(escala))},
+    "documento_imagens": lambda pasta, escala: {"texto": _gravar(pasta, "imagens", corpus.documento_com_imagens(pasta, escala))},
+    "mesclar": lambda pasta, escala: {"pdfs": corpus.gerar_pdfs(os.path.join(pasta, "pdfs"), max(2, int(50 * escala)))},
+    "imagens_upload": lambda pasta, escala: {
+        "imagens": corpus.gerar_imagens(os.path.join(pasta, "upload"), max(1, int(40 * escala)), tamanho=(3000, 2000)),
+    },
+    "html": lambda pasta, escala: {"html": corpus.documento_html(pasta, escala)},
+}
+
+
+def _config(extras):
+    from configs.config_manager import get_default_config
+
+    config = get_default_config()
+    config.update({"incluir_capa": False, "incluir_sumario": False, "capa_data": "2024-06-01"})
+    config.update(extras or {})
+    return config
+
+
+def _executar_texto(contexto, saida):
+    from modules.pdf_generator import PdfGenerator
+
+    with open(contexto["texto"], encoding="utf-8") as f:
+        texto = f.read()
+    PdfGenerator(_config(contexto.get("config"))).build([texto], saida, contexto.get("latex", False))
+    return True
+
+
+def _executar_mesclar(contexto, saida):
+    from modules.pdf_manager import mesclar_pdfs
+    return mesclar_pdfs(contexto["pdfs"], saida)
+
+
+def _executar_imagens(contexto, saida):
+    from functions.imagem_to_pdf import imagem_para_pdf
+    return imagem_para_pdf(contexto["imagens"], saida, pagina="A4", dpi=150)
+
+
+def _executar_html(contexto, saida):
+    from functions.html_to_pdf import html_para_pdf
+    return html_para_pdf(contexto["html"], saida)
+
+
+EXECUCAO = {
+    "prosa_longa": _executar_texto,
+    "titulos_sumario": _executar_texto,
+    "formulas_latex": _executar_texto,
+    "tabelas_grandes": _executar_texto,
+    "documento_imagens": _executar_texto,
+    "mesclar": _executar_mesclar,
+    "imagens_upload": _executar_imagens,
+    "html": _executar_html,
+}
+
+
+def _pico_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _iniciar_worker(pasta_cache):
+    os.environ["BORGEPDF_CACHE_DIR"] = pasta_cache
+
+
+def _medir(nome, contexto, saida):
+    """Roda um cenário no processo atual (um processo novo por repetição)."""
+    inicio = time.perf_counter()
+    ok = EXECUCAO[nome](contexto, saida)
+    segundos = time.perf_counter() - inicio
+    if not ok or not os.path.exists(saida):
+        raise RuntimeError("a conversão falhou")
+
+    from pypdf import PdfReader
+    leitor = PdfReader(saida)
+    if "texto" in contexto:
+        # Verificação de regressão fora da medição: o texto extraído não pode trazer marcadores do Markdown
+        for numero, pagina in enumerate(leitor.pages, 1):
+            marcador = _MARCADORES_RE.search(pagina.extract_text() or "")
+            if marcador:
+                raise RuntimeError(f"marcador interno do Markdown na página {numero}: {marcador.group()!r}")
+    return {
+        "segundos": segundos,
+        "pico_rss_mb": _pico_rss_mb(),
+        "tamanho_bytes": os.path.getsize(saida),
+        "paginas": len(leitor.pages),
+    }
+
+
+def executar_cenario(nome, pasta, escala=1.0, repeticoes=3):
+    """Prepara o corpus do cenário e mede `repeticoes` execuções; retorna o resumo."""
+    faltando = [programa for programa in REQUISITOS.get(nome, ()) if shutil.which(programa) is None]
+    if faltando:
+        return {"pulado": f"{', '.join(faltando)} fora do PATH"}
+    contexto = PREPARACAO[nome](pasta, escala)
+    medicoes = []
+    spawn = multiprocessing.get_context("spawn")
+    for repeticao in range(repeticoes):
+        pasta_cache = tempfile.mkdtemp(prefix="borgepdf_bench_cache_")
+        saida = os.path.join(pasta, f"{nome}_{repeticao}.pdf")
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn, initializer=_iniciar_worker, initargs=(pasta_cache,)) as pool:
+                medicoes.append(pool.submit(_medir, nome, contexto, saida).result())
+        except Exception as e:
+            return {"erro": str(e)}
+        finally:
+            shutil.rmtree(pasta_cache, ignore_errors=True)
+
+    tempos = [m["segundos"] for m in medicoes]
+    mediana = statistics.median(tempos)
+    picos = [m["pico_rss_mb"] for m in medicoes if m["pico_rss_mb"] is not None]
+    return {
+        "segundos": round(mediana, 4),
+        "segundos_min": round(min(tempos), 4),
+        "execucoes": [round(t, 4) for t in tempos],
+        "paginas": medicoes[-1]["paginas"],
+        "paginas_por_segundo": round(medicoes[-1]["paginas"] / mediana, 2) if mediana else None,
+        "pico_rss_mb": max(picos) if picos else None,
+        "tamanho_bytes": medicoes[-1]["tamanho_bytes"],
+    }
+
+
+def _ambiente():
+    versoes = {}
+    for biblioteca in _BIBLIOTECAS:
+        try:
+            versoes[biblioteca] = metadata.version(biblioteca)
+        except metadata.PackageNotFoundError:
+            versoes[biblioteca] = None
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "bibliotecas": versoes,
+    }
+
+
+def rodar(cenarios=None, escala=1.0, repeticoes=3):
+    """Executa os cenários (todos, por padrão) e retorna o resultado completo."""
+    resultado = {"escala": escala, "repeticoes": repeticoes, "ambiente": _ambiente(), "cenarios": {}}
+    with tempfile.TemporaryDirectory(prefix="borgepdf_bench_") as pasta:
+        for nome in cenarios or PREPARACAO:
+            print(f"⏱️ {nome}...", flush=True)
+            pasta_cenario = os.path.join(pasta, nome)
+            os.makedirs(pasta_cenario)
+            resumo = executar_cenario(nome, pasta_cenario, escala, repeticoes)
+            resultado["cenarios"][nome] = resumo
+            if "erro" in resumo:
+                print(f"   ❌ {resumo['erro']}")
+            elif "pulado" in resumo:
+                print(f"   ⏭️ pulado: {resumo['pulado']}")
+            else:
+                print(f"   {resumo['segundos']:.3f}s, {resumo['paginas']} páginas "
+                      f"({resumo['paginas_por_segundo']} pág/s), pico {resumo['pico_rss_mb']} MB, "
+                      f"{resumo['tamanho_bytes'] / 1024:.0f} KB")
+    return resultado
+
+
+def comparar(atual, baseline, tolerancia=0.10):
+    """
+    Compara dois resultados e retorna a lista de regressões: métricas que
+    pioraram mais que `tolerancia` (fração) e cenários que passaram a falhar.
+    """
+    regressoes = []
+    if atual.get("escala") != baseline.get("escala"):
+        print(f"⚠️ Escalas diferentes: {atual.get('escala')} x {baseline.get('escala')} (baseline).")
+    for nome, base in baseline.get("cenarios", {}).items():
+        agora = atual.get("cenarios", {}).get(nome)
+        if agora is None:
+            continue
+        if "pulado" in agora and "pulado" not in base:
+            print(f"⚠️ {nome} foi pulado ({agora['pulado']}) e não foi comparado com a baseline.")
+            continue
+        if "erro" in agora and "erro" not in base:
+            regressoes.append({"cenario": nome, "metrica": "erro", "baseline": None, "atual": agora["erro"]})
+            continue
+        for metrica in METRICAS:
+            antes, depois = base.get(metrica), agora.get(metrica)
+            if antes and depois is not None and depois > antes * (1 + tolerancia):
+                regressoes.append({
+                    "cenario": nome, "metrica": metrica, "baseline": antes, "atual": depois,
+                    "variacao": round(depois / antes - 1, 4),
+                })
+    return regressoes
+
+
+def _relatar(regressoes, tolerancia):
+    if not regressoes:
+        print(f"✅ Nenhuma regressão acima de {tolerancia:.0%}.")
+        return 0
+    print(f"❌ {len(regressoes)} regressão(ões) acima de {tolerancia:.0%}:")
+    for r in regressoes:
+        if r["metrica"] == "erro":
+            print(f"   {r['cenario']}: passou a falhar ({r['atual']})")
+        else:
+            print(f"   {r['cenario']}.{r['metrica']}: {r['baseline']} → {r['atual']} ({r['variacao']:+.0%})")
+    return 1
+
+
+def _ler_json(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description="Benchmarks reproduzíveis do BorgePDF.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    rodar_cmd = comandos.add_parser("run", help="executa os cenários")
+    rodar_cmd.add_argument("--cenarios", nargs="+", choices=sorted(PREPARACAO), help="cenários a executar (padrão: todos)")
+    rodar_cmd.add_argument("--escala", type=float, default=1.0, help="multiplica o tamanho dos corpora")
+    rodar_cmd.add_argument("--repeticoes", type=int, default=3, help="execuções por cenário (vale a mediana)")
+    rodar_cmd.add_argument("--saida", help="grava o resultado em JSON")
+    rodar_cmd.add_argument("--baseline", help="compara com este resultado ao final")
+    rodar_cmd.add_argument("--tolerancia", type=float, default=0.10, help="piora aceita antes de acusar regressão (0.10 = 10%%)")
+    comparar_cmd = comandos.add_parser("compare", help="compara um resultado com a baseline")
+    comparar_cmd.add_argument("atual")
+    comparar_cmd.add_argument("baseline")
+    comparar_cmd.add_argument("--tolerancia", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.comando == "compare":
+        return _relatar(comparar(_ler_json(args.atual), _ler_json(args.baseline), args.tolerancia), args.tolerancia)
+
+    resultado = rodar(args.cenarios, args.escala, args.repeticoes)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultado salvo em {args.saida}")
+    if args.baseline:
+        return _relatar(comparar(resultado, _ler_json(args.baseline), args.tolerancia), args.tolerancia)
+    return 1 if any("erro" in r for r in resultado["cenarios"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
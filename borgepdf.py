@@ -0,0 +1,230 @@
+"""
+BorgePDF em linha de comando, sem perguntas no terminal.
+
+    python borgepdf.py batch manifesto.json --perfil livro --workers 4 --relatorio resumo.json
+    python borgepdf.py watch capitulos/ livro.pdf --perfil livro --latex
+
+O manifesto é um JSON (lista de jobs, ou {"perfil": ..., "jobs": [...]}) ou
+um CSV com as colunas tipo, entradas (separadas por ";"), saida e, opcionais,
+perfil, otimizar e opcoes (um objeto JSON). Tipos: txt, latex, image, html,
+merge, pages e optimize. Caminhos relativos são resolvidos a partir da pasta
+do manifesto.
+
+`watch` reconstrói o PDF de uma pasta de capítulos .txt a cada alteração,
+renderizando de novo só os capítulos que mudaram.
+
+Exemplo de job JSON:
+
+    {"tipo": "txt", "entradas": ["cap1.txt", "cap2.txt"], "saida": "livro.pdf",
+     "perfil": "livro", "config": {"incluir_capa": true}, "otimizar": true}
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from configs.config_manager import perfis
+from modules.job_queue import executar_conversao, _aquecer_worker
+
+TIPOS = ("txt", "latex", "image", "html", "merge", "pages", "optimize")
+# Chaves do job que não viram parâmetros do conversor
+_CHAVES_JOB = {"tipo", "entradas", "entrada", "saida", "perfil", "config"}
+ERRO_WORKER_ENCERRADO = "o processo do worker foi encerrado (falta de memória?)"
+
+
+def ler_manifesto(caminho):
+    """Lê os jobs de um manifesto JSON ou CSV; retorna (jobs, perfil padrão do manifesto)."""
+    if caminho.lower().endswith(".csv"):
+        with open(caminho, newline="", encoding="utf-8") as f:
+            jobs = []
+            for linha in csv.DictReader(f):
+                job = json.loads(linha.get("opcoes") or "{}")
+                job.update({
+                    "tipo": linha["tipo"].strip(),
+                    "entradas": [e.strip() for e in linha["entradas"].split(";") if e.strip()],
+                    "saida": linha["saida"].strip(),
+                })
+                if (linha.get("perfil") or "").strip():
+                    job["perfil"] = linha["perfil"].strip()
+                if (linha.get("otimizar") or "").strip():
+                    job["otimizar"] = linha["otimizar"].strip().lower() in ("1", "true", "s", "sim")
+                jobs.append(job)
+        return jobs, None
+
+    with open(caminho, encoding="utf-8") as f:
+        dados = json.load(f)
+    jobs, perfil = (dados.get("jobs", []), dados.get("perfil")) if isinstance(dados, dict) else (dados, None)
+    if not isinstance(jobs, list):
+        raise ValueError("os jobs devem ser uma lista")
+    return jobs, perfil
+
+
+def preparar_job(job, base, perfil_padrao):
+    """Valida um job do manifesto e o converte em (tipo, params) para `executar_conversao`."""
+    if not isinstance(job, dict):
+        raise ValueError(f"o job deve ser um objeto, não {type(job).__name__}")
+    tipo = job.get("tipo")
+    if tipo not in TIPOS:
+        raise ValueError(f"tipo inválido: {tipo!r} (use {', '.join(TIPOS)})")
+    entradas = job.get("entradas") or ([job["entrada"]] if job.get("entrada") else [])
+    if not entradas or not job.get("saida"):
+        raise ValueError("informe 'entradas' e 'saida'")
+    entradas = [os.path.join(base, e) for e in entradas]
+    faltando = [e for e in entradas if not os.path.exists(e)]
+    if faltando:
+        raise ValueError(f"entrada(s) não encontrada(s): {', '.join(faltando)}")
+
+    params = {chave: valor for chave, valor in job.items() if chave not in _CHAVES_JOB}
+    params["entradas"] = entradas
+    params["saida"] = os.path.join(base, job["saida"])
+    if tipo in ("txt", "latex"):
+        nome = job.get("perfil") or perfil_padrao
+        params["config"] = {**perfis().config(nome), **job.get("config", {})}
+        params["perfil"] = {"nome": nome}
+        params["process_latex"] = tipo == "latex"
+        tipo = "txt"
+    return tipo, params
+
+
+def executar_item(tipo, params):
+    """Roda um job em um worker; nunca levanta exceção."""
+    inicio = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(params["saida"])), exist_ok=True)
+        ok, erro = bool(executar_conversao(tipo, params, params["saida"])), None
+    except Exception as e:
+        ok, erro = False, str(e)
+    return {"ok": ok, "erro": erro if erro or ok else "a conversão falhou", "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def batch(manifesto, perfil=None, workers=None, relatorio=None):
+    """
+    Executa todos os jobs de `manifesto` em um pool de processos, mostrando o
+    progresso, e grava o resumo em `relatorio` (JSON).
+
+    Se um worker morrer (falta de memória, por exemplo), o pool inteiro
+    quebra e os jobs que não terminaram são executados de novo, um por vez,
+    em um pool novo: assim só o job que derruba o worker fica com falha.
+
+    Returns:
+        int: código de saída (0 = tudo certo, 1 = algum job falhou, 2 = manifesto inválido).
+    """
+    try:
+        jobs, perfil_manifesto = ler_manifesto(manifesto)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Manifesto inválido: {e}")
+        return 2
+    base = os.path.dirname(os.path.abspath(manifesto))
+    perfil = perfil or perfil_manifesto or "default"
+
+    resultados = []
+    pendentes = {}
+    interrompidos = []  # Jobs de um pool quebrado, refeitos isoladamente no fim
+    inicio = time.perf_counter()
+
+    def concluir(resultado):
+        resultados.append(resultado)
+        status = "✅" if resultado["ok"] else f"❌ {resultado['erro']}:"
+        print(f"[{len(resultados)}/{len(jobs)}] {status} {resultado['tipo']} → {resultado['saida']} ({resultado['segundos']}s)")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_aquecer_worker) as pool:
+        for indice, job in enumerate(jobs):
+            valido = isinstance(job, dict)
+            resultado = {"indice": indice, "tipo": job.get("tipo") if valido else None, "saida": job.get("saida") if valido else None}
+            try:
+                tipo, params = preparar_job(job, base, perfil)
+            except (ValueError, TypeError, KeyError) as e:
+                resultado.update(ok=False, erro=str(e), segundos=0)
+                resultados.append(resultado)
+                print(f"[{len(resultados)}/{len(jobs)}] ❌ job {indice + 1}: {e}")
+                continue
+            try:
+                pendentes[pool.submit(executar_item, tipo, params)] = (resultado, tipo, params)
+            except BrokenProcessPool:
+                interrompidos.append((resultado, tipo, params))
+
+        for futuro in as_completed(pendentes):
+            resultado, tipo, params = pendentes[futuro]
+            try:
+                resultado.update(futuro.result())
+            except BrokenProcessPool:
+                interrompidos.append((resultado, tipo, params))
+                continue
+            except Exception as e:
+                resultado.update(ok=False, erro=str(e), segundos=0)
+            concluir(resultado)
+
+    if interrompidos:
+        print(f"⚠️ Um worker foi encerrado; refazendo {len(interrompidos)} job(s), um por vez.")
+        interrompidos.sort(key=lambda item: item[0]["indice"])
+        pool = None
+        try:
+            for resultado, tipo, params in interrompidos:
+                pool = pool or ProcessPoolExecutor(max_workers=1, initializer=_aquecer_worker)
+                try:
+                    resultado.update(pool.submit(executar_item, tipo, params).result())
+                except BrokenProcessPool:
+                    resultado.update(ok=False, erro=ERRO_WORKER_ENCERRADO, segundos=0)
+                    pool.shutdown(wait=False)
+                    pool = None
+                except Exception as e:
+                    resultado.update(ok=False, erro=str(e), segundos=0)
+                concluir(resultado)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    resultados.sort(key=lambda r: r["indice"])
+    falhas = sum(not r["ok"] for r in resultados)
+    resumo = {
+        "manifesto": os.path.abspath(manifesto),
+        "perfil": perfil,
+        "total": len(resultados),
+        "sucesso": len(resultados) - falhas,
+        "falhas": falhas,
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "jobs": resultados,
+    }
+    if relatorio:
+        with open(relatorio, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+    print(f"\n📊 {resumo['sucesso']}/{resumo['total']} job(s) concluído(s), {falhas} com falha, em {resumo['segundos']}s."
+          + (f" Relatório: {relatorio}" if relatorio else ""))
+    return 1 if falhas else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="borgepdf", description="BorgePDF sem menu interativo.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    lote = comandos.add_parser("batch", help="executa um manifesto de conversões (JSON ou CSV)")
+    lote.add_argument("manifesto", help="arquivo .json ou .csv com os jobs")
+    lote.add_argument("--perfil", help="perfil de configuração padrão dos jobs (padrão: o do manifesto ou 'default')")
+    lote.add_argument("--workers", type=int, default=None, help="processos em paralelo (padrão: número de CPUs)")
+    lote.add_argument("--relatorio", help="grava o resumo em JSON neste arquivo")
+    observar = comandos.add_parser("watch", help="reconstrói o PDF de uma pasta de capítulos .txt a cada alteração")
+    observar.add_argument("pasta", help="pasta com os capítulos .txt (em ordem alfabética)")
+    observar.add_argument("saida", help="PDF de saída")
+    observar.add_argument("--perfil", default="default", help="perfil de configuração (padrão: 'default')")
+    observar.add_argument("--latex", action="store_true", help="processa fórmulas LaTeX")
+    observar.add_argument("--intervalo", type=float, default=1.0, help="segundos entre verificações da pasta")
+    args = parser.parse_args(argv)
+
+    if args.comando == "batch":
+        return batch(args.manifesto, args.perfil, args.workers, args.relatorio)
+    if args.comando == "watch":
+        if not os.path.isdir(args.pasta):
+            print(f"❌ Pasta '{args.pasta}' não encontrada.")
+            return 2
+        from functions.txt_to_pdf import assistir_pasta
+        assistir_pasta(args.pasta, args.saida, perfis().config(args.perfil), args.latex, intervalo=args.intervalo,
+                       profile=perfis().compilado(args.perfil))
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,21 @@
+import os
+
 TELEGRAM_TOKEN = 'seu_token'
 CHAT_ID = 'seuiddotelegram'
 # Configurações salvas
 CONFIG_FILE = "configpdf.json"
+
+# Caches em disco (fórmulas LaTeX renderizadas, etc.)
+CACHE_DIR = os.environ.get("BORGEPDF_CACHE_DIR", ".borgepdf_cache")
+LATEX_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LATEX_CACHE_MEMORIA = 512
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+FONT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Fontes .ttf: a pasta do projeto e as extras de BORGEPDF_FONT_DIRS (separadas por os.pathsep)
+FONTES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fonts")
+FONTES_DIRS_EXTRAS = [d for d in os.environ.get("BORGEPDF_FONT_DIRS", "").split(os.pathsep) if d]
+
+# Entradas de texto acima deste tamanho são lidas e renderizadas em streaming
+STREAMING_LIMITE_MB = 20
@@ -1,42 +1,195 @@
 import os
+import copy
 import json
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from .config import CONFIG_FILE
 from modules.validations import validar_fonte # Import needed for the moved function
+from modules.profile_compiler import compilar_perfil, perfil_em_cache
 
-def carregar_config():
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Chave do arquivo de perfis que guarda os perfis de cada usuário ({id: {nome: config}})
+CHAVE_USUARIOS = "_usuarios"
+
+_store_padrao = None
+
+
+@contextmanager
+def _trava_exclusiva(caminho):
+    """Trava entre processos baseada em um arquivo `<caminho>.lock`."""
+    with open(f"{caminho}.lock", "a+b") as trava:
+        if fcntl is not None:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+        else:
+            trava.seek(0)
+            msvcrt.locking(trava.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+            else:
+                trava.seek(0)
+                msvcrt.locking(trava.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ProfileStore:
     """
-    Carrega as configurações de um arquivo JSON.
-    Permite ao usuário escolher um perfil de configuração.
-    Retorna um dicionário de configuração.
+    Perfis de configuração guardados em um arquivo JSON ({nome: config},
+    mais os perfis de cada usuário em "_usuarios").
+
+    Leituras nunca bloqueiam nem perguntam nada: vêm de uma cópia em memória,
+    recarregada só quando o mtime ou o tamanho do arquivo mudam. Escritas
+    fazem ler-alterar-gravar sob uma trava de arquivo e substituem o arquivo
+    atomicamente (temporário + `os.replace`), então vários processos podem
+    gravar ao mesmo tempo sem corromper o arquivo nem perder alterações, e
+    quem lê sempre vê uma versão completa.
     """
-    try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                configs = json.load(f)
 
-            if not isinstance(configs, dict) or not configs:
-                print(f"⚠️ Arquivo de configuração '{CONFIG_FILE}' vazio ou malformado. Usando padrões.")
-                return get_default_config()
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._assinatura = None
+        self._perfis = {}
+        self._lock = threading.Lock()
 
-            print("\n📋 Perfis de configuração disponíveis:")
-            profiles = list(configs.keys())
-            for i, profile_name in enumerate(profiles, 1):
-                print(f"[{i}] {profile_name}")
+    def _assinatura_atual(self):
+        try:
+            st = os.stat(self.caminho)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
 
-            escolha = input(f"Escolha um perfil [1-{len(profiles)}] (ou Enter para 'default'): ")
-            if escolha.isdigit() and 1 <= int(escolha) <= len(profiles):
-                profile_to_load = profiles[int(escolha) - 1]
-                print(f"✅ Carregando perfil '{profile_to_load}'.")
-                return configs[profile_to_load]
+    def _ler_arquivo(self):
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                perfis = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"❌ Erro ao carregar '{self.caminho}': {e}. Usando configurações padrão.")
+            return {}
+        return perfis if isinstance(perfis, dict) else {}
 
-            print("✅ Carregando perfil 'default'.")
-            return configs.get("default", get_default_config())
+    def _dados(self):
+        """Conteúdo atual do arquivo (compartilhado: não alterar)."""
+        assinatura = self._assinatura_atual()
+        if assinatura != self._assinatura:
+            with self._lock:
+                if assinatura != self._assinatura:
+                    self._perfis = self._ler_arquivo()
+                    self._assinatura = assinatura
+        return self._perfis
 
-        return get_default_config()
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"❌ Erro ao carregar '{CONFIG_FILE}': {e}. Usando configurações padrão.")
-        return get_default_config()
+    def _perfis_de(self, dados, usuario):
+        if usuario is None:
+            return {nome: config for nome, config in dados.items() if nome != CHAVE_USUARIOS}
+        return dados.get(CHAVE_USUARIOS, {}).get(str(usuario), {})
+
+    def listar(self, usuario=None):
+        """Nomes dos perfis visíveis: os globais e, com `usuario`, os dele."""
+        dados = self._dados()
+        nomes = set(self._perfis_de(dados, None))
+        if usuario is not None:
+            nomes |= set(self._perfis_de(dados, usuario))
+        return sorted(nomes)
+
+    def obter(self, nome, usuario=None):
+        """Cópia do perfil `nome` (o do usuário tem precedência sobre o global) ou None."""
+        dados = self._dados()
+        perfil = self._perfis_de(dados, usuario).get(nome) if usuario is not None else None
+        if perfil is None:
+            perfil = self._perfis_de(dados, None).get(nome)
+        return copy.deepcopy(perfil) if isinstance(perfil, dict) else None
+
+    def config(self, nome="default", usuario=None):
+        """Configuração completa: padrões + perfil `nome` (ou o "default", se ele não existir)."""
+        perfil = self.obter(nome, usuario)
+        if perfil is None:
+            perfil = self.obter("default", usuario) or {}
+        return {**get_default_config(), **perfil}
+
+    def compilado(self, nome="default", usuario=None):
+        """Perfil já compilado (estilos, página, fontes); uma consulta a dicionário enquanto nada muda."""
+        self._dados()  # Atualiza a assinatura se o arquivo mudou
+        chave = f"perfil:{self.caminho}:{usuario}:{nome}:{self._assinatura}"
+        return perfil_em_cache(chave) or compilar_perfil(self.config(nome, usuario), chave=chave)
+
+    def salvar(self, nome, config, usuario=None):
+        """Grava (ou substitui) o perfil `nome`, global ou do `usuario`."""
+        if not nome or nome == CHAVE_USUARIOS:
+            raise ValueError(f"Nome de perfil inválido: '{nome}'")
+        with self._alterar() as dados:
+            if usuario is None:
+                dados[nome] = config
+            else:
+                dados.setdefault(CHAVE_USUARIOS, {}).setdefault(str(usuario), {})[nome] = config
+
+    def remover(self, nome, usuario=None):
+        """Remove o perfil; retorna False se ele não existia."""
+        with self._alterar() as dados:
+            perfis = dados if usuario is None else dados.get(CHAVE_USUARIOS, {}).get(str(usuario), {})
+            return perfis.pop(nome, None) is not None
+
+    @contextmanager
+    def _alterar(self):
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        with self._lock, _trava_exclusiva(self.caminho):
+            dados = self._ler_arquivo()  # Relido sob a trava: inclui o que outros processos gravaram
+            yield dados
+            fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(dados, f, indent=4, ensure_ascii=False)
+                os.replace(temporario, self.caminho)
+            except BaseException:
+                os.remove(temporario)
+                raise
+            self._assinatura = None  # A próxima leitura pega a versão nova
+
+
+def perfis():
+    """Store de perfis do processo, sobre CONFIG_FILE."""
+    global _store_padrao
+    if _store_padrao is None:
+        _store_padrao = ProfileStore(CONFIG_FILE)
+    return _store_padrao
+
+def carregar_config():
+    """
+    Pergunta no terminal qual perfil usar e retorna a configuração dele
+    (padrões + perfil). Fora do terminal, use `perfis().config(nome)`.
+    """
+    return perfis().config(escolher_perfil())
+
+def escolher_perfil():
+    """
+    Pergunta no terminal qual perfil usar e retorna o nome dele, para
+    `perfis().config(nome)` e `perfis().compilado(nome)`.
+    """
+    store = perfis()
+    profiles = store.listar()
+    if not profiles:
+        return "default"
+
+    print("\n📋 Perfis de configuração disponíveis:")
+    for i, profile_name in enumerate(profiles, 1):
+        print(f"[{i}] {profile_name}")
+
+    escolha = input(f"Escolha um perfil [1-{len(profiles)}] (ou Enter para 'default'): ")
+    if escolha.isdigit() and 1 <= int(escolha) <= len(profiles):
+        profile_to_load = profiles[int(escolha) - 1]
+        print(f"✅ Carregando perfil '{profile_to_load}'.")
+        return profile_to_load
+
+    print("✅ Carregando perfil 'default'.")
+    return "default"
 
 def get_default_config():
     """Retorna um dicionário com as configurações padrão."""
@@ -59,29 +212,23 @@ def get_default_config():
         "capa_data": datetime.now().strftime("%Y-%m-%d"),
         "verificar_titulos": True,
         "incluir_marca_dagua": False,
+        "latex_modo": "raster",  # "vetorial" embute as fórmulas como forms PDF (requer svglib e dvisvgm)
+        "renderizacao_paralela": False,  # Renderiza cada arquivo de entrada em um processo separado
+        "parser_markdown": "direto",  # "html" usa o caminho antigo Markdown -> HTML -> MarkdownParser
+        "streaming_limite_mb": 20,  # Acima disso o texto é lido e diagramado aos poucos
+        "paginas_por_segmento": 200,  # Páginas mantidas em memória por vez no modo streaming
+        "imagem_dpi_alvo": 150,  # Imagens acima desta resolução (no tamanho posicionado) são reduzidas
+        "diretorios_fontes": [],  # Pastas extras de .ttf (a pasta fonts/ do projeto já é indexada)
+        "otimizar_pdf": False,  # Passa o PDF final pelo otimizador (recursos, imagens, objetos repetidos)
     }
 
 def salvar_config(config_to_save):
     """Salva um dicionário de configuração em um perfil nomeado pelo usuário."""
     try:
-        configs = {}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                    configs = json.load(f)
-                if not isinstance(configs, dict):
-                    configs = {}
-            except (json.JSONDecodeError, IOError):
-                configs = {} # Overwrite if malformed or unreadable
-
         nome_perfil = input("📋 Nome do perfil para salvar (ex: relatorio, Enter para 'default'): ").strip() or "default"
-        configs[nome_perfil] = config_to_save
-
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(configs, f, indent=4, ensure_ascii=False)
+        perfis().salvar(nome_perfil, config_to_save)
         print(f"✅ Perfil '{nome_perfil}' salvo com sucesso em '{CONFIG_FILE}'!")
-
-    except IOError as e:
+    except (IOError, ValueError) as e:
         print(f"❌ Erro ao salvar configurações: {e}.")
 
 def obter_configuracao_usuario(config, has_tables=False):
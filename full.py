@@ -1,9 +1,9 @@
 import os
 import json
 
-from configs.config_manager import carregar_config, salvar_config
+from configs.config_manager import carregar_config, salvar_config, perfis
 from modules.content_manager import editar_texto
-from modules.pdf_manager import mesclar_pdfs, infos_pdf, editar_pdf
+from modules.pdf_manager import mesclar_pdfs, infos_pdf, editar_pdf, otimizar_pdf, operar_paginas
 from functions.html_to_pdf import html_para_pdf, exportar_para_html
 from functions.txt_to_pdf import txt_para_pdf
 from functions.imagem_to_pdf import imagem_para_pdf
@@ -29,12 +29,80 @@ def gerenciar_configuracoes():
                 salvar_config(config_to_import)
             else:
                 print(f"❌ Arquivo '{caminho}' não encontrado.")
-        # 'l' (listar) is handled implicitly by carregar_config now
+        elif modo == "l":
+            nomes = perfis().listar()
+            print("📋 Perfis salvos: " + (", ".join(nomes) if nomes else "nenhum (usando os padrões)"))
         else:
-            print("❌ Opção inválida. Escolha 'e' para exportar ou 'i' para importar.")
+            print("❌ Opção inválida. Escolha 'e' para exportar, 'i' para importar ou 'l' para listar.")
     except Exception as e:
         print(f"❌ Erro ao gerenciar configurações: {e}")
 
+def perguntar_otimizacao(saida_pdf):
+    """Oferece passar o PDF recém-gerado pelo otimizador."""
+    if input("🗜️ Otimizar o PDF final (arquivo menor)? (s/n, padrão n): ").lower() == "s":
+        otimizar_pdf(saida_pdf)
+
+def pedir_saida_pdf():
+    saida_pdf = input("📄 Nome do PDF de saída (ex.: output.pdf): ")
+    return saida_pdf if saida_pdf.endswith(".pdf") else saida_pdf + ".pdf"
+
+def imagens_para_pdf_cli():
+    pasta = input("🖼️ Caminho da pasta com as imagens: ")
+    if not os.path.isdir(pasta):
+        print(f"❌ Pasta '{pasta}' não encontrada.")
+        return
+    imagens = sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith((".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp"))
+    )
+    if not imagens:
+        print("❌ Nenhuma imagem encontrada na pasta.")
+        return
+    saida_pdf = pedir_saida_pdf()
+    pagina = input("📐 Tamanho da página (A4, A4-paisagem, A5, letter; vazio = tamanho da imagem): ") or None
+    if imagem_para_pdf(imagens, saida_pdf, pagina):
+        perguntar_otimizacao(saida_pdf)
+        print(f"✅ PDF salvo como: {saida_pdf}")
+
+def mesclar_pdfs_cli():
+    caminhos = [c.strip() for c in input("📚 Caminhos dos PDFs, separados por vírgula: ").split(",") if c.strip()]
+    faltando = [c for c in caminhos if not os.path.exists(c)]
+    if not caminhos or faltando:
+        print(f"❌ Arquivo(s) não encontrado(s): {', '.join(faltando) or 'nenhum informado'}")
+        return
+    saida_pdf = pedir_saida_pdf()
+    if mesclar_pdfs(caminhos, saida_pdf):
+        perguntar_otimizacao(saida_pdf)
+        print(f"✅ PDF salvo como: {saida_pdf}")
+
+def html_para_pdf_cli():
+    caminho = input("🌐 Caminho do arquivo .html: ")
+    if not os.path.exists(caminho):
+        print(f"❌ Arquivo '{caminho}' não encontrado.")
+        return
+    saida_pdf = pedir_saida_pdf()
+    if html_para_pdf(caminho, saida_pdf):
+        perguntar_otimizacao(saida_pdf)
+        print(f"✅ PDF salvo como: {saida_pdf}")
+
+def editar_pdf_cli():
+    modo = input("✏️ Editar [p]áginas (reordenar, remover, extrair, girar, inserir em branco) ou [t]exto? (padrão p): ").lower() or "p"
+    if modo == "t":
+        editar_pdf()
+        return
+    caminho = input("📄 Caminho do PDF: ").strip()
+    if not os.path.exists(caminho):
+        print(f"❌ Arquivo '{caminho}' não encontrado.")
+        return
+    print("🔧 Operações, em ordem e separadas por ';':")
+    print("   manter 3,1-2 | remover 2-4 | girar 1,3 90 | branca 0 (0 = no início, vazio = no fim)")
+    operacoes = input("➡️ ")
+    saida_pdf = input("📄 Nome do PDF de saída (vazio = sobrescrever o original): ").strip() or caminho
+    if not saida_pdf.endswith(".pdf"):
+        saida_pdf += ".pdf"
+    if operar_paginas(caminho, saida_pdf, operacoes):
+        print(f"✅ PDF salvo como: {saida_pdf}")
+
 def menu():
     """Displays the main menu."""
     clear_screen()
@@ -68,9 +136,9 @@ def main():
             case "3":
                 txt_para_pdf(multiplos=True, process_latex=False)
             case "4":
-                imagem_para_pdf()
+                imagens_para_pdf_cli()
             case "5":
-                mesclar_pdfs()
+                mesclar_pdfs_cli()
             case "6":
                 infos_pdf()
             case "7":
@@ -80,9 +148,9 @@ def main():
                 else:
                     print(f"❌ Arquivo '{caminho}' inválido ou não encontrado.")
             case "8":
-                html_para_pdf()
+                html_para_pdf_cli()
             case "9":
-                editar_pdf()
+                editar_pdf_cli()
             case "10":
                 exportar_para_html()
             case "11":
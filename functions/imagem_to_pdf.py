@@ -1,24 +1,119 @@
 import os
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
+from reportlab.lib.pagesizes import A4, A5, letter, landscape
 
-def imagem_para_pdf(image_paths, output_path):
+from modules.image_pipeline import ler_cabecalho
+from modules.pdf_writer import StreamingPdfWriter, carregar_imagem, matriz_orientacao, orientacao_exif
+
+TAMANHOS_PAGINA = {"A4": A4, "A5": A5, "LETTER": letter}
+
+
+def _tamanho_pagina(pagina):
+    """Converte "A4", "A4-paisagem" ou (largura, altura) em pontos; None mantém o tamanho da imagem."""
+    if not pagina:
+        return None
+    if isinstance(pagina, str):
+        nome, _, orientacao = pagina.upper().partition("-")
+        tamanho = TAMANHOS_PAGINA.get(nome)
+        if tamanho is None:
+            raise ValueError(f"Tamanho de página desconhecido: {pagina}")
+        return landscape(tamanho) if orientacao == "PAISAGEM" else tamanho
+    return tuple(pagina)
+
+
+def preparar_pagina(caminho, tamanho_pagina=None, dpi=100):
     """
-    Converts one or more image files to a single PDF.
+    Pré-processa uma imagem (orientação EXIF, modo de cor, redução e
+    compressão) e calcula a página dela. Roda nos workers; a gravação no
+    PDF fica com quem chamou.
+    """
+    largura_px, altura_px, _, _ = ler_cabecalho(caminho)
+    with Image.open(caminho) as img:
+        girada = orientacao_exif(img) in (5, 6, 7, 8)
+    if girada:
+        largura_px, altura_px = altura_px, largura_px  # Tamanho como a imagem é exibida
+
+    if tamanho_pagina is None:
+        largura_pag, altura_pag = largura_px / dpi * 72, altura_px / dpi * 72
+        x = y = 0
+        largura, altura = largura_pag, altura_pag
+        alvo = None
+    else:
+        largura_pag, altura_pag = tamanho_pagina
+        escala = min(largura_pag / largura_px, altura_pag / altura_px)
+        largura, altura = largura_px * escala, altura_px * escala
+        x, y = (largura_pag - largura) / 2, (altura_pag - altura) / 2
+        alvo = (max(1, round(largura / 72 * dpi)), max(1, round(altura / 72 * dpi)))
+        if girada:
+            alvo = alvo[::-1]  # O alvo é medido na orientação armazenada
+
+    imagem = carregar_imagem(caminho, alvo)
+    return {
+        "imagem": imagem,
+        "largura": largura_pag,
+        "altura": altura_pag,
+        "matriz": matriz_orientacao(imagem["orientacao"], x, y, largura, altura),
+    }
+
+
+def _em_ordem(funcao, itens, workers):
+    """
+    Aplica `funcao` aos itens em um pool de threads e entrega os resultados
+    na ordem de entrada, assim que cada posição fica pronta. No máximo
+    2 x `workers` resultados ficam em memória ao mesmo tempo.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pendentes = deque()
+        for item in itens:
+            pendentes.append(pool.submit(funcao, item))
+            if len(pendentes) >= 2 * workers:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def imagem_para_pdf(image_paths, output_path, pagina=None, dpi=100, workers=None):
+    """
+    Converts one or more image files to a single PDF, one image per page.
+
+    The per-image work (EXIF orientation, colour mode, resizing and
+    compression) runs in a thread pool; pages are written to the output in
+    input order as each one becomes ready, so memory stays around a few
+    images. JPEGs are embedded as they are (no decode or re-encode, EXIF
+    rotation is applied in the page transform) and PNGs losslessly.
 
     Args:
         image_paths (list): A list of paths to the image files.
         output_path (str): The path to save the output PDF file.
+        pagina (str | tuple): Target page size ("A4", "A4-paisagem", "A5",
+            "letter" or (width, height) in points). Each image is fitted and
+            centred, and reduced to `dpi` at the fitted size. Without it,
+            each page has the size of its image at `dpi`.
+        dpi (int): Output resolution.
+        workers (int): Preprocessing threads (default: number of CPUs).
 
     Returns:
         bool: True if the conversion was successful, False otherwise.
     """
+    if not image_paths:
+        print("❌ Nenhuma imagem informada.")
+        return False
     try:
-        images = [Image.open(p).convert("RGB") for p in image_paths]
-        if images:
-            images[0].save(
-                output_path, "PDF", resolution=100.0, save_all=True, append_images=images[1:]
-            )
-            return True
+        tamanho_pagina = _tamanho_pagina(pagina)
+        workers = workers or os.cpu_count() or 1
+        preparar = partial(preparar_pagina, tamanho_pagina=tamanho_pagina, dpi=dpi)
+        with StreamingPdfWriter(output_path) as writer:
+            for pagina_pronta in _em_ordem(preparar, image_paths, workers):
+                writer.adicionar_pagina_imagem(
+                    pagina_pronta["imagem"], pagina_pronta["largura"], pagina_pronta["altura"],
+                    matriz=pagina_pronta["matriz"],
+                )
+        return True
     except Exception as e:
         print(f"Error converting images to PDF: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
         return False
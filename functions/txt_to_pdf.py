@@ -1,12 +1,15 @@
 import os
-from configs.config_manager import carregar_config, obter_configuracao_usuario
+import time
+from configs.config import STREAMING_LIMITE_MB
+from configs.config_manager import perfis, escolher_perfil, obter_configuracao_usuario
 from modules.validations import registrar_fontes
 from modules.shares import enviar_telegram
 from modules.page_manager import reordenar_arquivos
-from modules.content_manager import formatar_palavras
-from modules.pdf_generator import PdfGenerator
+from modules.content_manager import pedir_formatacoes, aplicar_formatacoes
+from modules.pdf_generator import PdfGenerator, iter_markdown_chunks
+from modules.pdf_manager import otimizar_pdf
 
-def convert_text_to_pdf(text_blocks, output_path, config, process_latex=False):
+def convert_text_to_pdf(text_blocks, output_path, config, process_latex=False, profile=None):
     """
     Converts a list of text blocks to a PDF file.
 
@@ -16,18 +19,108 @@ def convert_text_to_pdf(text_blocks, output_path, config, process_latex=False):
         output_path (str): The path to save the output PDF file.
         config (dict): A dictionary with the configuration for the PDF generation.
         process_latex (bool): Whether to process LaTeX formulas.
+        profile (PerfilCompilado): The compiled profile `config` came from
+            (`perfis().compilado(nome)`), so it is not compiled again.
 
     Returns:
         bool: True if the conversion was successful, False otherwise.
     """
     try:
-        generator = PdfGenerator(config)
+        generator = PdfGenerator(config, profile)
         generator.build(text_blocks, output_path, process_latex)
         return True
     except Exception as e:
         print(f"Error converting text to PDF: {e}")
         return False
 
+def convert_files_to_pdf(paths, output_path, config, process_latex=False, profile=None):
+    """
+    Converts TXT/Markdown files to a PDF, in order.
+
+    Inputs larger than "streaming_limite_mb" (or any input with "streaming"
+    set in the config) are read in chunks and rendered with
+    `PdfGenerator.build_streaming`, so memory stays bounded regardless of
+    the file size. Smaller inputs are read whole and go through
+    `convert_text_to_pdf`.
+
+    Returns:
+        bool: True if the conversion was successful, False otherwise.
+    """
+    try:
+        limit = config.get("streaming_limite_mb", STREAMING_LIMITE_MB) * 1024 * 1024
+        if config.get("streaming") or sum(os.path.getsize(p) for p in paths) > limit:
+            chunks = (chunk for path in paths for chunk in iter_markdown_chunks(path))
+            PdfGenerator(config, profile).build_streaming(chunks, output_path, process_latex)
+            return True
+        text_blocks = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                text_blocks.append(f.read())
+    except Exception as e:
+        print(f"Error converting text to PDF: {e}")
+        return False
+    return convert_text_to_pdf(text_blocks, output_path, config, process_latex, profile)
+
+def _assinatura_pasta(pasta):
+    """{nome: (mtime, tamanho)} dos .txt de `pasta`."""
+    assinatura = {}
+    for entrada in os.scandir(pasta):
+        if entrada.name.endswith(".txt") and entrada.is_file():
+            st = entrada.stat()
+            assinatura[entrada.name] = (st.st_mtime_ns, st.st_size)
+    return assinatura
+
+def assistir_pasta(pasta, output_path, config, process_latex=False, ordem=None, intervalo=1.0, formatacoes=None, profile=None):
+    """
+    Watch mode for a folder of .txt chapters: builds `output_path` right away
+    and rebuilds it whenever a chapter is added, removed or saved, until Ctrl+C.
+
+    Each chapter is one segment of `PdfGenerator.build_incremental` (so each
+    one starts on a new page), and the first build goes through the same
+    path, so the layout does not change between rebuilds. Only the chapters
+    that changed are parsed and laid out again; the others come from the
+    segment cache. The PDF is replaced atomically, so an open viewer never
+    reads a half-written file.
+
+    Args:
+        ordem (list): Chapter file names in order; files not listed follow
+            in name order.
+        intervalo (float): Seconds between checks of the folder.
+        formatacoes (dict): Word formatting rules per chapter file name (see
+            `pedir_formatacoes`), applied again on every rebuild.
+        profile (PerfilCompilado): The compiled profile `config` came from.
+    """
+    generator = PdfGenerator(config, profile)
+    ordem = list(ordem or [])
+    formatacoes = formatacoes or {}
+    assinatura = None
+    print(f"👀 Observando '{pasta}' (Ctrl+C para sair)...")
+    try:
+        while True:
+            atual = _assinatura_pasta(pasta)
+            if atual and atual != assinatura:
+                assinatura = atual
+                nomes = [n for n in ordem if n in atual] + sorted(n for n in atual if n not in ordem)
+                inicio = time.perf_counter()
+                parcial = f"{output_path}.parcial"
+                try:
+                    blocos = []
+                    for nome in nomes:
+                        with open(os.path.join(pasta, nome), "r", encoding="utf-8") as f:
+                            texto = f.read()
+                        blocos.append(aplicar_formatacoes(texto, formatacoes.get(nome, [])))
+                    renderizados = generator.build_incremental(blocos, parcial, process_latex)
+                    os.replace(parcial, output_path)
+                    print(f"✅ {output_path} atualizado em {time.perf_counter() - inicio:.1f}s "
+                          f"({renderizados} de {len(blocos)} capítulo(s) renderizado(s)).")
+                except Exception as e:
+                    print(f"❌ Erro ao reconstruir o PDF: {e}")
+                    if os.path.exists(parcial):
+                        os.remove(parcial)
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\n👋 Modo watch encerrado.")
+
 def txt_para_pdf(multiplos=False, process_latex=False):
     """
     Handles the user interaction for converting TXT files to PDF, then uses
@@ -57,34 +150,69 @@ def txt_para_pdf(multiplos=False, process_latex=False):
         if not saida_pdf.endswith(".pdf"):
             saida_pdf += ".pdf"
 
+        # The profile is chosen first: its "streaming_limite_mb" decides how the text is read.
+        nome_perfil = escolher_perfil()
+        config = perfis().config(nome_perfil)
+
         # 2. Read and Prepare Content
         text_blocks = []
+        formatacoes = {}  # Rules per file name, reapplied by watch mode
         has_tables = False
-        for caminho in caminhos:
+        limite = config.get("streaming_limite_mb", STREAMING_LIMITE_MB) * 1024 * 1024
+        streaming = sum(os.path.getsize(c) for c in caminhos) > limite
+        if streaming:
+            # Large inputs are never loaded whole; word formatting needs the full text.
+            print("📦 Entrada grande: o texto será lido e renderizado em partes (sem formatação de palavras).")
+            has_tables = True
+        for caminho in ([] if streaming else caminhos):
             with open(caminho, 'r', encoding='utf-8') as f:
                 texto = f.read()
             if "|" in texto: # Simple check for tables
                 has_tables = True
 
-            texto = formatar_palavras(texto)
-            text_blocks.append(texto)
+            formatacoes[os.path.basename(caminho)] = pedir_formatacoes()
+            text_blocks.append(aplicar_formatacoes(texto, formatacoes[os.path.basename(caminho)]))
 
         # 3. Get Configuration from User
-        config = carregar_config()
         config["incluir_capa"] = input("📖 Incluir página de capa? (s/n, padrão s): ").lower() != 'n'
         config["incluir_sumario"] = input("📑 Incluir sumário clicável? (s/n, padrão s): ").lower() != 'n'
+        # Watch mode lays out one segment per file and also does the first build,
+        # so the layout does not change between rebuilds.
+        observar = multiplos and not streaming and input(
+            "👀 Ficar observando a pasta e reconstruir o PDF a cada alteração? (s/n, padrão n): ").lower() == "s"
+        if observar:
+            print("ℹ️ No modo watch cada arquivo é renderizado separadamente e começa em uma página nova.")
+            config["renderizacao_paralela"] = True
+        elif len(text_blocks) > 1:
+            config["renderizacao_paralela"] = input("⚡ Renderizar os arquivos em paralelo (um capítulo por página nova)? (s/n, padrão s): ").lower() != 'n'
 
         paginacao_op = input("📄 Paginação (todas/impares/pares/a_partir_de/nenhuma, padrão todas): ") or "todas"
         paginacao_inicio = 1
         if paginacao_op == "a_partir_de":
             paginacao_inicio = int(input("📄 A partir de qual página? (ex.: 1): ") or 1)
         config["paginacao"] = {"tipo": paginacao_op, "inicio": paginacao_inicio}
+        padrao_otimizar = "s" if config.get("otimizar_pdf") else "n"
+        config["otimizar_pdf"] = (input(f"🗜️ Otimizar o PDF final (arquivo menor)? (s/n, padrão {padrao_otimizar}): ").lower() or padrao_otimizar) == "s"
 
         config = obter_configuracao_usuario(config, has_tables)
 
         # 4. Generate PDF
-        if convert_text_to_pdf(text_blocks, saida_pdf, config, process_latex):
-            print(f"✅ PDF final salvo como: {saida_pdf}")
+        if observar:
+            if config["otimizar_pdf"]:
+                print("ℹ️ No modo watch o PDF não é otimizado a cada reconstrução.")
+            assistir_pasta(pasta, saida_pdf, config, process_latex,
+                           ordem=[os.path.basename(c) for c in caminhos], formatacoes=formatacoes,
+                           profile=perfis().compilado(nome_perfil))
+        else:
+            if streaming:
+                config["streaming"] = True
+                ok = convert_files_to_pdf(caminhos, saida_pdf, config, process_latex, perfis().compilado(nome_perfil))
+            else:
+                ok = convert_text_to_pdf(text_blocks, saida_pdf, config, process_latex, perfis().compilado(nome_perfil))
+            if ok:
+                if config["otimizar_pdf"]:
+                    otimizar_pdf(saida_pdf, dpi_imagens=config.get("imagem_dpi_alvo", 150))
+                print(f"✅ PDF final salvo como: {saida_pdf}")
 
         # 5. Post-generation actions
         if input("📤 Enviar para Telegram? (s/n): ").lower() == "s":
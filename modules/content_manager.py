@@ -34,14 +34,16 @@ def editar_texto(text_content, is_file_path=False):
         print(f"❌ Erro ao editar texto: {e}.")
         return None if is_file_path else text_content # Return original content on error if in memory
 
-def formatar_palavras(texto):
+def pedir_formatacoes():
     """
-    Interactively prompts the user to find and format specific words
-    in the text with Markdown or HTML font tags.
+    Asks the user which words to format and how. Returns the rules as
+    (palavra, formato, cor) tuples for `aplicar_formatacoes`, so the same
+    formatting can be applied again later (e.g. on watch-mode rebuilds).
     """
     if input("🔍 Deseja formatar palavras específicas? (s/n): ").lower() != "s":
-        return texto
+        return []
 
+    regras = []
     while True:
         palavra = input("🔍 Palavra-chave a formatar (ou Enter para parar): ")
         if not palavra:
@@ -49,16 +51,33 @@ def formatar_palavras(texto):
 
         formato = input("🎨 Formato (negrito/sublinhado/cor): ").lower()
 
-        if formato == "negrito":
-            texto = re.sub(rf"(\b)({re.escape(palavra)})(\b)", r"\1**\2**\3", texto, flags=re.IGNORECASE)
-        elif formato == "sublinhado":
-            texto = re.sub(rf"(\b)({re.escape(palavra)})(\b)", r"\1<u>\2</u>\3", texto, flags=re.IGNORECASE)
+        if formato in ("negrito", "sublinhado"):
+            regras.append((palavra, formato, None))
         elif formato == "cor":
             cor = input("🎨 Cor (ex: red, #FF0000): ")
             if cor:
-                texto = re.sub(rf"(\b)({re.escape(palavra)})(\b)", f'\\1<font color="{cor}">\\2</font>\\3', texto, flags=re.IGNORECASE)
+                regras.append((palavra, formato, cor))
         else:
             print("❌ Formato inválido. Use negrito, sublinhado ou cor.")
 
     print("✅ Formatação de palavras concluída.")
+    return regras
+
+def aplicar_formatacoes(texto, regras):
+    """Applies the rules from `pedir_formatacoes` to the text with Markdown or HTML font tags."""
+    for palavra, formato, cor in regras:
+        padrao = rf"(\b)({re.escape(palavra)})(\b)"
+        if formato == "negrito":
+            texto = re.sub(padrao, r"\1**\2**\3", texto, flags=re.IGNORECASE)
+        elif formato == "sublinhado":
+            texto = re.sub(padrao, r"\1<u>\2</u>\3", texto, flags=re.IGNORECASE)
+        elif formato == "cor":
+            texto = re.sub(padrao, f'\\1<font color="{cor}">\\2</font>\\3', texto, flags=re.IGNORECASE)
     return texto
+
+def formatar_palavras(texto):
+    """
+    Interactively prompts the user to find and format specific words
+    in the text with Markdown or HTML font tags.
+    """
+    return aplicar_formatacoes(texto, pedir_formatacoes())
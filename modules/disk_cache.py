@@ -0,0 +1,170 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def processo_vivo(pid):
+    """True se o processo `pid` deste host ainda existe (na dúvida, considera vivo)."""
+    if os.name == "nt":
+        # os.kill(pid, 0) encerraria o processo no Windows; consulta o handle dele.
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x00100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            return ctypes.get_last_error() == 5  # Acesso negado: existe, mas é de outro usuário
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT: ainda rodando
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Existe, mas é de outro usuário
+    return True
+
+
+def chave_hash(*partes):
+    """Gera uma chave estável (sha256) a partir de partes de texto ou bytes."""
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, str):
+            parte = parte.encode("utf-8")
+        h.update(len(parte).to_bytes(8, "big"))
+        h.update(parte)
+    return h.hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Armazena blobs em disco, endereçados por conteúdo, com limite de tamanho.
+
+    Cada entrada é um arquivo `<chave><extensao>` dentro de `diretorio`,
+    distribuído em subpastas pelos dois primeiros caracteres da chave. O mtime
+    do arquivo faz o papel de "último uso": leituras o atualizam e a remoção
+    começa pelos mais antigos quando `max_bytes` é ultrapassado. As escritas são
+    atômicas (arquivo temporário + `os.replace`), então vários processos podem
+    compartilhar o mesmo diretório.
+    """
+
+    def __init__(self, diretorio, max_bytes, extensao=""):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.extensao = extensao
+        self._lock = threading.Lock()
+        self._bytes_em_disco = None  # Calculado sob demanda na primeira escrita
+
+    def caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], chave + self.extensao)
+
+    def obter_caminho(self, chave):
+        """Retorna o caminho da entrada (marcando-a como usada) ou None."""
+        caminho = self.caminho(chave)
+        try:
+            os.utime(caminho, None)
+        except OSError:
+            return None
+        return caminho
+
+    def obter(self, chave):
+        """Retorna os bytes da entrada ou None se não estiver no cache."""
+        caminho = self.obter_caminho(chave)
+        if caminho is None:
+            return None
+        try:
+            with open(caminho, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def guardar(self, chave, dados):
+        """Grava `dados` sob `chave` e aplica o limite de tamanho."""
+        return self._gravar(chave, lambda f: f.write(dados), len(dados))
+
+    def guardar_arquivo(self, chave, origem):
+        """Copia o arquivo `origem` para o cache sob `chave`, sem carregá-lo na memória."""
+        def copiar(f):
+            with open(origem, "rb") as entrada:
+                shutil.copyfileobj(entrada, f)
+        return self._gravar(chave, copiar, os.path.getsize(origem))
+
+    def _gravar(self, chave, escrever, tamanho):
+        caminho = self.caminho(chave)
+        try:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    escrever(f)
+                os.replace(temporario, caminho)
+            except BaseException:
+                os.remove(temporario)
+                raise
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar no cache '{self.diretorio}': {e}")
+            return None
+        self._contabilizar(tamanho)
+        return caminho
+
+    def _entradas(self):
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if not nome.endswith(self.extensao) or nome.endswith(".tmp"):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    st = os.stat(caminho)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, caminho
+
+    def _contabilizar(self, novos_bytes):
+        with self._lock:
+            if self._bytes_em_disco is None:
+                self._bytes_em_disco = sum(tamanho for _, tamanho, _ in self._entradas())
+            else:
+                self._bytes_em_disco += novos_bytes
+            if self._bytes_em_disco > self.max_bytes:
+                self._remover_antigos()
+
+    def _remover_antigos(self):
+        # Remove até 90% do limite para não varrer o diretório a cada escrita.
+        entradas = sorted(self._entradas())
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        alvo = self.max_bytes * 0.9
+        for _, tamanho, caminho in entradas:
+            if total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except OSError:
+                pass
+        self._bytes_em_disco = total
+
+
+class MemoryLRU:
+    """Cache LRU simples em memória, limitado pelo número de entradas."""
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is not None:
+                self._dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
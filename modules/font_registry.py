@@ -0,0 +1,196 @@
+import os
+import json
+import threading
+from weakref import WeakKeyDictionary
+import reportlab
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace, TTFNameBytes, TTEncoding
+
+from configs.config import CACHE_DIR, FONT_CACHE_MAX_BYTES, FONTES_DIR, FONTES_DIRS_EXTRAS
+from .disk_cache import DiskLRUCache, chave_hash
+
+_registro_padrao = None
+
+# Sufixo do arquivo -> papel na família (Roboto-Bold.ttf é o negrito da família "Roboto")
+_ESTILOS = {"Regular": "normal", "Bold": "bold", "Italic": "italic", "BoldItalic": "boldItalic"}
+
+# Atributos que não vão para o cache: os bytes do arquivo (relidos do .ttf), o
+# cursor de leitura e a função de escala (recriada a partir de unitsPerEm)
+_ATRIBUTOS_FACE_FORA = {"_ttf_data", "_pos", "_pdfScale"}
+_ATRIBUTOS_FONTE_FORA = {"face", "encoding", "state"}
+
+
+def _para_json(valor):
+    """Converte as métricas de uma fonte em dados JSON (bytes e chaves não-texto são marcados)."""
+    if isinstance(valor, TTFNameBytes):
+        return {"nome": valor.ustr}
+    if isinstance(valor, bytes):
+        return {"bytes": valor.hex()}
+    if isinstance(valor, dict):
+        return {"dict": [[_para_json(chave), _para_json(item)] for chave, item in valor.items()]}
+    if isinstance(valor, (list, tuple)):
+        return [_para_json(item) for item in valor]
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    raise TypeError(f"Atributo de fonte não serializável: {type(valor).__name__}")
+
+
+def _de_json(valor):
+    if isinstance(valor, list):
+        return [_de_json(item) for item in valor]
+    if isinstance(valor, dict):
+        if "nome" in valor:
+            return TTFNameBytes(valor["nome"].encode("utf-8"))
+        if "bytes" in valor:
+            return bytes.fromhex(valor["bytes"])
+        return {_de_json(chave): _de_json(item) for chave, item in valor["dict"]}
+    return valor
+
+
+def _metricas(fonte):
+    """Métricas já interpretadas de um TTFont, como JSON (sem os bytes do arquivo)."""
+    return json.dumps({
+        "fonte": {k: _para_json(v) for k, v in vars(fonte).items() if k not in _ATRIBUTOS_FONTE_FORA},
+        "face": {k: _para_json(v) for k, v in vars(fonte.face).items() if k not in _ATRIBUTOS_FACE_FORA},
+    }, separators=(",", ":")).encode("utf-8")
+
+
+def _montar_fonte(caminho, dados):
+    """Recria o TTFont a partir de `_metricas`, relendo só os bytes do .ttf (usados no subset)."""
+    metricas = json.loads(dados)
+    face = TTFontFace.__new__(TTFontFace)
+    face.__dict__.update({k: _de_json(v) for k, v in metricas["face"].items()})
+    face.readFile(caminho)
+    if face.unitsPerEm == 1000:
+        face._pdfScale = lambda x: x
+    else:
+        escala = 1000 / face.unitsPerEm
+        face._pdfScale = lambda x: x * escala
+    fonte = TTFont.__new__(TTFont)
+    fonte.__dict__.update({k: _de_json(v) for k, v in metricas["fonte"].items()})
+    fonte.face = face
+    fonte.encoding = TTEncoding()
+    fonte.state = WeakKeyDictionary()
+    return fonte
+
+
+def _dividir_nome(nome):
+    """"Roboto-BoldItalic" -> ("Roboto", "boldItalic"); nomes sem estilo conhecido -> (nome, None)."""
+    familia, _, estilo = nome.rpartition("-")
+    if familia and estilo in _ESTILOS:
+        return familia, _ESTILOS[estilo]
+    return nome, None
+
+
+class FontRegistry:
+    """
+    Índice das fontes .ttf disponíveis, com registro sob demanda no ReportLab.
+
+    Indexar uma pasta só lista os arquivos; nenhuma fonte é lida até ser
+    usada. No primeiro uso, a família inteira (normal, negrito, itálico e
+    negrito-itálico) é registrada de uma vez, para que <b> e <i> nos
+    parágrafos funcionem. As métricas já interpretadas de cada arquivo ficam
+    em um cache em disco, indexado pelo caminho, mtime e tamanho do arquivo,
+    então outros processos (workers web, execuções do CLI) não voltam a
+    interpretar os TTFs. O cache guarda só dados (JSON), nunca objetos
+    serializados com pickle: quem consegue escrever na pasta do cache não
+    consegue executar código ao carregar uma fonte.
+    """
+
+    def __init__(self, diretorios=(), cache=None):
+        self.cache = cache
+        self._diretorios = set()
+        self._arquivos = {}  # nome da fonte -> caminho do .ttf
+        self._familias = {}  # família -> {papel: nome da fonte}
+        self._registradas = set(pdfmetrics.standardFonts)
+        self._lock = threading.Lock()
+        for diretorio in diretorios:
+            self.adicionar_diretorio(diretorio)
+
+    def adicionar_diretorio(self, diretorio):
+        """Indexa os .ttf de `diretorio` (sem abri-los); retorna quantas fontes novas entraram."""
+        diretorio = os.path.abspath(diretorio)
+        if diretorio in self._diretorios or not os.path.isdir(diretorio):
+            return 0
+        novas = 0
+        with self._lock:
+            self._diretorios.add(diretorio)
+            for entrada in sorted(os.scandir(diretorio), key=lambda e: e.name):
+                nome, extensao = os.path.splitext(entrada.name)
+                if extensao.lower() != ".ttf" or nome in self._arquivos or not entrada.is_file():
+                    continue
+                self._arquivos[nome] = entrada.path
+                familia, papel = _dividir_nome(nome)
+                if papel:
+                    self._familias.setdefault(familia, {})[papel] = nome
+                novas += 1
+        return novas
+
+    def disponivel(self, nome):
+        return nome in self._registradas or nome in self._arquivos or nome in self._familias
+
+    def registrar(self, nome):
+        """Garante que a fonte `nome` está registrada no ReportLab; False se ela não existe."""
+        if nome in self._registradas:
+            return True
+        if nome not in self._arquivos:
+            return False
+        with self._lock:
+            if nome in self._registradas:
+                return True
+            familia, papel = _dividir_nome(nome)
+            membros = self._familias.get(familia, {}) if papel else {}
+            for membro in set(membros.values()) | {nome}:
+                pdfmetrics.registerFont(self._carregar(membro, self._arquivos[membro]))
+                self._registradas.add(membro)
+            if "normal" in membros:
+                normal = membros["normal"]
+                pdfmetrics.registerFontFamily(
+                    familia,
+                    normal=normal,
+                    bold=membros.get("bold", normal),
+                    italic=membros.get("italic", normal),
+                    boldItalic=membros.get("boldItalic", membros.get("bold", normal)),
+                )
+        return True
+
+    def resolver(self, fonte, bold=False):
+        """
+        Nome registrado a usar para `fonte` (ou para o negrito dela), ou None.
+        Aceita o nome de um arquivo ("Roboto-Regular") ou de uma família ("Roboto").
+        """
+        familia, _ = _dividir_nome(fonte)
+        membros = self._familias.get(familia, {})
+        candidatos = [f"{fonte}-Bold", membros.get("bold")] if bold else []
+        candidatos += [fonte, membros.get("normal")]
+        for candidato in candidatos:
+            if candidato and self.registrar(candidato):
+                return candidato
+        return None
+
+    def _carregar(self, nome, caminho):
+        st = os.stat(caminho)
+        chave = chave_hash("ttf", nome, os.path.abspath(caminho), str(st.st_mtime_ns), str(st.st_size), reportlab.Version)
+        if self.cache is not None:
+            dados = self.cache.obter(chave)
+            if dados is not None:
+                try:
+                    return _montar_fonte(caminho, dados)
+                except Exception:
+                    pass  # Cache corrompido: interpreta de novo
+        fonte = TTFont(nome, caminho)
+        if self.cache is not None:
+            try:
+                self.cache.guardar(chave, _metricas(fonte))
+            except (TypeError, ValueError, OSError) as e:
+                print(f"⚠️ Métricas da fonte {nome} não foram para o cache: {e}")
+        return fonte
+
+
+def fontes():
+    """Registro de fontes do processo: pasta `fonts/` do projeto e as de BORGEPDF_FONT_DIRS."""
+    global _registro_padrao
+    if _registro_padrao is None:
+        cache = DiskLRUCache(os.path.join(CACHE_DIR, "fontes"), FONT_CACHE_MAX_BYTES, extensao=".json")
+        _registro_padrao = FontRegistry([FONTES_DIR, *FONTES_DIRS_EXTRAS], cache)
+    return _registro_padrao
@@ -0,0 +1,114 @@
+import os
+from io import BytesIO
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image as ReportLabImage
+
+from .disk_cache import MemoryLRU, chave_hash
+
+# Resolução alvo padrão (pixels por polegada no tamanho em que a imagem é posicionada)
+DPI_ALVO_PADRAO = 150
+# Resolução em que as fórmulas LaTeX são rasterizadas (dvipng -D / SymPy)
+DPI_LATEX = 300
+QUALIDADE_JPEG_PADRAO = 85
+# Imagens até 10% acima do alvo não compensam uma nova codificação
+TOLERANCIA = 1.1
+
+# Imagens já reduzidas, reaproveitadas entre páginas e documentos do processo.
+_reduzidas = MemoryLRU(64)
+
+
+def ler_cabecalho(src):
+    """
+    Lê só o cabeçalho da imagem (caminho ou buffer): retorna
+    (largura, altura, formato, modo) sem decodificar os pixels.
+    """
+    if hasattr(src, "seek"):
+        src.seek(0)
+    with Image.open(src) as img:
+        info = (img.width, img.height, img.format, img.mode)
+    if hasattr(src, "seek"):
+        src.seek(0)
+    return info
+
+
+def preparar_imagem(src, largura_pt, altura_pt, dpi_alvo=DPI_ALVO_PADRAO, qualidade=QUALIDADE_JPEG_PADRAO):
+    """
+    Retorna a fonte a embutir para uma imagem posicionada em
+    `largura_pt` x `altura_pt` pontos.
+
+    Se a imagem já cabe na resolução alvo, a fonte original é devolvida sem
+    alteração (JPEGs entram no PDF como estão, sem nova codificação). Caso
+    contrário, a imagem é reduzida para `dpi_alvo` no tamanho posicionado e
+    devolvida como um BytesIO (JPEG para fotos, PNG quando há transparência
+    ou paleta).
+    """
+    largura_px, altura_px, formato, modo = ler_cabecalho(src)
+    alvo = (max(1, round(largura_pt / 72 * dpi_alvo)), max(1, round(altura_pt / 72 * dpi_alvo)))
+    if largura_px <= alvo[0] * TOLERANCIA and altura_px <= alvo[1] * TOLERANCIA:
+        return src
+
+    if hasattr(src, "seek"):
+        origem = chave_hash(src.getvalue())
+    else:
+        st = os.stat(src)
+        origem = chave_hash(os.path.abspath(src), str(st.st_mtime_ns), str(st.st_size))
+    chave = chave_hash(origem, f"{alvo[0]}x{alvo[1]}", str(qualidade))
+    dados = _reduzidas.obter(chave)
+    if dados is None:
+        dados = _reduzir(src, alvo, formato, modo, qualidade)
+        _reduzidas.guardar(chave, dados)
+    return BytesIO(dados)
+
+
+def _reduzir(src, alvo, formato, modo, qualidade):
+    if hasattr(src, "seek"):
+        src.seek(0)
+    with Image.open(src) as img:
+        if formato == "JPEG":
+            img.draft(img.mode, alvo)  # O decodificador JPEG já reduz por 1/2, 1/4 ou 1/8
+        if img.mode in ("RGB", "L", "RGBA", "LA"):
+            reduzida = img.copy()
+        else:
+            transparente = "A" in modo or "transparency" in img.info
+            reduzida = img.convert("RGBA" if transparente else "RGB")
+    if hasattr(src, "seek"):
+        src.seek(0)
+    reduzida.thumbnail(alvo, Image.LANCZOS)
+
+    saida = BytesIO()
+    if reduzida.mode in ("RGB", "L") and formato not in ("PNG", "GIF"):
+        reduzida.save(saida, format="JPEG", quality=qualidade, optimize=True)
+    else:
+        reduzida.save(saida, format="PNG", optimize=True)
+    return saida.getvalue()
+
+
+def imagem_flowable(src, largura_max, altura_max=None, dpi_alvo=DPI_ALVO_PADRAO, ampliar=False, dpi_origem=72):
+    """
+    Cria um Image do ReportLab com no máximo `largura_max` x `altura_max`
+    pontos, mantendo a proporção, já reduzido para a resolução alvo.
+    O tamanho natural é o da imagem em `dpi_origem` (72: 1 pixel = 1 ponto;
+    fórmulas LaTeX usam `DPI_LATEX`). Retorna None se a imagem não puder ser lida.
+    """
+    if not hasattr(src, "seek") and not (src and os.path.exists(src)):
+        return None
+    try:
+        largura_px, altura_px, _, _ = ler_cabecalho(src)
+        natural = 72 / dpi_origem
+        escala = largura_max / largura_px
+        if altura_max:
+            escala = min(escala, altura_max / altura_px)
+        if not ampliar:
+            escala = min(natural, escala)
+        largura, altura = largura_px * escala, altura_px * escala
+        return ReportLabImage(preparar_imagem(src, largura, altura, dpi_alvo), width=largura, height=altura)
+    except Exception as e:
+        print(f"⚠️ Imagem ignorada: {e}")
+        return None
+
+
+def imagem_para_canvas(src, largura_pt, altura_pt, dpi_alvo=DPI_ALVO_PADRAO):
+    """Fonte pronta para `canvas.drawImage` (caminho original ou ImageReader da versão reduzida)."""
+    fonte = preparar_imagem(src, largura_pt, altura_pt, dpi_alvo)
+    return fonte if isinstance(fonte, str) else ImageReader(fonte)
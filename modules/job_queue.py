@@ -0,0 +1,336 @@
+import os
+import json
+import shutil
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .disk_cache import processo_vivo
+
+# Estados possíveis de um job
+NA_FILA = "queued"
+EXECUTANDO = "running"
+CONCLUIDO = "done"
+FALHOU = "failed"
+
+
+def _aquecer_worker():
+    """Importa os conversores uma vez por processo, antes do primeiro job."""
+    import functions.txt_to_pdf  # noqa: F401
+    import functions.imagem_to_pdf  # noqa: F401
+    import functions.html_to_pdf  # noqa: F401
+    import modules.pdf_manager  # noqa: F401
+
+
+def executar_conversao(tipo, params, saida):
+    """
+    Executa a conversão `tipo` gravando o PDF em `saida`; retorna True em caso
+    de sucesso. Com `params["otimizar"]`, o PDF passa pelo otimizador antes de
+    ser entregue (e é esta versão que vai para o cache).
+    """
+    if not _converter(tipo, params, saida):
+        return False
+    if params.get("otimizar"):
+        from modules.pdf_manager import otimizar_pdf
+        otimizar_pdf(saida)  # Se falhar, o PDF original continua válido
+    return True
+
+
+def _converter(tipo, params, saida):
+    entradas = params["entradas"]
+    if tipo == "txt":
+        from functions.txt_to_pdf import convert_files_to_pdf
+        from configs.config_manager import perfis
+        # {"nome": ..., "usuario": ...}: the profile the config came from, compiled once per process
+        perfil = perfis().compilado(**params["perfil"]) if params.get("perfil") else None
+        return convert_files_to_pdf(entradas, saida, params.get("config") or {}, params.get("process_latex", False), perfil)
+    if tipo == "image":
+        from functions.imagem_to_pdf import imagem_para_pdf
+        return imagem_para_pdf(entradas, saida, params.get("pagina"), params.get("dpi", 100))
+    if tipo == "html":
+        from functions.html_to_pdf import html_para_pdf
+        return html_para_pdf(entradas[0], saida)
+    if tipo == "merge":
+        from modules.pdf_manager import mesclar_pdfs
+        if params.get("intervalos"):
+            entradas = list(zip(entradas, params["intervalos"]))
+        return mesclar_pdfs(entradas, saida)
+    if tipo == "pages":
+        from modules.pdf_manager import operar_paginas
+        return operar_paginas(entradas[0], saida, params["operacoes"])
+    if tipo == "optimize":
+        from modules.pdf_manager import otimizar_pdf
+        return otimizar_pdf(entradas[0], saida) is not None
+    raise ValueError(f"Tipo de job desconhecido: {tipo}")
+
+
+def copiar_resultado(origem, destino):
+    """Disponibiliza um PDF do cache em `destino` (link físico quando possível)."""
+    if os.path.exists(destino):
+        os.remove(destino)
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copyfile(origem, destino)
+
+
+def executar_job(tipo, params):
+    """
+    Executa uma conversão descrita por `tipo` e `params` (um dicionário JSON).
+
+    Tipos suportados: "txt", "image", "html", "merge", "pages" e "optimize".
+    Todos usam `params["entradas"]` (lista de caminhos) e `params["saida"]`;
+    "txt" aceita ainda `config` e `process_latex`, "image" aceita `pagina` e
+    `dpi`, "merge" aceita `intervalos` (uma seleção de páginas por entrada),
+    "pages" exige `operacoes` (ver `operar_paginas`) e "optimize" otimiza o
+    PDF de entrada. Todos aceitam `otimizar`. Com `params["chave_cache"]`, o
+    resultado passa pelo cache de resultados, e jobs idênticos simultâneos
+    geram o PDF uma única vez.
+
+    Returns:
+        bool: True se a conversão foi bem-sucedida, False caso contrário.
+    """
+    chave = params.get("chave_cache")
+    if not chave:
+        return executar_conversao(tipo, params, params["saida"])
+
+    from modules.result_cache import cache_resultados
+    caminho, _ = cache_resultados().obter_ou_gerar(chave, lambda saida: executar_conversao(tipo, params, saida))
+    if caminho is None:
+        return False
+    copiar_resultado(caminho, params["saida"])
+    return True
+
+
+class JobQueue:
+    """
+    Fila de conversões persistida em SQLite e executada por um pool limitado
+    de processos "aquecidos".
+
+    `submit` apenas grava o job e retorna o id; uma thread despachante retira
+    jobs da fila conforme há vagas no pool. Como o estado fica no banco, jobs
+    interrompidos por um reinício (os que estavam "running" em um processo deste
+    host que não existe mais) voltam para a fila na próxima inicialização. Vários
+    processos do servidor podem compartilhar o mesmo banco: a retirada de um
+    job é atômica.
+
+    Se um worker morre no meio de um job (ex.: falta de memória), o pool
+    inteiro quebra: os jobs que estavam nele são marcados como falhos e um
+    pool novo é criado antes do próximo envio.
+    """
+
+    def __init__(self, db_path, max_workers=2, on_finish=None, intervalo=0.5):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.on_finish = on_finish
+        self.intervalo = intervalo
+        self.dono = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool = None
+        self._pool_quebrado = threading.Event()
+        self._thread = None
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+        self._vagas = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._criar_tabela()
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _criar_tabela(self):
+        with closing(self._conectar()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    usuario_id INTEGER,
+                    nome_saida TEXT,
+                    erro TEXT,
+                    dono TEXT,
+                    criado_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, criado_em)")
+
+    # --- API pública -------------------------------------------------------
+
+    def submit(self, tipo, params, usuario_id=None, nome_saida=None, concluido=False):
+        """
+        Enfileira um job e retorna o seu id. Com `concluido=True` o job já é
+        registrado como pronto (ex.: o resultado veio do cache).
+        """
+        job_id = uuid.uuid4().hex
+        agora = time.time()
+        with closing(self._conectar()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, tipo, params, status, usuario_id, nome_saida, criado_em, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tipo, json.dumps(params), CONCLUIDO if concluido else NA_FILA,
+                 usuario_id, nome_saida, agora, agora),
+            )
+        if concluido:
+            return job_id
+        self.iniciar()
+        self._acordar.set()
+        return job_id
+
+    def get(self, job_id):
+        """Retorna o job como dicionário, ou None se não existir."""
+        with closing(self._conectar()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def iniciar(self):
+        """Sobe o pool de workers e a thread despachante (idempotente)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._recuperar_orfaos()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_aquecer_worker)
+            self._thread = threading.Thread(target=self._despachar, name="borgepdf-jobs", daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    # --- Internos ----------------------------------------------------------
+
+    def _recuperar_orfaos(self):
+        """
+        Devolve à fila os jobs "running" deste host cujo processo dono não
+        existe mais. Jobs de outros hosts que compartilham o banco ficam com
+        eles: daqui não dá para saber se o processo dono ainda está vivo.
+        """
+        host = socket.gethostname()
+        with closing(self._conectar()) as conn:
+            rows = conn.execute("SELECT id, dono FROM jobs WHERE status = ?", (EXECUTANDO,)).fetchall()
+            for row in rows:
+                dono_host, _, dono_pid = (row["dono"] or "").rpartition(":")
+                if row["dono"] and (dono_host != host or (dono_pid.isdigit() and self._processo_vivo(int(dono_pid)))):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, dono = NULL, atualizado_em = ? WHERE id = ? AND status = ?",
+                    (NA_FILA, time.time(), row["id"], EXECUTANDO),
+                )
+
+    @staticmethod
+    def _processo_vivo(pid):
+        if pid == os.getpid():
+            return False  # Um reinício pode reaproveitar o mesmo pid
+        return processo_vivo(pid)
+
+    def _retirar_proximo(self):
+        conn = self._conectar()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY criado_em LIMIT 1", (NA_FILA,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, dono = ?, atualizado_em = ? WHERE id = ?",
+                (EXECUTANDO, self.dono, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+            return dict(row)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _reconstruir_pool(self):
+        with self._lock:
+            antigo = self._pool
+            self._pool_quebrado.clear()
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_aquecer_worker)
+        if antigo is not None:
+            antigo.shutdown(wait=False, cancel_futures=True)
+
+    def _devolver(self, job_id):
+        """Devolve à fila um job retirado que não chegou a rodar."""
+        with closing(self._conectar()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, dono = NULL, atualizado_em = ? WHERE id = ? AND status = ?",
+                (NA_FILA, time.time(), job_id, EXECUTANDO),
+            )
+
+    def _despachar(self):
+        while not self._parar.is_set():
+            if self._pool_quebrado.is_set():
+                self._reconstruir_pool()
+            if not self._vagas.acquire(timeout=self.intervalo):
+                continue
+            try:
+                job = self._retirar_proximo()
+            except sqlite3.Error as e:
+                print(f"⚠️ Erro ao ler a fila de jobs: {e}")
+                job = None
+            if job is None:
+                self._vagas.release()
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+                continue
+            try:
+                future = self._pool.submit(executar_job, job["tipo"], json.loads(job["params"]))
+            except (BrokenProcessPool, RuntimeError) as e:
+                # O pool quebrou (ou foi encerrado) antes de aceitar o job: ele volta para a fila
+                print(f"⚠️ Pool de conversão indisponível ({e}); recriando.")
+                try:
+                    self._devolver(job["id"])
+                except sqlite3.Error as erro:
+                    print(f"⚠️ Erro ao devolver o job {job['id']} à fila: {erro}")
+                self._vagas.release()
+                self._reconstruir_pool()
+                continue
+            future.add_done_callback(lambda f, job_id=job["id"]: self._concluir(job_id, f))
+
+    def _concluir(self, job_id, future):
+        try:
+            try:
+                ok = future.result()
+                erro = None if ok else "A conversão falhou."
+            except BrokenProcessPool:
+                ok, erro = False, "O processo de conversão foi encerrado (falta de memória?)."
+                self._pool_quebrado.set()
+            except Exception as e:
+                ok, erro = False, str(e) or type(e).__name__
+            try:
+                with closing(self._conectar()) as conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                        (CONCLUIDO if ok else FALHOU, erro, time.time(), job_id),
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ Erro ao registrar a conclusão do job {job_id}: {e}")
+                return
+            if self.on_finish is not None:
+                try:
+                    self.on_finish(self.get(job_id))
+                except Exception as e:
+                    print(f"⚠️ Erro no callback de conclusão do job {job_id}: {e}")
+        finally:
+            self._vagas.release()
+            self._acordar.set()
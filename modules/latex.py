@@ -1,7 +1,33 @@
+import os
 import re
+import math
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from sympy import preview
 from io import BytesIO
 
+from configs.config import CACHE_DIR, LATEX_CACHE_MAX_BYTES, LATEX_CACHE_MEMORIA
+from .disk_cache import DiskLRUCache, MemoryLRU, chave_hash
+from .image_pipeline import DPI_LATEX
+
+# Cache em dois níveis: LRU em memória na frente de um armazenamento de PNGs em disco.
+_cache_memoria = MemoryLRU(LATEX_CACHE_MEMORIA)
+_caches_disco = {
+    "png": DiskLRUCache(os.path.join(CACHE_DIR, "latex"), LATEX_CACHE_MAX_BYTES, extensao=".png"),
+    "svg": DiskLRUCache(os.path.join(CACHE_DIR, "latex"), LATEX_CACHE_MAX_BYTES, extensao=".svg"),
+}
+
+# Preâmbulo do modo em lote: uma fórmula por página, recortada depois pelo dvipng (-T tight).
+PREAMBULO_LOTE = (
+    "\\documentclass[12pt]{article}\n"
+    "\\usepackage{amsmath,amsfonts}\n"
+    "\\pagestyle{empty}\n"
+    "\\begin{document}\n"
+)
+LOTE_MINIMO = 16  # Abaixo disso não compensa abrir mais um processo TeX
+
 def extract_latex_blocks(text):
     """Extrai blocos de LaTeX do texto usando a sintaxe $$ ... $$"""
     pattern = r'\$\$(.*?)\$\$'
@@ -26,14 +52,154 @@ def replace_latex_with_placeholders(text):
     text = re.sub(inline_pattern, replacer, text, flags=re.DOTALL)
     return text, placeholders
 
-def render_latex_to_image(latex_str):
-    """Renderiza uma fórmula LaTeX como imagem PNG usando SymPy"""
+def chave_latex(latex_str, dpi=DPI_LATEX, preamble=None, formato="png"):
+    """Chave de cache de uma fórmula: hash da fórmula, do DPI, do preâmbulo e do formato."""
+    return chave_hash(formato, str(dpi), preamble or "", latex_str)
+
+def obter_latex_em_cache(chave, formato="png"):
+    """Procura uma fórmula já renderizada na memória e depois no disco."""
+    dados = _cache_memoria.obter(chave)
+    if dados is None:
+        dados = _caches_disco[formato].obter(chave)
+        if dados is not None:
+            _cache_memoria.guardar(chave, dados)
+    return dados
+
+def guardar_latex_em_cache(chave, dados, formato="png"):
+    _cache_memoria.guardar(chave, dados)
+    _caches_disco[formato].guardar(chave, dados)
+
+def render_latex_to_image(latex_str, dpi=DPI_LATEX, preamble=None):
+    """Renderiza uma fórmula LaTeX como imagem PNG usando SymPy (com cache)"""
+    chave = chave_latex(latex_str, dpi, preamble)
+    dados = obter_latex_em_cache(chave)
+    if dados is not None:
+        return BytesIO(dados)
+
     buf = BytesIO()
     try:
         preview(f"${latex_str}$", output="png", viewer="BytesIO",
-                outputbuffer=buf, euler=False, dvioptions=['-D', '300'])
-        buf.seek(0)
-        return buf
+                outputbuffer=buf, euler=False, preamble=preamble,
+                dvioptions=['-D', str(dpi)])
     except Exception as e:
         print(f"⚠️ Erro ao renderizar LaTeX '{latex_str}': {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+    guardar_latex_em_cache(chave, buf.getvalue())
+    buf.seek(0)
+    return buf
+
+def _renderizar_lote(formulas, dpi, preamble, formato="png"):
+    """
+    Compila todas as fórmulas como páginas de um único documento TeX e separa
+    a saída do dvipng (PNG) ou do dvisvgm (SVG) em um arquivo por página.
+    Retorna uma lista de bytes na mesma ordem de `formulas`, ou None se o lote
+    falhar como um todo.
+    """
+    corpo = "\n\\newpage\n".join(f"${formula}$" for formula in formulas)
+    documento = (preamble or PREAMBULO_LOTE) + corpo + "\n\\end{document}\n"
+    with tempfile.TemporaryDirectory(prefix="borgepdf_latex_") as pasta:
+        with open(os.path.join(pasta, "lote.tex"), "w", encoding="utf-8") as f:
+            f.write(documento)
+        try:
+            subprocess.run(["latex", "-interaction=nonstopmode", "-halt-on-error", "lote.tex"],
+                           cwd=pasta, capture_output=True, check=True, timeout=300)
+            if formato == "svg":
+                # --no-fonts converte os glifos em caminhos, que o svglib entende.
+                comando = ["dvisvgm", "--no-fonts", "--page=1-", "-o", "pagina%p.svg", "lote.dvi"]
+            else:
+                comando = ["dvipng", "-T", "tight", "-z", "9", "--truecolor", "-D", str(dpi),
+                           "-o", "pagina%d.png", "lote.dvi"]
+            subprocess.run(comando, cwd=pasta, capture_output=True, check=True, timeout=300)
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+        paginas = []
+        for i in range(1, len(formulas) + 1):
+            caminho = os.path.join(pasta, f"pagina{i}.{formato}")
+            if not os.path.exists(caminho):
+                return None
+            with open(caminho, "rb") as f:
+                paginas.append(f.read())
+        return paginas
+
+def _renderizar_individual(formula, dpi, preamble, formato):
+    """Última tentativa para uma fórmula que falhou no lote: SymPy para PNG; SVG não tem fallback."""
+    if formato == "svg":
+        return None
+    buf = render_latex_to_image(formula, dpi, preamble)
+    return buf.getvalue() if buf else None
+
+def _renderizar_lote_ou_individual(formulas, dpi, preamble, formato="png"):
+    """
+    Tenta o lote; se falhar (ex.: uma fórmula inválida derruba o lote inteiro
+    por causa do -halt-on-error), divide-o ao meio e tenta cada metade, até
+    isolar as fórmulas com erro. Assim uma fórmula ruim custa O(log n)
+    execuções do TeX em vez de uma por fórmula do lote.
+    """
+    paginas = _renderizar_lote(formulas, dpi, preamble, formato)
+    if paginas is not None:
+        return paginas
+    if len(formulas) == 1:
+        return [_renderizar_individual(formulas[0], dpi, preamble, formato)]
+    meio = len(formulas) // 2
+    return (_renderizar_lote_ou_individual(formulas[:meio], dpi, preamble, formato)
+            + _renderizar_lote_ou_individual(formulas[meio:], dpi, preamble, formato))
+
+def render_latex_batch(formulas, dpi=DPI_LATEX, preamble=None, processos=None, formato="png"):
+    """
+    Renderiza um conjunto de fórmulas de uma vez, pagando a inicialização do TeX
+    uma vez por lote em vez de uma vez por fórmula.
+
+    Fórmulas repetidas são renderizadas uma única vez e as que já estão no cache
+    não são renderizadas. As pendentes são divididas em lotes distribuídos por
+    um pool de processos (um por núcleo, por padrão). Sem `latex`/`dvipng` no
+    PATH, cai para `render_latex_to_image` fórmula a fórmula.
+
+    Um lote que falha é dividido ao meio até isolar as fórmulas inválidas;
+    só essas voltam como None (PNG ainda tenta o SymPy antes). Com
+    `formato="svg"` as fórmulas saem do dvisvgm como SVG vetorial.
+
+    Retorna um dicionário {fórmula: bytes PNG/SVG ou None}.
+    """
+    resultado = {}
+    pendentes = []
+    for formula in dict.fromkeys(formulas):
+        if not formula.strip():
+            resultado[formula] = None
+            continue
+        dados = obter_latex_em_cache(chave_latex(formula, dpi, preamble, formato), formato)
+        if dados is not None:
+            resultado[formula] = dados
+        else:
+            pendentes.append(formula)
+
+    if not pendentes:
+        return resultado
+
+    conversor = "dvisvgm" if formato == "svg" else "dvipng"
+    if not (shutil.which("latex") and shutil.which(conversor)):
+        if formato == "svg":
+            return {**resultado, **{formula: None for formula in pendentes}}
+        for formula in pendentes:
+            buf = render_latex_to_image(formula, dpi, preamble)
+            resultado[formula] = buf.getvalue() if buf else None
+        return resultado
+
+    processos = processos or os.cpu_count() or 1
+    tamanho = max(LOTE_MINIMO, math.ceil(len(pendentes) / processos))
+    lotes = [pendentes[i:i + tamanho] for i in range(0, len(pendentes), tamanho)]
+
+    if len(lotes) == 1:
+        renderizados = [_renderizar_lote_ou_individual(lotes[0], dpi, preamble, formato)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(lotes))) as pool:
+            renderizados = list(pool.map(_renderizar_lote_ou_individual, lotes, [dpi] * len(lotes),
+                                         [preamble] * len(lotes), [formato] * len(lotes)))
+
+    for lote, paginas in zip(lotes, renderizados):
+        for formula, dados in zip(lote, paginas):
+            if dados is not None:
+                guardar_latex_em_cache(chave_latex(formula, dpi, preamble, formato), dados, formato)
+            resultado[formula] = dados
+    return resultado
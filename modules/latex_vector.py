@@ -0,0 +1,73 @@
+import shutil
+from io import BytesIO
+from reportlab.platypus import Flowable
+from reportlab.graphics import renderPDF
+
+try:
+    from svglib.svglib import svg2rlg
+except ImportError:  # svglib é opcional: sem ele, as fórmulas continuam em PNG
+    svg2rlg = None
+
+from .disk_cache import MemoryLRU
+from .latex import chave_latex
+
+# Desenhos já convertidos do SVG, reaproveitados entre documentos do mesmo processo.
+_desenhos = MemoryLRU(512)
+
+
+def vetorial_disponivel():
+    """Indica se o modo vetorial pode ser usado neste ambiente."""
+    return svg2rlg is not None and bool(shutil.which("latex")) and bool(shutil.which("dvisvgm"))
+
+
+class LatexFormula(Flowable):
+    """
+    Fórmula LaTeX vetorial, desenhada como um Form XObject do PDF.
+
+    A primeira ocorrência no documento define o form; as demais apenas o
+    referenciam com `doForm`, então a mesma fórmula repetida ocupa espaço uma
+    única vez no arquivo final.
+    """
+
+    def __init__(self, chave, desenho):
+        super().__init__()
+        self.form_name = f"latex_{chave[:20]}"
+        self.desenho = desenho
+        self.width = desenho.width
+        self.height = desenho.height
+        self._escala = 1.0
+
+    def wrap(self, availWidth, availHeight):
+        self._escala = min(1.0, availWidth / self.desenho.width) if self.desenho.width else 1.0
+        self.width = self.desenho.width * self._escala
+        self.height = self.desenho.height * self._escala
+        return self.width, self.height
+
+    def draw(self):
+        canv = self.canv
+        if not canv.hasForm(self.form_name):
+            canv.beginForm(self.form_name, 0, 0, self.desenho.width, self.desenho.height)
+            renderPDF.draw(self.desenho, canv, 0, 0)
+            canv.endForm()
+        canv.saveState()
+        canv.scale(self._escala, self._escala)
+        canv.doForm(self.form_name)
+        canv.restoreState()
+
+
+def criar_formula_vetorial(latex_str, svg_bytes, preamble=None):
+    """Converte o SVG de uma fórmula em um `LatexFormula`, ou None se não for possível."""
+    if svg2rlg is None or not svg_bytes:
+        return None
+    chave = chave_latex(latex_str, preamble=preamble, formato="svg")
+    desenho = _desenhos.obter(chave)
+    if desenho is None:
+        try:
+            desenho = svg2rlg(BytesIO(svg_bytes))
+        except Exception as e:
+            print(f"⚠️ Erro ao converter SVG da fórmula '{latex_str}': {e}")
+            return None
+        if desenho is None or not desenho.width or not desenho.height:
+            return None
+        _desenhos.guardar(chave, desenho)
+    return LatexFormula(chave, desenho)
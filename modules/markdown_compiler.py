@@ -0,0 +1,376 @@
+import re
+from html import unescape
+from xml.sax.saxutils import escape
+
+import markdown
+from markdown.util import AMP_SUBSTITUTE, HTML_PLACEHOLDER_RE, STX, ETX
+from markdown.extensions.footnotes import NBSP_PLACEHOLDER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import (
+    CondPageBreak,
+    Flowable,
+    HRFlowable,
+    Indenter,
+    ListFlowable,
+    ListItem,
+    Paragraph,
+    Preformatted,
+    Table,
+    TableStyle,
+)
+
+from .markdown_parser import MarkdownParser
+from .image_pipeline import imagem_flowable, DPI_ALVO_PADRAO, DPI_LATEX
+
+MARKDOWN_EXTENSIONS = ["extra", "fenced_code", "tables", "footnotes"]
+
+# Inline Markdown elements and their ReportLab Paragraph markup.
+_INLINE_TAGS = {
+    "strong": ("<b>", "</b>"),
+    "b": ("<b>", "</b>"),
+    "em": ("<i>", "</i>"),
+    "i": ("<i>", "</i>"),
+    "u": ("<u>", "</u>"),
+    "del": ("<strike>", "</strike>"),
+    "s": ("<strike>", "</strike>"),
+    "sup": ("<super>", "</super>"),
+    "sub": ("<sub>", "</sub>"),
+    "code": ('<font face="Courier">', "</font>"),
+}
+_BLOCK_TAGS = {"p", "ul", "ol", "pre", "table", "blockquote", "div", "dl", "hr", "h1", "h2", "h3", "h4", "h5", "h6"}
+_ESCAPED_CHAR_RE = re.compile(STX + r"(\d+)" + ETX)
+_CODE_BLOCK_RE = re.compile(r"\s*<pre[^>]*>\s*<code[^>]*>(.*?)</code>\s*</pre>\s*$", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+class _InlineRun:
+    """
+    Paragraph markup accumulated for one block. Formulas and images cannot
+    live inside a Paragraph, so they split the run: open inline tags are
+    closed before them and reopened after.
+    """
+
+    def __init__(self, style, prefix=""):
+        self.style = style
+        self.parts = [prefix] if prefix else []
+        self.open_tags = []
+        self.flowables = []
+
+    def markup(self, text):
+        self.parts.append(text)
+
+    def push(self, open_tag, close_tag):
+        self.parts.append(open_tag)
+        self.open_tags.append((open_tag, close_tag))
+
+    def pop(self):
+        _, close_tag = self.open_tags.pop()
+        self.parts.append(close_tag)
+
+    def flowable(self, flowable):
+        self._flush()
+        if flowable is not None:
+            self.flowables.append(flowable)
+        self.parts = [open_tag for open_tag, _ in self.open_tags]
+
+    def finish(self):
+        self._flush()
+        return self.flowables
+
+    def _flush(self):
+        markup = "".join(self.parts + [close_tag for _, close_tag in reversed(self.open_tags)])
+        if _TAG_RE.sub("", markup).strip():
+            self.flowables.append(Paragraph(markup, self.style))
+        self.parts = []
+
+
+class MarkdownCompiler:
+    """
+    Compiles Markdown straight into ReportLab flowables.
+
+    The text goes through Python-Markdown's preprocessors, block parser and
+    treeprocessors, and the resulting element tree is walked directly: no HTML
+    string is serialized and parsed again, inline formatting (bold, italic,
+    code, links) becomes Paragraph markup, and each block element yields its
+    flowables exactly once. Raw HTML blocks that are not LaTeX placeholders or
+    code blocks are handed to `MarkdownParser`.
+    """
+
+    def __init__(self, doc_width, styles, config, table_style=None):
+        self.doc_width = doc_width
+        self.styles = styles
+        self.config = config
+        if table_style is None:
+            table_style = TableStyle(config.get("tabela_estilos", {}).get(config.get("tabela_estilo", "simples"), []))
+        self.table_style = table_style
+        self.latex_images = {}
+        self._md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        self._stash = []
+        self._item_style = ParagraphStyle(name="ListItemBody", parent=styles["ListItem"], leftIndent=0)
+        self._header_style = ParagraphStyle(name="TableHeader", parent=styles["Body"], fontName=styles["Heading2"].fontName)
+
+    def compile(self, text, latex_images=None):
+        """Returns the flowables for one Markdown text block."""
+        self.latex_images = latex_images or {}
+        md = self._md
+        md.reset()
+        lines = text.split("\n")
+        for preprocessor in md.preprocessors:
+            lines = preprocessor.run(lines)
+        root = md.parser.parseDocument(lines).getroot()
+        for treeprocessor in md.treeprocessors:
+            new_root = treeprocessor.run(root)
+            if new_root is not None:
+                root = new_root
+        self._stash = md.htmlStash.rawHtmlBlocks
+
+        story = []
+        for elem in root:
+            story.extend(self._block(elem))
+        return story
+
+    # --- Blocks ------------------------------------------------------------
+
+    def _block(self, elem, style=None):
+        tag = elem.tag
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            return self._heading(elem)
+        if tag == "p":
+            raw = self._raw_placeholder(elem)
+            if raw is not None:
+                return self._raw_html(raw)
+            return self._inline_flowables(elem, style or self.styles["Body"])
+        if tag in ("ul", "ol"):
+            return [self._list(elem)]
+        if tag == "table":
+            return [self._table(elem)]
+        if tag == "pre":
+            return [self._code("".join(elem.itertext()))]
+        if tag == "blockquote":
+            indent = self.styles["ListItem"].leftIndent
+            return [Indenter(left=indent), *self._blocks(elem, style), Indenter(left=-indent)]
+        if tag == "hr":
+            return [HRFlowable(width="100%", thickness=0.5, color=self.styles["Body"].textColor, spaceBefore=6, spaceAfter=6)]
+        if tag == "div" and "footnote" in elem.get("class", "").split():
+            return self._footnotes(elem)
+        if tag == "dl":
+            return self._definition_list(elem)
+        if tag == "div":
+            return self._blocks(elem, style)
+        return self._mixed(elem, style or self.styles["Body"])
+
+    def _blocks(self, elem, style=None):
+        flowables = []
+        for child in elem:
+            flowables.extend(self._block(child, style))
+        return flowables
+
+    def _mixed(self, elem, style, prefix=""):
+        """Content that mixes inline text with nested blocks (list items, definitions)."""
+        flowables = []
+        run = _InlineRun(style, prefix)
+        if elem.text:
+            self._text(elem.text, run)
+        for child in elem:
+            if child.tag in _BLOCK_TAGS:
+                flowables.extend(run.finish())
+                flowables.extend(self._block(child, style))
+                run = _InlineRun(style)
+            else:
+                self._inline_child(child, run)
+            if child.tail:
+                self._text(child.tail, run)
+        flowables.extend(run.finish())
+        return flowables
+
+    def _heading(self, elem):
+        style = self.styles["Heading1"] if elem.tag == "h1" else self.styles["Heading2"]
+        flowables = self._inline_flowables(elem, style)
+        paragraphs = [f for f in flowables if isinstance(f, Paragraph)]
+        if self.config.get("incluir_sumario") and paragraphs:
+            level = 0 if elem.tag == "h1" else 1
+            text = paragraphs[0].getPlainText()
+            paragraphs[0].bookmark = f"h{level}_" + re.sub(r"[^\w-]", "_", text)
+            paragraphs[0].level = level
+        if self.config.get("verificar_titulos", True) and flowables:
+            # Keep room for the heading plus a few body lines, otherwise start a new page.
+            flowables.insert(0, CondPageBreak(style.leading + 3 * self.styles["Body"].leading))
+        return flowables
+
+    def _list(self, elem):
+        items = []
+        for li in elem.findall("li"):
+            flowables = self._mixed(li, self._item_style)
+            if flowables:
+                items.append(ListItem(flowables))
+        options = {}
+        if elem.tag == "ol":
+            options["bulletType"] = "1"
+            if elem.get("start", "").isdigit():
+                options["start"] = int(elem.get("start"))
+        else:
+            options["bulletType"] = "bullet"
+        return ListFlowable(
+            items,
+            leftIndent=self.styles["ListItem"].leftIndent,
+            bulletFontName=self.styles["ListItem"].fontName,
+            bulletFontSize=self.styles["ListItem"].fontSize,
+            spaceAfter=self.styles["ListItem"].spaceAfter,
+            **options,
+        )
+
+    def _table(self, elem):
+        rows = []
+        header_rows = 0
+        for section in (elem.findall("thead") + elem.findall("tbody")) or [elem]:
+            for tr in section.iter("tr"):
+                cells = []
+                for cell in tr:
+                    style = self._header_style if cell.tag == "th" else self.styles["Body"]
+                    flowables = self._inline_flowables(cell, style)
+                    cells.append(flowables[0] if len(flowables) == 1 else flowables or "")
+                rows.append(cells)
+                if section.tag == "thead":
+                    header_rows += 1
+
+        columns = max((len(row) for row in rows), default=1) or 1
+        rows = [row + [""] * (columns - len(row)) for row in rows]
+        table = Table(rows or [[""]], colWidths=[self.doc_width / columns] * columns, repeatRows=header_rows)
+        table.setStyle(self.table_style)
+        return table
+
+    def _code(self, text):
+        style = self.styles["Code"]
+        max_chars = max(20, int(self.doc_width / (style.fontSize * 0.6)))
+        return Preformatted(unescape(text).rstrip("\n"), style, maxLineLength=max_chars, newLineChars="")
+
+    def _footnotes(self, elem):
+        flowables = []
+        for child in elem:
+            if child.tag == "hr":
+                flowables.extend(self._block(child))
+            elif child.tag == "ol":
+                for number, li in enumerate(child.findall("li"), 1):
+                    prefix = f"<super>{number}</super> "
+                    for part in li:
+                        if part.tag == "p":
+                            run = _InlineRun(self.styles["Footnote"], prefix)
+                            self._inline(part, run)
+                            flowables.extend(run.finish())
+                            prefix = ""
+                        else:
+                            flowables.extend(self._block(part, self.styles["Footnote"]))
+        return flowables
+
+    def _definition_list(self, elem):
+        flowables = []
+        indent = self.styles["ListItem"].leftIndent
+        for child in elem:
+            if child.tag == "dt":
+                run = _InlineRun(self.styles["Body"])
+                run.push("<b>", "</b>")
+                self._inline(child, run)
+                run.pop()
+                flowables.extend(run.finish())
+            else:
+                flowables.append(Indenter(left=indent))
+                flowables.extend(self._mixed(child, self.styles["Body"]))
+                flowables.append(Indenter(left=-indent))
+        return flowables
+
+    # --- Raw HTML and media ------------------------------------------------
+
+    def _raw_placeholder(self, elem):
+        """Returns the stashed raw HTML when a paragraph is only a stash placeholder."""
+        if len(elem):
+            return None
+        match = HTML_PLACEHOLDER_RE.fullmatch((elem.text or "").strip())
+        if not match or int(match.group(1)) >= len(self._stash):
+            return None
+        return self._stash[int(match.group(1))]
+
+    def _raw_html(self, raw):
+        if not isinstance(raw, str):  # md_in_html keeps already parsed elements
+            return self._block(raw)
+        if raw.strip() in self.latex_images:
+            formula = self._formula(raw.strip())
+            return [formula] if formula is not None else []
+        match = _CODE_BLOCK_RE.match(raw)
+        if match:
+            return [self._code(match.group(1))]
+        parser = MarkdownParser(None, styles=self.styles, config=self.config, latex_images=self.latex_images, doc_width=self.doc_width)
+        parser.feed(raw)
+        return parser.story
+
+    def _formula(self, placeholder):
+        formula = self.latex_images[placeholder]
+        if isinstance(formula, Flowable):
+            return formula
+        return self._image(formula, DPI_LATEX)
+
+    def _image(self, src, dpi_origem=72):
+        dpi = self.config.get("imagem_dpi_alvo", DPI_ALVO_PADRAO)
+        return imagem_flowable(src, self.doc_width, dpi_alvo=dpi, dpi_origem=dpi_origem)
+
+    # --- Inline content ----------------------------------------------------
+
+    def _inline_flowables(self, elem, style):
+        run = _InlineRun(style)
+        self._inline(elem, run)
+        return run.finish()
+
+    def _inline(self, elem, run):
+        if elem.text:
+            self._text(elem.text, run)
+        for child in elem:
+            self._inline_child(child, run)
+            if child.tail:
+                self._text(child.tail, run)
+
+    def _inline_child(self, child, run):
+        tag = child.tag
+        css_class = child.get("class", "")
+        if tag == "br":
+            run.markup("<br/>")
+        elif tag == "img":
+            run.flowable(self._image(child.get("src")))
+        elif tag == "a" and "footnote-backref" in css_class:
+            return
+        elif tag == "a" and child.get("href") and not child.get("href").startswith("#"):
+            href = escape(child.get("href"), {'"': "&quot;"})
+            run.push(f'<a href="{href}" color="blue">', "</a>")
+            self._inline(child, run)
+            run.pop()
+        elif tag in _INLINE_TAGS:
+            run.push(*_INLINE_TAGS[tag])
+            self._inline(child, run)
+            run.pop()
+        else:
+            self._inline(child, run)
+
+    def _text(self, text, run):
+        """Escapes text for Paragraph markup, resolving the Markdown stash placeholders."""
+        position = 0
+        for match in HTML_PLACEHOLDER_RE.finditer(text):
+            run.markup(self._escape(text[position:match.start()]))
+            position = match.end()
+            index = int(match.group(1))
+            raw = self._stash[index] if index < len(self._stash) else ""
+            if not isinstance(raw, str):
+                continue
+            if raw.strip() in self.latex_images:
+                run.flowable(self._formula(raw.strip()))
+            elif re.fullmatch(r"\s*<br\s*/?>\s*", raw, re.IGNORECASE):
+                run.markup("<br/>")
+            else:
+                run.markup(self._escape(_TAG_RE.sub("", raw)))
+        run.markup(self._escape(text[position:]))
+
+    @staticmethod
+    def _escape(text):
+        if not text:
+            return ""
+        # Placeholders that Markdown's postprocessors would replace (the tree is read directly)
+        text = text.replace(AMP_SUBSTITUTE, "&").replace(NBSP_PLACEHOLDER, "\xa0")
+        text = _ESCAPED_CHAR_RE.sub(lambda m: chr(int(m.group(1))), text)
+        return escape(unescape(text))
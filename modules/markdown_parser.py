@@ -1,20 +1,27 @@
 import os
+import re
 from reportlab.platypus import (
+    CondPageBreak,
+    Flowable,
     Paragraph,
-    Image as ReportLabImage,
     Table,
     TableStyle,
-    PageBreak,
 )
-from PIL import Image
 from html.parser import HTMLParser
 
+from .image_pipeline import imagem_flowable, DPI_ALVO_PADRAO, DPI_LATEX
+
 class MarkdownParser(HTMLParser):
     """
     An HTML parser that converts a stream of HTML into ReportLab flowables.
     It is driven by configuration and style dictionaries, with no global state access.
+
+    Parsing is a single linear pass: nothing is measured here. Page breaks,
+    heading keep-with-next and widow/orphan control are left to the frame
+    layout (keepWithNext/allowWidows in the styles plus a CondPageBreak
+    before each heading when "verificar_titulos" is on).
     """
-    def __init__(self, doc_height, styles, config, latex_images=None):
+    def __init__(self, doc_height, styles, config, latex_images=None, doc_width=None):
         super().__init__()
         self.story = []
         self.headings = []
@@ -28,11 +35,8 @@ class MarkdownParser(HTMLParser):
         self.table_raw_data = []
         self.current_raw_row = []
         self.list_level = 0
-
-        # Page position tracking for rudimentary widow/orphan control
-        self.y_position = doc_height
         self.doc_height = doc_height
-        self.page_counter = 1
+        self.doc_width = doc_width or config.get("doc_width")
 
     def handle_starttag(self, tag, attrs):
         if tag == "h1":
@@ -62,67 +66,57 @@ class MarkdownParser(HTMLParser):
         elif tag == "tr":
             self.table_raw_data.append(self.current_raw_row)
 
+    def handle_comment(self, data):
+        # LaTeX placeholders survive markdown as HTML comments.
+        placeholder = f"<!--{data}-->"
+        if placeholder in self.latex_images:
+            self.handle_data(placeholder)
+
     def handle_data(self, data):
         data = data.strip()
         if not data:
             return
 
-        # Handle LaTeX placeholder images
+        # Handle LaTeX placeholders: vector forms are ready-made flowables,
+        # raster formulas arrive as PNG buffers.
         if data in self.latex_images:
-            self._add_image(self.latex_images[data], is_buffer=True)
+            formula = self.latex_images[data]
+            if isinstance(formula, Flowable):
+                self.story.append(formula)
+            else:
+                self._add_image(formula, DPI_LATEX)
             return
 
         if self.in_table:
             self.current_raw_row.append(data)
-        else:
-            # Basic widow/orphan control for headings
-            if "Heading" in self.current_style_name and self.config.get("verificar_titulos", True):
-                # If a heading is near the bottom of the page, insert a page break before it.
-                if self.y_position < self.config.get("margem_inf", 50) + self.config.get("tamanho_fonte", 12) * 3:
-                    self._add_page_break()
-
-            style = self.styles.get(self.current_style_name, self.styles["Body"])
-
-            if self.current_style_name == "ListItem":
-                # A real implementation would handle nested lists; this is simplified.
-                prefix = "• "
-                p = Paragraph(f"{prefix}{data}", style)
-            else:
-                p = Paragraph(data, style)
-
-            self.story.append(p)
-            self._update_y_position(p.wrap(self.doc_height, 0)[1])
-
-            # Add to table of contents if it's a heading
-            if self.config.get("incluir_sumario") and "Heading" in self.current_style_name:
-                level = 0 if self.current_style_name == "Heading1" else 1
-                p = Paragraph(data, style)
-                p.bookmark = f"h{level}_{data}"
-                p.level = level
-                self.story.append(p)
-            else:
-                p = Paragraph(data, style)
-                self.story.append(p)
+            return
 
-    def _add_image(self, src, is_buffer=False):
-        try:
-            img_path_or_buffer = src
-            if is_buffer:
-                img_path_or_buffer.seek(0)
+        style = self.styles.get(self.current_style_name, self.styles["Body"])
+        is_heading = "Heading" in self.current_style_name
 
-            img = Image.open(img_path_or_buffer)
-            img_width, img_height = img.size
+        if is_heading and self.config.get("verificar_titulos", True):
+            # Keep room for the heading plus a few body lines, otherwise start a new page.
+            self.story.append(CondPageBreak(style.leading + 3 * self.styles["Body"].leading))
 
-            max_width = self.config.get("doc_width") # Expect this to be pre-calculated in config
-            scale = min(1.0, max_width / img_width)
+        if self.current_style_name == "ListItem":
+            # A real implementation would handle nested lists; this is simplified.
+            p = Paragraph(f"• {data}", style)
+        else:
+            p = Paragraph(data, style)
 
-            img_flowable = ReportLabImage(img_path_or_buffer, width=img_width * scale, height=img_height * scale)
-            self.story.append(img_flowable)
-            self._update_y_position(img_flowable.height)
+        # Add to table of contents if it's a heading
+        if self.config.get("incluir_sumario") and is_heading:
+            level = 0 if self.current_style_name == "Heading1" else 1
+            p.bookmark = f"h{level}_" + re.sub(r"[^\w-]", "_", data)
+            p.level = level
 
-        except Exception:
-            # Fail silently, a real app should log this.
-            pass
+        self.story.append(p)
+
+    def _add_image(self, src, dpi_origem=72):
+        dpi = self.config.get("imagem_dpi_alvo", DPI_ALVO_PADRAO)
+        img_flowable = imagem_flowable(src, self.doc_width, dpi_alvo=dpi, dpi_origem=dpi_origem)
+        if img_flowable is not None:
+            self.story.append(img_flowable)
 
     def _add_table(self):
         # This logic is complex and has been simplified. A full implementation
@@ -135,14 +129,3 @@ class MarkdownParser(HTMLParser):
         table.setStyle(TableStyle(style_config))
 
         self.story.append(table)
-        self._update_y_position(table.wrap(0, 0)[1])
-
-    def _update_y_position(self, height):
-        self.y_position -= height
-        if self.y_position < self.config.get("margem_inf", 50):
-            self._add_page_break()
-
-    def _add_page_break(self):
-        self.story.append(PageBreak())
-        self.y_position = self.doc_height
-        self.page_counter += 1
@@ -1,8 +1,13 @@
 import os
 from constants.watermarker import marca_dagua
-from PIL import Image
+from modules.image_pipeline import imagem_para_canvas, DPI_ALVO_PADRAO
 from reportlab.lib import colors
 
+# Nome do form com a decoração fixa (fundo, imagem, borda e marca d'água).
+# Forms são por canvas, então o nome só precisa ser único dentro do documento.
+FORM_DECORACAO = "borgepdf_decoracao"
+
+
 def aplicar_modelo_pagina(canvas, doc, config, modelo_config):
     """Aplica o estilo de fundo e borda da página."""
     canvas.saveState()
@@ -10,46 +15,51 @@ def aplicar_modelo_pagina(canvas, doc, config, modelo_config):
     # Cor de fundo
     if modelo_config.get("cor_fundo"):
         canvas.setFillColor(modelo_config["cor_fundo"])
-        canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=1)
+        canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=1, stroke=0)
 
-    # Imagem de fundo
+    # Imagem de fundo, reduzida para a resolução alvo no tamanho da página
     img_fundo_path = config.get("imagem_fundo")
     if img_fundo_path and os.path.exists(img_fundo_path):
         try:
-            img = Image.open(img_fundo_path).convert("RGB")
-            # Lógica para escalar e desenhar a imagem de fundo
-            canvas.drawImage(img_fundo_path, 0, 0, width=doc.pagesize[0], height=doc.pagesize[1], preserveAspectRatio=True)
+            fonte = imagem_para_canvas(img_fundo_path, doc.pagesize[0], doc.pagesize[1], config.get("imagem_dpi_alvo", DPI_ALVO_PADRAO))
+            canvas.drawImage(fonte, 0, 0, width=doc.pagesize[0], height=doc.pagesize[1], preserveAspectRatio=True)
         except Exception as e:
-            # Log error instead of printing
-            pass
+            print(f"⚠️ Imagem de fundo ignorada: {e}")
 
     # Borda
     if modelo_config.get("borda"):
         canvas.setStrokeColor(modelo_config["borda"])
         canvas.setLineWidth(2)
-        canvas.rect(config.get("margem_esq"), config.get("margem_inf"), doc.width, doc.height, stroke=1, fill=0)
+        canvas.rect(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, stroke=1, fill=0)
 
     canvas.restoreState()
 
 
-def adicionar_pagina(canvas, doc, config, pagina_atual):
+def desenhar_decoracao_fixa(canvas, doc, config, modelo_config):
+    """Desenha tudo o que é igual em todas as páginas: modelo de página e marca d'água."""
+    aplicar_modelo_pagina(canvas, doc, config, modelo_config)
+
+    if config.get("incluir_marca_dagua", False):
+        marca_dagua(canvas, doc.pagesize[0])
+
+
+def adicionar_pagina(canvas, doc, config, pagina_atual, modelo_config):
     """
     Desenha os elementos fixos em cada página, como numeração e marca d'água.
-    Controlado por um dicionário de configuração.
-    """
-    canvas.saveState()
+    Controlado por um dicionário de configuração; `modelo_config` é o modelo
+    de página já resolvido pelo perfil compilado (`PerfilCompilado.modelo_pagina`).
 
-    # Modelos de página
-    modelos_pagina = {
-        "padrao": {"cor_fundo": colors.white, "borda": None},
-        "colorido": {"cor_fundo": colors.HexColor("#E6F3FA"), "borda": colors.HexColor("#000080")},
-        "profissional": {"cor_fundo": colors.white, "borda": colors.HexColor("#4A4A4A")}
-    }
-    modelo_selecionado = config.get("modelo_pagina", "padrao")
-    modelo_config = modelos_pagina.get(modelo_selecionado, modelos_pagina["padrao"])
+    A decoração fixa é compilada uma única vez por documento em um form PDF
+    (`FORM_DECORACAO`); as páginas seguintes só o referenciam, e o trabalho
+    por página se resume à numeração.
+    """
+    if not canvas.hasForm(FORM_DECORACAO):
+        canvas.beginForm(FORM_DECORACAO, 0, 0, doc.pagesize[0], doc.pagesize[1])
+        desenhar_decoracao_fixa(canvas, doc, config, modelo_config)
+        canvas.endForm()
 
-    # Aplicar cor de fundo e bordas
-    aplicar_modelo_pagina(canvas, doc, config, modelo_config)
+    canvas.saveState()
+    canvas.doForm(FORM_DECORACAO)
 
     # Paginação
     paginacao = config.get("paginacao", {"tipo": "nenhuma"})
@@ -66,10 +76,6 @@ def adicionar_pagina(canvas, doc, config, pagina_atual):
                 page_num_text = f"Página {pagina_atual}"
                 canvas.drawCentredString(doc.pagesize[0] / 2, config.get("margem_inf", 20) * 0.5, page_num_text)
 
-    # Marca d'água
-    if config.get("incluir_marca_dagua", False):
-        marca_dagua(canvas, doc.width + config.get("margem_esq", 40) + config.get("margem_dir", 40))
-
     canvas.restoreState()
 
 
@@ -0,0 +1,275 @@
+import os
+import re
+from io import BytesIO
+from pypdf.generic import TextStringObject
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, PageBreak, Spacer
+from reportlab.platypus.tableofcontents import TableOfContents
+
+from .page_manager import adicionar_pagina
+from .pdf_writer import StreamingPdfWriter
+from .pdf_manager import _CopiadorPdf, _EstadoLeitor
+
+# Páginas de decoração renderizadas por vez (limita a memória em documentos longos)
+LOTE_DECORACAO = 50
+
+
+class CanvasComLinks(Canvas):
+    """
+    Canvas que registra os links internos em vez de criá-los.
+
+    Os destinos do sumário ficam em outros segmentos do documento, então os
+    links só podem ser criados depois que as páginas são juntadas.
+    """
+
+    def __init__(self, links, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.links_registrados = links
+
+    def linkRect(self, contents, destinationname, Rect=None, addtopage=1, name=None, relative=1, **kw):
+        if Rect is not None:
+            x1, y1, x2, y2 = self._absRect(Rect, relative)
+            self.links_registrados.append(
+                (self.getPageNumber(), destinationname, (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+            )
+
+    def linkAbsolute(self, contents, destinationname, Rect=None, addtopage=1, name=None, **kw):
+        self.linkRect(contents, destinationname, Rect, addtopage, name, relative=0)
+
+
+class SumarioFixo(TableOfContents):
+    """Sumário com entradas já conhecidas, desenhado em um único `build`."""
+
+    def __init__(self, entradas, **kwargs):
+        super().__init__(**kwargs)
+        self._lastEntries = list(entradas)
+        self._entries = list(entradas)
+
+    def _getlastEntries(self, dummy=None):
+        return self._lastEntries
+
+
+def _chave_segura(chave):
+    return re.sub(r"[^\w-]", "_", chave)
+
+
+def titulos_globais(segmentos, primeira_pagina):
+    """
+    Converte os títulos de cada segmento (página local) em entradas de sumário
+    com a numeração global e chaves únicas: [(nível, texto, página, chave)].
+    """
+    entradas = []
+    vistas = {}
+    inicio = primeira_pagina
+    for segmento in segmentos:
+        for nivel, texto, pagina, chave in segmento["titulos"]:
+            chave = _chave_segura(chave)
+            vistas[chave] = vistas.get(chave, 0) + 1
+            if vistas[chave] > 1:
+                chave = f"{chave}_{vistas[chave]}"
+            entradas.append((nivel, texto, inicio + pagina - 1, chave))
+        inicio += segmento["paginas"]
+    return entradas
+
+
+def renderizar_sumario(generator, entradas, caminho):
+    """Renderiza apenas as páginas do sumário; retorna (páginas, links registrados)."""
+    links = []
+    doc = generator._new_doc(caminho)
+    story = [Paragraph("Sumário", generator.styles["Heading1"]), SumarioFixo(entradas)]
+    doc.build(story, canvasmaker=lambda *args, **kwargs: CanvasComLinks(links, *args, **kwargs))
+    return doc.page, links
+
+
+def renderizar_decoracao(generator, paginas, caminho, primeira=1):
+    """
+    Gera um PDF só com a decoração de `paginas` páginas, numeradas a partir
+    de `primeira` (a posição delas no documento final).
+    """
+    doc = generator._new_doc(caminho)
+    story = []
+    for i in range(paginas):
+        story.append(Spacer(1, 1))
+        if i < paginas - 1:
+            story.append(PageBreak())
+
+    def decorar(canvas, doc):
+        adicionar_pagina(canvas, doc, generator.config, primeira + doc.page - 1, generator.profile.modelo_pagina)
+
+    doc.build(story, onFirstPage=decorar, onLaterPages=decorar)
+
+
+def _texto(texto):
+    """String PDF serializada (PDFDocEncoding quando possível, senão UTF-16)."""
+    buffer = BytesIO()
+    TextStringObject(texto).write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+def _destino(numero):
+    return f"[{numero} 0 R /Fit]".encode()
+
+
+def _gravar_link(writer, retangulo, pagina):
+    numero = writer.reservar()
+    caixa = " ".join(f"{valor:.2f}" for valor in retangulo)
+    writer.gravar(numero, b"<< /Type /Annot /Subtype /Link /Rect [" + caixa.encode()
+                  + b"] /Border [0 0 0] /Dest " + _destino(pagina) + b" >>")
+    return numero
+
+
+def _gravar_marcadores(writer, entradas, paginas):
+    """
+    Grava os marcadores (outlines) do PDF a partir das entradas do sumário;
+    `paginas` traz o número de objeto de cada página. Retorna o número da raiz.
+    """
+    raiz = {"numero": writer.reservar(), "filhos": []}
+    pilha = [(-1, raiz)]
+    for nivel, texto, pagina, _ in entradas:
+        while pilha[-1][0] >= nivel:
+            pilha.pop()
+        item = {"numero": writer.reservar(), "texto": texto, "pagina": paginas[pagina - 1], "filhos": []}
+        pilha[-1][1]["filhos"].append(item)
+        pilha.append((nivel, item))
+
+    def gravar(no):
+        """Grava os filhos de `no` e retorna quantos descendentes ele tem."""
+        filhos = no["filhos"]
+        total = 0
+        for i, filho in enumerate(filhos):
+            descendentes = gravar(filho)
+            total += 1 + descendentes
+            partes = [b"<< /Title", _texto(filho["texto"]), f"/Parent {no['numero']} 0 R /Dest".encode(), _destino(filho["pagina"])]
+            if i > 0:
+                partes.append(f"/Prev {filhos[i - 1]['numero']} 0 R".encode())
+            if i < len(filhos) - 1:
+                partes.append(f"/Next {filhos[i + 1]['numero']} 0 R".encode())
+            if filho["filhos"]:
+                partes.append(f"/First {filho['filhos'][0]['numero']} 0 R /Last {filho['filhos'][-1]['numero']} 0 R /Count {descendentes}".encode())
+            partes.append(b">>")
+            writer.gravar(filho["numero"], b" ".join(partes))
+        return total
+
+    total = gravar(raiz)
+    filhos = raiz["filhos"]
+    limites = f"/First {filhos[0]['numero']} 0 R /Last {filhos[-1]['numero']} 0 R " if filhos else ""
+    writer.gravar(raiz["numero"], f"<< /Type /Outlines {limites}/Count {total} >>".encode())
+    return raiz["numero"]
+
+
+def _gravar_destinos(writer, destinos):
+    """Grava a árvore de nomes com os destinos {nome: número da página}; retorna o número dela."""
+    itens = []
+    for nome in sorted(destinos):
+        itens.append(_texto(nome) + b" " + _destino(destinos[nome]))
+    numero = writer.reservar()
+    writer.gravar(numero, b"<< /Dests << /Names [" + b" ".join(itens) + b"] >> >>")
+    return numero
+
+
+def _copiar_parte(generator, copiador, parte, paginas, primeira, links, pasta_temporaria):
+    """
+    Copia as páginas de uma parte para a saída com a decoração por baixo de
+    cada uma. `paginas` são os números reservados para elas e `primeira` a
+    posição (1-based) da primeira página no documento. A decoração é
+    renderizada em lotes de `LOTE_DECORACAO` páginas.
+    """
+    estado = _EstadoLeitor(parte["caminho"])
+    try:
+        fontes = estado.leitor.pages
+        for fonte, numero in zip(fontes, paginas):
+            estado.paginas[fonte.indirect_reference.idnum] = numero
+        for lote in range(0, parte["paginas"], LOTE_DECORACAO):
+            quantidade = min(LOTE_DECORACAO, parte["paginas"] - lote)
+            caminho_decoracao = os.path.join(pasta_temporaria, "decoracao.pdf")
+            renderizar_decoracao(generator, quantidade, caminho_decoracao, primeira + lote)
+            decoracao = _EstadoLeitor(caminho_decoracao)
+            try:
+                for i, fundo in enumerate(decoracao.leitor.pages):
+                    indice = lote + i
+                    form = copiador.copiar_como_form(fundo, decoracao)
+                    anotacoes = [_gravar_link(copiador.writer, retangulo, alvo) for retangulo, alvo in links.get(indice, ())]
+                    copiador.copiar_pagina(fontes[indice], estado, paginas[indice], fundo=form, anotacoes=anotacoes)
+                    # Só o mapa de objetos já gravados fica na memória, não o cache do pypdf
+                    estado.leitor.resolved_objects.clear()
+                    decoracao.leitor.resolved_objects.clear()
+            finally:
+                decoracao.fechar()
+    finally:
+        estado.fechar()
+
+
+def montar_documento(generator, capa, segmentos, saida, pasta_temporaria):
+    """
+    Junta capa, sumário e segmentos de conteúdo em `saida`.
+
+    Cada segmento é um dicionário {"caminho", "paginas", "titulos"} produzido
+    por `PdfGenerator.render_segment`. O sumário (se `incluir_sumario`) é
+    renderizado separadamente com a numeração global, repetindo só as páginas
+    do sumário até a contagem estabilizar; o conteúdo nunca é diagramado de
+    novo. A decoração das páginas é renderizada em lotes, com a numeração e
+    as regras de paginação da ordem final, e posta por baixo de cada página
+    como um Form XObject. Os marcadores do PDF e os destinos nomeados (títulos
+    e `page_N`) vêm das mesmas entradas do sumário.
+
+    As páginas são copiadas uma a uma para um `StreamingPdfWriter`, e cada
+    segmento é fechado assim que termina: a memória depende do tamanho de um
+    segmento, não do documento.
+    """
+    config = generator.config
+    paginas_capa = capa["paginas"] if capa else 0
+
+    sumario = None
+    links = []
+    paginas_sumario = 0
+    if config.get("incluir_sumario", False):
+        caminho_sumario = os.path.join(pasta_temporaria, "sumario.pdf")
+        paginas_sumario = 1
+        for _ in range(3):
+            entradas = titulos_globais(segmentos, paginas_capa + paginas_sumario + 1)
+            paginas, links = renderizar_sumario(generator, entradas, caminho_sumario)
+            if paginas == paginas_sumario:
+                break
+            paginas_sumario = paginas
+        sumario = {"caminho": caminho_sumario, "paginas": paginas_sumario, "titulos": []}
+    entradas = titulos_globais(segmentos, paginas_capa + paginas_sumario + 1)
+
+    partes = [parte for parte in (capa, sumario, *segmentos) if parte and parte["paginas"]]
+    total_paginas = sum(parte["paginas"] for parte in partes)
+
+    try:
+        _gravar_documento(generator, partes, sumario, entradas, links, total_paginas, saida, pasta_temporaria)
+    except BaseException:
+        if os.path.exists(saida):
+            os.remove(saida)
+        raise
+
+
+def _gravar_documento(generator, partes, sumario, entradas, links, total_paginas, saida, pasta_temporaria):
+    config = generator.config
+    with StreamingPdfWriter(saida, versao="1.7") as writer:
+        # Números reservados antes da cópia: links e marcadores podem apontar para páginas adiante.
+        paginas = [writer.reservar() for _ in range(total_paginas)]
+        destinos = {chave: paginas[pagina - 1] for _, _, pagina, chave in entradas}
+        links_sumario = {}
+        for pagina_sumario, chave, retangulo in links:
+            if chave in destinos:
+                links_sumario.setdefault(pagina_sumario - 1, []).append((retangulo, destinos[chave]))
+
+        copiador = _CopiadorPdf(writer)
+        inicio = 0
+        for parte in partes:
+            links_parte = links_sumario if parte is sumario else {}
+            _copiar_parte(generator, copiador, parte, paginas[inicio:inicio + parte["paginas"]],
+                          inicio + 1, links_parte, pasta_temporaria)
+            inicio += parte["paginas"]
+
+        destinos.update({f"page_{indice + 1}": numero for indice, numero in enumerate(paginas)})
+        catalogo = {"/Names": f"{_gravar_destinos(writer, destinos)} 0 R"}
+        if entradas:
+            catalogo["/Outlines"] = f"{_gravar_marcadores(writer, entradas, paginas)} 0 R"
+        writer.fechar(info={
+            "/Title": config.get("capa_titulo", "Documento"),
+            "/Author": config.get("capa_autor", "Autor"),
+            "/Creator": "BorgePDF (Refactored)",
+        }, catalogo=catalogo)
@@ -1,36 +1,118 @@
 import os
-from reportlab.lib.pagesizes import A4
+import json
+import shutil
 from reportlab.platypus import (
     SimpleDocTemplate,
     Paragraph,
-    Image as ReportLabImage,
     Table,
     PageBreak,
     Spacer,
+    KeepInFrame,
 )
-from reportlab.lib.units import mm
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib import colors
-from PIL import Image
 from pypdf import PdfReader
 import markdown
 import tempfile
+from io import BytesIO
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
 
 from .markdown_parser import MarkdownParser
-from reportlab.platypus.tableofcontents import TableOfContents
+from .markdown_compiler import MarkdownCompiler, MARKDOWN_EXTENSIONS
 from .page_manager import adicionar_pagina
-from .validations import validar_fonte
-from .latex import replace_latex_with_placeholders, render_latex_to_image
+from .profile_compiler import compilar_perfil, chave_config
+from .latex import replace_latex_with_placeholders, render_latex_batch
+from .latex_vector import vetorial_disponivel, criar_formula_vetorial
+from .pdf_assembler import montar_documento
+from .image_pipeline import imagem_flowable, DPI_ALVO_PADRAO
+from .disk_cache import DiskLRUCache, chave_hash
+from configs.config import CACHE_DIR, SEGMENT_CACHE_MAX_BYTES
+
+# Streaming: text is read in chunks of about this many characters.
+STREAMING_CHUNK_CHARS = 256 * 1024
+
+
+def iter_markdown_chunks(path, max_chars=STREAMING_CHUNK_CHARS):
+    """
+    Reads a TXT/Markdown file incrementally, yielding chunks of about
+    `max_chars`. Chunks end on a blank line outside fenced code blocks; text
+    without blank lines (logs) is cut at a line end once it grows past four
+    times the limit.
+    """
+    lines, size, in_fence = [], 0, False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            lines.append(line)
+            size += len(line)
+            if size >= max_chars and not in_fence and (not line.strip() or size >= 4 * max_chars):
+                yield "".join(lines)
+                lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+class LazyStory(list):
+    """
+    A story list that refills itself from an iterator of flowables while the
+    doc template consumes it, so only a small window of flowables exists at
+    a time. Setting `paused` makes it look empty, which ends the current
+    build at the next flowable boundary; what is left carries over to the
+    next build.
+    """
+
+    def __init__(self, flowables, window=64):
+        super().__init__()
+        self._source = iter(flowables)
+        self._window = window
+        self.paused = False
+
+    def __len__(self):
+        if self.paused:
+            return 0
+        size = super().__len__()
+        if size < self._window:
+            self.extend(islice(self._source, self._window - size))
+            size = super().__len__()
+        return size
+
+    def exhausted(self):
+        self.paused = False
+        return len(self) == 0
+
 
 class MyDocTemplate(SimpleDocTemplate):
     def __init__(self, filename, **kw):
         super().__init__(filename, **kw)
-        self.toc = TableOfContents()
+        self.headings = []
+        # Streaming builds stop after `page_limit` pages by pausing `lazy_story`.
+        self.page_limit = None
+        self.lazy_story = None
+
+    def beforeDocument(self):
+        self.headings = []
+
+    def afterPage(self):
+        if self.lazy_story is not None and self.page_limit and self.page >= self.page_limit:
+            self.lazy_story.paused = True
 
     def afterFlowable(self, flowable):
-        "Registers TOC entries."
+        "Records where each heading landed, for the TOC, destinations and outlines."
         if hasattr(flowable, 'bookmark') and flowable.bookmark:
-            self.notify('TOCEntry', (flowable.level, flowable.getPlainText(), self.page, flowable.bookmark))
+            self.canv.bookmarkPage(flowable.bookmark)
+            self.headings.append((flowable.level, flowable.getPlainText(), self.page, flowable.bookmark))
+
+
+# Rendered segments of text blocks (PDF + page count and headings), for `build_incremental`.
+_segment_cache = {
+    "pdf": DiskLRUCache(os.path.join(CACHE_DIR, "segmentos"), SEGMENT_CACHE_MAX_BYTES, extensao=".pdf"),
+    "info": DiskLRUCache(os.path.join(CACHE_DIR, "segmentos"), SEGMENT_CACHE_MAX_BYTES, extensao=".json"),
+}
+
+
+def _render_segment(config, text, process_latex, output_filename):
+    """Process-pool worker: lays out one text block as a standalone PDF segment."""
+    return PdfGenerator(config).render_segment([text], output_filename, process_latex)
 
 class PdfGenerator:
     """
@@ -38,69 +120,93 @@ class PdfGenerator:
     This class is UI-independent and driven by a configuration dictionary.
     """
 
-    def __init__(self, config):
+    def __init__(self, config, profile=None):
         self.config = config
-        self.pagesize = A4
-        self.temas = {
-            "moderno": {"fonte": "Helvetica", "cor_texto": colors.black, "cor_titulo": colors.HexColor("#000080")},
-            "classico": {"fonte": "Times-Roman", "cor_texto": colors.black, "cor_titulo": colors.HexColor("#320000")},
-            "minimalista": {"fonte": "Courier", "cor_texto": colors.HexColor("#333333"), "cor_titulo": colors.HexColor("#333333")}
-        }
-        self._define_styles()
-
-    def _define_styles(self):
-        theme = self.temas.get(self.config.get("tema", "moderno"))
-        font_name = validar_fonte(self.config.get("fonte", "Helvetica"))
-        font_size = self.config.get("tamanho_fonte", 12)
-        line_spacing = self.config.get("espacamento_linha", 1.15)
-
-        alignment_map = {"esquerda": 0, "centro": 1, "justificado": 4}
-        alignment = alignment_map.get(self.config.get("alinhamento", "justificado"), 4)
-
-        self.styles = {
-            "Body": ParagraphStyle(name="Body", fontSize=font_size, fontName=font_name, textColor=theme["cor_texto"], spaceAfter=6, leading=font_size * line_spacing, alignment=alignment),
-            "Heading1": ParagraphStyle(name="Heading1", fontSize=font_size + 4, fontName=validar_fonte(font_name, bold=True), textColor=theme["cor_titulo"], spaceAfter=10, keepWithNext=1),
-            "Heading2": ParagraphStyle(name="Heading2", fontSize=font_size + 2, fontName=validar_fonte(font_name, bold=True), textColor=theme["cor_titulo"], spaceAfter=8, keepWithNext=1),
-            "ListItem": ParagraphStyle(name="ListItem", fontSize=font_size, fontName=font_name, textColor=theme["cor_texto"], leftIndent=20, spaceAfter=4),
-            "Footnote": ParagraphStyle(name="Footnote", fontSize=font_size - 2, fontName=font_name, textColor=theme["cor_texto"], spaceAfter=4),
-        }
+        # Styles, page geometry and fonts are compiled once per configuration and process.
+        # A profile from `perfis().compilado()` is reused as long as `config` did not
+        # override what it was compiled from.
+        if profile is None or not profile.serve_para(config):
+            profile = compilar_perfil(config)
+        self.profile = profile
+        self._config_key = None
+        self.pagesize = self.profile.pagesize
+        self.doc_width = self.profile.doc_width
+        self.styles = self.profile.styles
 
     def _add_cover_page(self, story):
         if not self.config.get("incluir_capa", False):
             return
 
         img_path = self.config.get("capa_imagem_path")
-        if img_path and os.path.exists(img_path):
-            try:
-                img = Image.open(img_path).convert("RGB")
-                img_width, img_height = img.size
-                scale = min((self.pagesize[0] - self.config.get("margem_esq", 40) * mm - self.config.get("margem_dir", 40) * mm) / img_width, (self.pagesize[1] / 4) / img_height)
-                story.append(ReportLabImage(img_path, width=img_width * scale, height=img_height * scale))
-                story.append(Spacer(1, 12))
-            except Exception:
-                pass
-
-        story.append(Paragraph(self.config.get("capa_titulo", "Documento"), ParagraphStyle(name="CapaTitulo", fontSize=24, fontName=validar_fonte(self.config.get("fonte", "Helvetica"), bold=True), alignment=1, spaceAfter=20)))
-        story.append(Paragraph(self.config.get("capa_autor", "Autor"), ParagraphStyle(name="CapaAutor", fontSize=16, fontName=validar_fonte(self.config.get("fonte", "Helvetica")), alignment=1, spaceAfter=20)))
-        story.append(Paragraph(self.config.get("capa_data", ""), ParagraphStyle(name="CapaData", fontSize=12, fontName=validar_fonte(self.config.get("fonte", "Helvetica")), alignment=1)))
+        dpi = self.config.get("imagem_dpi_alvo", DPI_ALVO_PADRAO)
+        cover_image = imagem_flowable(img_path, self.doc_width, self.pagesize[1] / 4, dpi_alvo=dpi, ampliar=True)
+        if cover_image is not None:
+            story.append(cover_image)
+            story.append(Spacer(1, 12))
+
+        story.append(Paragraph(self.config.get("capa_titulo", "Documento"), self.styles["CoverTitle"]))
+        story.append(Paragraph(self.config.get("capa_autor", "Autor"), self.styles["CoverAuthor"]))
+        story.append(Paragraph(self.config.get("capa_data", ""), self.styles["CoverDate"]))
         story.append(PageBreak())
 
+    def _render_formulas(self, formulas):
+        """
+        Renders every formula once. In vector mode (config "latex_modo":
+        "vetorial") formulas become reusable PDF forms; anything the vector
+        path cannot handle falls back to PNG bytes.
+        """
+        result = {}
+        if self.config.get("latex_modo", "raster") == "vetorial":
+            if vetorial_disponivel():
+                svgs = render_latex_batch(formulas, formato="svg")
+                for latex, svg in svgs.items():
+                    formula = criar_formula_vetorial(latex, svg)
+                    if formula is not None:
+                        result[latex] = formula
+            else:
+                print("⚠️ Modo vetorial indisponível (svglib/dvisvgm ausentes). Usando PNG.")
+
+        pending = [latex for latex in formulas if latex not in result]
+        if pending:
+            result.update(render_latex_batch(pending))
+        return result
+
     def _parse_content(self, text_blocks, process_latex=False):
         story = []
-        available_height = self.pagesize[1] - (self.config.get("margem_sup", 50) * mm + self.config.get("margem_inf", 50) * mm)
+        available_height = self.profile.doc_height
 
+        # Coleta as fórmulas de todos os blocos antes de renderizar, para que
+        # cada fórmula única do documento passe pelo TeX uma única vez.
+        blocks = []
+        formulas = []
         for text in text_blocks:
-            latex_images = {}
+            latex_placeholders = {}
             if process_latex:
                 text, latex_placeholders = replace_latex_with_placeholders(text)
-                for placeholder, latex in latex_placeholders.items():
-                    try:
-                        latex_images[placeholder] = render_latex_to_image(latex)
-                    except Exception:
-                        pass
-
-            html = markdown.markdown(text, extensions=["extra", "fenced_code", "tables", "footnotes"])
-            parser = MarkdownParser(available_height, latex_images=latex_images, styles=self.styles, config=self.config)
+                formulas.extend(latex_placeholders.values())
+            blocks.append((text, latex_placeholders))
+
+        latex_flowables = self._render_formulas(formulas) if formulas else {}
+
+        # "parser_markdown": "html" keeps the old Markdown -> HTML -> MarkdownParser path.
+        use_html = self.config.get("parser_markdown", "direto") == "html"
+        compiler = None if use_html else MarkdownCompiler(self.doc_width, self.styles, self.config, self.profile.table_style)
+
+        for text, latex_placeholders in blocks:
+            latex_images = {}
+            for placeholder, latex in latex_placeholders.items():
+                rendered = latex_flowables.get(latex)
+                if isinstance(rendered, bytes):
+                    latex_images[placeholder] = BytesIO(rendered)
+                elif rendered is not None:
+                    latex_images[placeholder] = rendered
+
+            if compiler is not None:
+                story.extend(compiler.compile(text, latex_images))
+                continue
+
+            html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+            parser = MarkdownParser(available_height, latex_images=latex_images, styles=self.styles, config=self.config, doc_width=self.doc_width)
             parser.feed(html)
 
             story.extend(parser.story)
@@ -108,34 +214,189 @@ class PdfGenerator:
         return story
 
     def _on_page_draw(self, canvas, doc):
-        adicionar_pagina(canvas, doc, self.config, doc.page)
+        adicionar_pagina(canvas, doc, self.config, doc.page, self.profile.modelo_pagina)
         canvas.bookmarkPage(f"page_{doc.page}")
 
-    def build(self, text_blocks, output_filename, process_latex=False):
-        """
-        Builds the final PDF. Handles the two-pass generation for TOC if needed.
-        """
-        doc = MyDocTemplate(
+    def _new_doc(self, output_filename):
+        return MyDocTemplate(
             output_filename,
             pagesize=self.pagesize,
-            leftMargin=self.config.get("margem_esq", 40) * mm,
-            rightMargin=self.config.get("margem_dir", 40) * mm,
-            topMargin=self.config.get("margem_sup", 50) * mm,
-            bottomMargin=self.config.get("margem_inf", 50) * mm,
+            leftMargin=self.profile.margens[0],
+            rightMargin=self.profile.margens[1],
+            topMargin=self.profile.margens[2],
+            bottomMargin=self.profile.margens[3],
             title=self.config.get("capa_titulo", "Documento"),
             author=self.config.get("capa_autor", "Autor"),
             creator="BorgePDF (Refactored)"
         )
 
+    def render_segment(self, text_blocks, output_filename, process_latex=False):
+        """
+        Lays out text blocks without cover, TOC or page decoration.
+        Returns the segment description used by `montar_documento`.
+        """
+        doc = self._new_doc(output_filename)
+        doc.build(self._parse_content(text_blocks, process_latex))
+        return {"caminho": output_filename, "paginas": doc.page, "titulos": doc.headings}
+
+    def render_cover(self, output_filename):
+        """Renders the cover page on its own; returns None when there is no cover."""
         story = []
         self._add_cover_page(story)
+        if not story:
+            return None
+        if isinstance(story[-1], PageBreak):
+            story.pop()
+        doc = self._new_doc(output_filename)
+        doc.build(story)
+        return {"caminho": output_filename, "paginas": doc.page, "titulos": []}
+
+    def render_page(self, text, output_filename, pagesize, margin=36):
+        """
+        Lays out Markdown text on exactly one page of `pagesize` points,
+        shrinking it when it does not fit. Used to replace a single page of
+        an existing PDF.
+        """
+        width, height = pagesize[0] - 2 * margin, pagesize[1] - 2 * margin
+        content = MarkdownCompiler(width, self.styles, self.config, self.profile.table_style).compile(text)
+        doc = SimpleDocTemplate(
+            output_filename, pagesize=pagesize,
+            leftMargin=margin, rightMargin=margin, topMargin=margin, bottomMargin=margin,
+            creator="BorgePDF (Refactored)",
+        )
+        doc.build([KeepInFrame(width, height, content, mode="shrink")])
+
+    def build_parallel(self, text_blocks, output_filename, process_latex=False, workers=None):
+        """
+        Renders each text block to its own PDF segment in a process pool and
+        stitches them in order. Page numbers, `page_N` destinations, the
+        paginação rules and the clickable TOC are applied over the final
+        page order. Each block starts on a new page.
+        """
+        if process_latex:
+            # Warm the shared LaTeX cache once, so workers only read from it.
+            formulas = []
+            for text in text_blocks:
+                formulas.extend(replace_latex_with_placeholders(text)[1].values())
+            if formulas:
+                self._render_formulas(formulas)
 
-        if self.config.get("incluir_sumario", False):
-            story.append(Paragraph("Sumário", self.styles["Heading1"]))
-            story.append(doc.toc)
-            story.append(PageBreak())
+        with tempfile.TemporaryDirectory(prefix="borgepdf_") as tmp:
+            paths = [os.path.join(tmp, f"segmento_{i:04d}.pdf") for i in range(len(text_blocks))]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                segments = list(pool.map(_render_segment, repeat(self.config), text_blocks, repeat(process_latex), paths))
+            cover = self.render_cover(os.path.join(tmp, "capa.pdf"))
+            montar_documento(self, cover, segments, output_filename, tmp)
+
+    def _segment_key(self, text, process_latex):
+        # The whole config, not just the profile: options such as "latex_modo" also change a segment.
+        if self._config_key is None:
+            self._config_key = chave_config(self.config)
+        return chave_hash("segmento", self._config_key, text, str(bool(process_latex)))
+
+    def _cached_segment(self, key, output_filename):
+        """Copies a cached segment to `output_filename`; returns its description or None."""
+        info = _segment_cache["info"].obter(key)
+        cached = _segment_cache["pdf"].obter_caminho(key)
+        if info is None or cached is None:
+            return None
+        shutil.copyfile(cached, output_filename)
+        info = json.loads(info)
+        return {"caminho": output_filename, "paginas": info["paginas"], "titulos": [tuple(t) for t in info["titulos"]]}
+
+    def build_incremental(self, text_blocks, output_filename, process_latex=False, workers=None):
+        """
+        Same output as `build_parallel`, but every block's rendered segment is
+        cached on disk by content hash and compiled profile. Only blocks that
+        changed since a previous build are parsed and laid out again (their
+        formulas still come from the LaTeX cache); cover, TOC and page
+        decoration are reassembled over the cached segments.
 
-        main_content_story = self._parse_content(text_blocks, process_latex)
-        story.extend(main_content_story)
+        Returns the number of blocks that had to be rendered.
+        """
+        keys = [self._segment_key(text, process_latex) for text in text_blocks]
+        with tempfile.TemporaryDirectory(prefix="borgepdf_") as tmp:
+            paths = [os.path.join(tmp, f"segmento_{i:04d}.pdf") for i in range(len(text_blocks))]
+            segments = [self._cached_segment(key, path) for key, path in zip(keys, paths)]
+            missing = [i for i, segment in enumerate(segments) if segment is None]
+            if process_latex and len(missing) > 1:
+                formulas = []
+                for i in missing:
+                    formulas.extend(replace_latex_with_placeholders(text_blocks[i])[1].values())
+                if formulas:
+                    self._render_formulas(formulas)
+
+            if len(missing) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    rendered = pool.map(_render_segment, repeat(self.config), [text_blocks[i] for i in missing], repeat(process_latex), [paths[i] for i in missing])
+                    for i, segment in zip(missing, rendered):
+                        segments[i] = segment
+            elif missing:
+                i = missing[0]
+                segments[i] = self.render_segment([text_blocks[i]], paths[i], process_latex)
+            for i in missing:
+                _segment_cache["pdf"].guardar_arquivo(keys[i], paths[i])
+                _segment_cache["info"].guardar(keys[i], json.dumps(
+                    {"paginas": segments[i]["paginas"], "titulos": segments[i]["titulos"]}, ensure_ascii=False).encode("utf-8"))
+
+            cover = self.render_cover(os.path.join(tmp, "capa.pdf"))
+            montar_documento(self, cover, segments, output_filename, tmp)
+        return len(missing)
+
+    def iter_flowables(self, chunks, process_latex=False):
+        """Yields the flowables of each Markdown chunk, parsing one chunk at a time."""
+        for chunk in chunks:
+            yield from self._parse_content([chunk], process_latex)
+
+    def build_streaming(self, chunks, output_filename, process_latex=False, pages_per_segment=None):
+        """
+        Bounded-memory build for very large inputs.
+
+        `chunks` is an iterable of Markdown text (see `iter_markdown_chunks`).
+        Flowables are produced lazily and the body is laid out in segments of
+        at most "paginas_por_segmento" pages, each written to disk before the
+        next one starts, so memory depends on the segment size rather than on
+        the document. Segments end where a page ends anyway, so unlike
+        `build_parallel` no page breaks are added to the text.
+        """
+        limit = pages_per_segment or self.config.get("paginas_por_segmento", 200)
+        story = LazyStory(self.iter_flowables(chunks, process_latex))
+        with tempfile.TemporaryDirectory(prefix="borgepdf_") as tmp:
+            segments = []
+            while not story.exhausted():
+                path = os.path.join(tmp, f"segmento_{len(segments):04d}.pdf")
+                doc = self._new_doc(path)
+                doc.page_limit = limit
+                doc.lazy_story = story
+                doc.build(story)
+                segments.append({"caminho": path, "paginas": doc.page, "titulos": doc.headings})
+            cover = self.render_cover(os.path.join(tmp, "capa.pdf"))
+            montar_documento(self, cover, segments, output_filename, tmp)
+
+    def build(self, text_blocks, output_filename, process_latex=False):
+        """
+        Builds the final PDF with a single layout pass over the content.
+
+        Without a TOC, cover and content go through one `doc.build` with the
+        page decoration drawn on each page. With "incluir_sumario", the body is
+        laid out once while heading positions are recorded; then only the TOC
+        pages are rendered and spliced in front of it, with link destinations
+        and outlines taken from the same pass (see `montar_documento`). With
+        "renderizacao_paralela" in the config, multiple text blocks are laid
+        out in parallel (see `build_parallel`).
+        """
+        if self.config.get("renderizacao_paralela", False) and len(text_blocks) > 1:
+            return self.build_parallel(text_blocks, output_filename, process_latex)
+
+        if not self.config.get("incluir_sumario", False):
+            story = []
+            self._add_cover_page(story)
+            story.extend(self._parse_content(text_blocks, process_latex))
+            doc = self._new_doc(output_filename)
+            doc.build(story, onFirstPage=self._on_page_draw, onLaterPages=self._on_page_draw)
+            return
 
-        doc.multiBuild(story, onFirstPage=self._on_page_draw, onLaterPages=self._on_page_draw)
+        with tempfile.TemporaryDirectory(prefix="borgepdf_") as tmp:
+            body = self.render_segment(text_blocks, os.path.join(tmp, "conteudo.pdf"), process_latex)
+            cover = self.render_cover(os.path.join(tmp, "capa.pdf"))
+            montar_documento(self, cover, [body], output_filename, tmp)
@@ -1,25 +1,1070 @@
+import os
+import re
+import sys
+import json
+import mmap
+import zlib
+import shutil
+import hashlib
+import tempfile
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
 
-def mesclar_pdfs(pdf_paths, output_path):
+try:
+    import pikepdf
+except ImportError:  # pikepdf é opcional: sem ele a otimização não gera object streams
+    pikepdf = None
+
+from .pdf_writer import StreamingPdfWriter, AtualizacaoIncremental, _numero
+from .image_pipeline import DPI_ALVO_PADRAO, QUALIDADE_JPEG_PADRAO, TOLERANCIA
+
+# Chaves que apontam "para cima" na árvore do documento de origem e não são copiadas
+_CHAVES_IGNORADAS = {"/Parent", "/P"}
+# Nome do Form XObject desenhado por baixo do conteúdo de uma página (ver `copiar_pagina`)
+XOBJECT_FUNDO = "/BPfundo"
+
+
+def intervalo_paginas(intervalo, total):
+    """
+    Converte uma seleção como "1-3,5,8-" (1-based, inclusiva) em índices
+    0-based. None, "" ou "all" selecionam todas as páginas.
+    """
+    if not intervalo or str(intervalo).strip().lower() in ("all", "todas"):
+        return list(range(total))
+    indices = []
+    for parte in str(intervalo).split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        inicio, separador, fim = parte.partition("-")
+        inicio = int(inicio) if inicio.strip() else 1
+        fim = (int(fim) if fim.strip() else total) if separador else inicio
+        if inicio < 1 or fim > total or inicio > fim:
+            raise ValueError(f"Intervalo de páginas inválido: '{parte}' (o documento tem {total} páginas)")
+        indices.extend(range(inicio - 1, fim))
+    return indices
+
+
+def _entrada(item):
+    """Aceita "arquivo.pdf" ou ("arquivo.pdf", "1-3,5")."""
+    if isinstance(item, (list, tuple)):
+        return item[0], (item[1] if len(item) > 1 else None)
+    return item, None
+
+
+class _EstadoLeitor:
+    """Um PDF de entrada aberto e o mapa dos objetos dele já gravados na saída."""
+
+    def __init__(self, caminho, paginas=None):
+        self.arquivo = open(caminho, "rb")
+        self.leitor = PdfReader(self.arquivo)
+        if self.leitor.is_encrypted:
+            self.leitor.decrypt("")
+        self.mapa = {}  # número do objeto na origem -> número na saída
+        # Página da origem -> número reservado na saída (para destinos de links)
+        self.paginas = {} if paginas is None else paginas
+        self.em_andamento = set()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class _LeitoresAbertos:
+    """
+    Mantém no máximo `max_abertos` PDFs de entrada abertos (LRU). As páginas
+    reservadas de cada arquivo sobrevivem ao fechamento, para que links
+    continuem resolvidos quando ele é reaberto.
+    """
+
+    def __init__(self, max_abertos):
+        self.max_abertos = max(1, max_abertos)
+        self._abertos = OrderedDict()
+        self._paginas = {}
+
+    def obter(self, caminho):
+        chave = os.path.abspath(caminho)
+        estado = self._abertos.get(chave)
+        if estado is None:
+            while len(self._abertos) >= self.max_abertos:
+                self._abertos.popitem(last=False)[1].fechar()
+            estado = self._abertos[chave] = _EstadoLeitor(caminho, self._paginas.setdefault(chave, {}))
+        self._abertos.move_to_end(chave)
+        return estado
+
+    def fechar(self):
+        for estado in self._abertos.values():
+            estado.fechar()
+        self._abertos.clear()
+
+
+class _CopiadorPdf:
+    """
+    Copia páginas de PDFs abertos com o pypdf para um `StreamingPdfWriter`,
+    objeto a objeto. Cada objeto é gravado assim que os que ele referencia
+    foram gravados, e objetos idênticos (mesmo conteúdo depois de trocar as
+    referências pelas da saída) são gravados uma única vez, mesmo vindo de
+    arquivos diferentes: fontes e logotipos repetidos não se multiplicam.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._hashes = {}
+        self._chamada_fundo = None
+
+    def copiar_pagina(self, pagina, estado, numero=None, rotacao=None, fundo=None, anotacoes=()):
+        """
+        Grava `pagina` como uma página da saída. `numero` é um número já
+        reservado para ela e `rotacao` substitui o /Rotate (em graus).
+        `fundo` é um Form XObject já gravado (ver `copiar_como_form`) que é
+        desenhado por baixo do conteúdo, e `anotacoes` são números de
+        anotações já gravadas, acrescentadas às da página.
+        """
+        numero = numero or self.writer.reservar()
+        duplicada = False
+        if pagina.indirect_reference is not None:
+            duplicada = estado.paginas.setdefault(pagina.indirect_reference.idnum, numero) != numero
+        extras = {"/Parent": f"{self.writer.raiz_paginas} 0 R".encode()}
+        if rotacao is not None:
+            extras["/Rotate"] = str(rotacao % 360).encode()
+        if fundo is not None:
+            extras.update(self._com_fundo(pagina, estado, fundo))
+        if anotacoes or (duplicada and pagina.get("/Annots")):
+            if duplicada:
+                itens = self._anotacoes_novas(pagina, estado)
+            else:
+                itens = [self._serializar(item, estado) for item in pagina.get("/Annots") or []]
+            itens.extend(f"{anotacao} 0 R".encode() for anotacao in anotacoes)
+            extras["/Annots"] = b"[" + b" ".join(itens) + b"]"
+        corpo = self._dicionario(pagina, estado, extras)
+        self.writer.gravar(numero, corpo)
+        self.writer.registrar_pagina(numero)
+        return numero
+
+    def _anotacoes_novas(self, pagina, estado):
+        """
+        Grava cópias próprias das anotações de uma página que aparece mais de
+        uma vez na saída: cada cópia da página precisa das suas, senão mover
+        ou apagar uma anotação afeta as outras. As cópias são gravadas direto,
+        sem passar pela deduplicação, que as juntaria de novo.
+        """
+        anotacoes = pagina["/Annots"]
+        refs = [item for item in anotacoes if isinstance(item, IndirectObject)]
+        # Números novos para todas antes de gravar: /Popup liga anotações entre si.
+        anteriores = {ref.idnum: estado.mapa.get(ref.idnum) for ref in refs}
+        for ref in refs:
+            estado.mapa[ref.idnum] = self.writer.reservar()
+        try:
+            for ref in refs:
+                self.writer.gravar(estado.mapa[ref.idnum], self._dicionario(ref.get_object(), estado))
+            return [self._serializar(item, estado) for item in anotacoes]
+        finally:
+            for idnum, anterior in anteriores.items():
+                if anterior is None:
+                    estado.mapa.pop(idnum, None)
+                else:
+                    estado.mapa[idnum] = anterior
+
+    def copiar_como_form(self, pagina, estado):
+        """
+        Grava o conteúdo e os recursos de `pagina` como um Form XObject e
+        retorna o número dele. Forms idênticos são gravados uma única vez.
+        """
+        conteudo = pagina.get_contents()
+        dados = zlib.compress(conteudo.get_data() if conteudo is not None else b"")
+        recursos = pagina.get("/Resources")
+        caixa = " ".join(_numero(float(valor)) for valor in pagina.mediabox)
+        corpo = b" ".join([
+            b"<< /Type /XObject /Subtype /Form",
+            f"/BBox [{caixa}] /Resources".encode(),
+            self._serializar(recursos, estado) if recursos is not None else b"<< >>",
+            f"/Filter /FlateDecode /Length {len(dados)} >>".encode(),
+        ])
+        return self._gravar_unico(corpo, dados)
+
+    def _com_fundo(self, pagina, estado, fundo):
+        """/Resources e /Contents de `pagina` com o form `fundo` desenhado antes do conteúdo."""
+        if self._chamada_fundo is None:
+            dados = f"q {XOBJECT_FUNDO} Do Q\n".encode()
+            self._chamada_fundo = self._gravar_unico(f"<< /Length {len(dados)} >>".encode(), dados)
+
+        recursos = pagina.get("/Resources") or DictionaryObject()
+        xobjects = self._dicionario(recursos.get("/XObject") or DictionaryObject(), estado,
+                                    {XOBJECT_FUNDO: f"{fundo} 0 R".encode()})
+        itens = self._itens_conteudo(pagina, estado)
+        return {
+            "/Resources": self._dicionario(recursos, estado, {"/XObject": xobjects}),
+            "/Contents": b"[" + b" ".join([f"{self._chamada_fundo} 0 R".encode(), *itens]) + b"]",
+        }
+
+    def com_matriz(self, pagina, estado, matriz):
+        """/Contents de `pagina` desenhado sob a transformação `matriz` (q ... cm ... Q)."""
+        numeros = []
+        for dados in (f"q {' '.join(_numero(valor) for valor in matriz)} cm\n".encode(), b"Q\n"):
+            numeros.append(self._gravar_unico(f"<< /Length {len(dados)} >>".encode(), dados))
+        itens = self._itens_conteudo(pagina, estado)
+        return b"[" + b" ".join([f"{numeros[0]} 0 R".encode(), *itens, f"{numeros[1]} 0 R".encode()]) + b"]"
+
+    def _itens_conteudo(self, pagina, estado):
+        conteudo = pagina.raw_get("/Contents") if "/Contents" in pagina else None
+        if conteudo is None:
+            return []
+        if isinstance(conteudo.get_object(), ArrayObject):
+            return [self._serializar(item, estado) for item in conteudo.get_object()]
+        return [self._serializar(conteudo, estado)]
+
+    def _gravar_unico(self, corpo, dados=None):
+        """Grava um objeto novo, ou reaproveita um idêntico já gravado; retorna o número."""
+        digest = hashlib.sha256(corpo + (b"\0stream\0" + dados if dados is not None else b"")).digest()
+        numero = self._hashes.get(digest)
+        if numero is None:
+            numero = self._hashes[digest] = self.writer.reservar()
+            self.writer.gravar(numero, corpo, dados)
+        return numero
+
+    def _referencia(self, ref, estado):
+        chave = ref.idnum
+        if chave in estado.mapa:
+            return estado.mapa[chave]
+        obj = ref.get_object()
+        if obj is None:
+            return None
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+            return estado.paginas.get(chave)  # Páginas não selecionadas viram null
+        if chave in estado.em_andamento:
+            # Ciclo: reserva o número agora; o objeto é gravado quando a recursão voltar.
+            estado.mapa[chave] = self.writer.reservar()
+            return estado.mapa[chave]
+
+        estado.em_andamento.add(chave)
+        try:
+            if isinstance(obj, StreamObject):
+                dados = obj._data  # Dados ainda codificados: o stream é copiado sem decodificar
+                corpo = self._dicionario(obj, estado, {"/Length": str(len(dados)).encode()}, ignorar={"/Length"})
+            else:
+                corpo, dados = self._serializar(obj, estado), None
+        finally:
+            estado.em_andamento.discard(chave)
+
+        if chave in estado.mapa:
+            numero = estado.mapa[chave]
+            self.writer.gravar(numero, corpo, dados)
+        else:
+            numero = self._gravar_unico(corpo, dados)
+        estado.mapa[chave] = numero
+        return numero
+
+    def _dicionario(self, obj, estado, extras=None, ignorar=()):
+        partes = [b"<<"]
+        for chave, valor in obj.items():
+            if chave in _CHAVES_IGNORADAS or chave in ignorar or (extras and chave in extras):
+                continue
+            partes.append(self._serializar(chave, estado) + b" " + self._serializar(valor, estado))
+        for chave, valor in (extras or {}).items():
+            partes.append(chave.encode() + b" " + valor)
+        partes.append(b">>")
+        return b" ".join(partes)
+
+    def _serializar(self, obj, estado):
+        if isinstance(obj, IndirectObject):
+            numero = self._referencia(obj, estado)
+            return b"null" if numero is None else f"{numero} 0 R".encode()
+        if isinstance(obj, DictionaryObject):
+            return self._dicionario(obj, estado)
+        if isinstance(obj, ArrayObject):
+            return b"[" + b" ".join(self._serializar(item, estado) for item in obj) + b"]"
+        buffer = BytesIO()
+        obj.write_to_stream(buffer)
+        return buffer.getvalue()
+
+
+def mesclar_pdfs(pdf_paths, output_path, max_abertos=32):
     """
     Merges multiple PDF files into a single PDF file.
 
+    Pages are written to the output as they are copied, at most
+    `max_abertos` inputs are open at a time, and objects repeated across
+    inputs (fonts, logos, ...) are stored once. The output page numbers are
+    reserved before anything is copied, so links to pages that come later
+    (a TOC, for instance) keep working; links to pages left out become null.
+    Outlines and form fields of the inputs are not carried over.
+
     Args:
-        pdf_paths (list): A list of paths to the PDF files to merge.
+        pdf_paths (list): Paths of the PDFs to merge, in order. An item may
+            also be a (path, pages) pair selecting pages, e.g. ("a.pdf", "1-3,7").
         output_path (str): The path to save the merged PDF file.
+        max_abertos (int): Maximum number of input files kept open.
 
     Returns:
         bool: True if the merge was successful, False otherwise.
     """
-    pdf_writer = PdfWriter()
+    leitores = _LeitoresAbertos(max_abertos)
     try:
-        for path in pdf_paths:
-            pdf_reader = PdfReader(path)
-            for page in pdf_reader.pages:
-                pdf_writer.add_page(page)
-        with open(output_path, "wb") as out:
-            pdf_writer.write(out)
+        with StreamingPdfWriter(output_path, versao="1.7") as writer:
+            copiador = _CopiadorPdf(writer)
+            plano = []
+            for item in pdf_paths:
+                caminho, intervalo = _entrada(item)
+                estado = leitores.obter(caminho)
+                paginas = estado.leitor.pages
+                selecao = [(indice, writer.reservar()) for indice in intervalo_paginas(intervalo, len(paginas))]
+                for indice, numero in selecao:
+                    estado.paginas.setdefault(paginas[indice].indirect_reference.idnum, numero)
+                plano.append((caminho, selecao))
+            for caminho, selecao in plano:
+                estado = leitores.obter(caminho)
+                paginas = estado.leitor.pages
+                for indice, numero in selecao:
+                    copiador.copiar_pagina(paginas[indice], estado, numero)
+                    # O mapa de objetos já evita reler o que foi gravado; o cache do
+                    # pypdf só faria a memória crescer com o tamanho da entrada.
+                    estado.leitor.resolved_objects.clear()
         return True
     except Exception as e:
         print(f"Error merging PDFs: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+    finally:
+        leitores.fechar()
+
+
+# Categorias de /Resources cujas entradas são referenciadas pelo nome no conteúdo da página
+_CATEGORIAS_RECURSOS = ("/XObject", "/Font", "/ExtGState", "/Pattern", "/Shading", "/ColorSpace", "/Properties")
+_NOME_RE = re.compile(rb"/([^\s/\[\]<>(){}%]+)")
+_ESCAPE_NOME_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+
+def _nomes_usados(dados):
+    return {
+        "/" + _ESCAPE_NOME_RE.sub(lambda m: bytes([int(m.group(1), 16)]), nome).decode("latin-1")
+        for nome in _NOME_RE.findall(dados)
+    }
+
+
+def _chave_objeto(ref, obj):
+    return ref.idnum if isinstance(ref, IndirectObject) else id(obj)
+
+
+def _formulario(obj):
+    return isinstance(obj, StreamObject) and obj.get("/Subtype") == "/Form"
+
+
+def _podar_recursos(dono, dados, vistos):
+    """
+    Tira do /Resources de `dono` (página ou Form XObject) o que `dados`, o
+    conteúdo dele, não usa, e repete para os formulários que sobraram.
+    `vistos` evita podar duas vezes um formulário compartilhado entre páginas.
+    """
+    if "/Resources" not in dono:
+        return 0
+    usados = _nomes_usados(dados)
+    # Cópia: o mesmo dicionário de recursos pode ser compartilhado por vários donos.
+    recursos = DictionaryObject(dono["/Resources"])
+    xobjects = recursos.get("/XObject")
+    xobjects = xobjects.get_object() if xobjects is not None else None
+    if isinstance(xobjects, DictionaryObject):
+        # Formulários sem /Resources próprio usam os do dono: os nomes deles também contam.
+        pendentes, herdeiros = [nome for nome in xobjects if nome in usados], set()
+        while pendentes:
+            ref = xobjects[pendentes.pop()]
+            form = ref.get_object()
+            if _formulario(form) and "/Resources" not in form and _chave_objeto(ref, form) not in herdeiros:
+                herdeiros.add(_chave_objeto(ref, form))
+                novos = _nomes_usados(form.get_data()) - usados
+                usados |= novos
+                pendentes.extend(nome for nome in xobjects if nome in novos)
+
+    removidos = 0
+    for categoria in _CATEGORIAS_RECURSOS:
+        itens = recursos.get(categoria)
+        itens = itens.get_object() if itens is not None else None
+        if not isinstance(itens, DictionaryObject):
+            continue
+        mantidos = DictionaryObject({nome: valor for nome, valor in itens.items() if nome in usados})
+        removidos += len(itens) - len(mantidos)
+        recursos[NameObject(categoria)] = mantidos
+    dono[NameObject("/Resources")] = recursos
+
+    for ref in (recursos.get("/XObject") or {}).values():
+        form = ref.get_object()
+        if _formulario(form) and "/Resources" in form and _chave_objeto(ref, form) not in vistos:
+            vistos.add(_chave_objeto(ref, form))
+            removidos += _podar_recursos(form, form.get_data(), vistos)
+    return removidos
+
+
+def _remover_recursos_nao_usados(pagina, vistos=None):
+    """
+    Tira de /Resources o que o conteúdo da página não usa, descendo pelos
+    Form XObjects (ex.: o fundo fixo); retorna quantos itens saíram.
+    """
+    conteudo = pagina.get_contents()
+    dados = conteudo.get_data() if conteudo is not None else b""
+    return _podar_recursos(pagina, dados, set() if vistos is None else vistos)
+
+
+def _imagens(recursos, caminho=(), formularios=None):
+    """Gera (caminho, ref, imagem) das imagens em `recursos`, inclusive dentro de Form XObjects."""
+    formularios = set() if formularios is None else formularios
+    xobjects = recursos.get("/XObject") if recursos is not None else None
+    xobjects = xobjects.get_object() if xobjects is not None else None
+    if not isinstance(xobjects, DictionaryObject):
+        return
+    for nome, ref in xobjects.items():
+        obj = ref.get_object()
+        if obj.get("/Subtype") == "/Image":
+            yield caminho + (nome,), ref, obj
+        elif _formulario(obj) and _chave_objeto(ref, obj) not in formularios:
+            formularios.add(_chave_objeto(ref, obj))
+            yield from _imagens(obj.get("/Resources"), caminho + (nome,), formularios)
+
+
+def _reduzir_imagens(writer, dpi, qualidade):
+    """
+    Reduz imagens com mais pixels do que a página comporta em `dpi` e as
+    recomprime, inclusive as que estão dentro de Form XObjects. Imagens com
+    máscara (transparência) ficam como estão.
+    """
+    vistas = set()
+    reduzidas = 0
+    for pagina in writer.pages:
+        limite = sorted((float(pagina.mediabox.width) / 72 * dpi, float(pagina.mediabox.height) / 72 * dpi))
+        for caminho, ref, imagem in _imagens(pagina.get("/Resources")):
+            chave = _chave_objeto(ref, imagem)
+            if chave in vistas or "/SMask" in imagem or "/Mask" in imagem:
+                continue
+            vistas.add(chave)
+            lados = sorted((int(imagem["/Width"]), int(imagem["/Height"])))
+            escala = min(limite[0] / lados[0], limite[1] / lados[1])
+            if escala * TOLERANCIA >= 1:
+                continue
+            try:
+                arquivo = pagina.images[caminho if len(caminho) > 1 else caminho[0]]
+                nova = arquivo.image
+                nova.thumbnail((max(1, round(nova.width * escala)), max(1, round(nova.height * escala))))
+                arquivo.replace(nova, quality=qualidade)
+                reduzidas += 1
+            except Exception as e:
+                print(f"⚠️ Imagem {''.join(caminho)} mantida: {e}")
+    return reduzidas
+
+
+def _formatar_bytes(valor):
+    for unidade in ("B", "KB", "MB"):
+        if abs(valor) < 1024:
+            return f"{valor:.0f} {unidade}" if unidade == "B" else f"{valor:.1f} {unidade}"
+        valor /= 1024
+    return f"{valor:.1f} GB"
+
+
+def otimizar_pdf(entrada, saida=None, dpi_imagens=DPI_ALVO_PADRAO, qualidade=QUALIDADE_JPEG_PADRAO):
+    """
+    Otimiza um PDF gerado por qualquer conversor.
+
+    Remove recursos que as páginas não usam, reduz e recomprime imagens
+    acima de `dpi_imagens` (None desliga), comprime os streams de conteúdo,
+    funde objetos idênticos (inclusive imagens repetidas) e, com o pikepdf
+    instalado, grava em object streams. Sem `saida`, o arquivo é substituído
+    no lugar; se o resultado não ficar menor, o original é mantido.
+
+    Returns:
+        dict: {"antes", "depois", "economia"} em bytes, ou None em caso de erro.
+    """
+    saida = saida or entrada
+    antes = os.path.getsize(entrada)
+    fd, temporario = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(saida)))
+    os.close(fd)
+    try:
+        writer = PdfWriter(clone_from=entrada)
+        formularios = set()
+        for pagina in writer.pages:
+            _remover_recursos_nao_usados(pagina, formularios)
+        if dpi_imagens:
+            _reduzir_imagens(writer, dpi_imagens, qualidade)
+        for pagina in writer.pages:
+            pagina.compress_content_streams()
+        writer.compress_identical_objects()
+        with open(temporario, "wb") as f:
+            writer.write(f)
+
+        if pikepdf is not None:
+            with pikepdf.open(temporario, allow_overwriting_input=True) as pdf:
+                pdf.save(temporario, object_stream_mode=pikepdf.ObjectStreamMode.generate, compress_streams=True)
+
+        depois = os.path.getsize(temporario)
+        if depois < antes:
+            os.replace(temporario, saida)
+        else:
+            depois = antes
+            if os.path.abspath(saida) != os.path.abspath(entrada):
+                shutil.copyfile(entrada, saida)
+    except Exception as e:
+        print(f"❌ Erro ao otimizar o PDF: {e}")
+        return None
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    economia = antes - depois
+    print(f"🗜️ PDF otimizado: {_formatar_bytes(antes)} → {_formatar_bytes(depois)} "
+          f"({_formatar_bytes(economia)} economizados, {economia / antes:.0%})" if antes else "🗜️ PDF vazio.")
+    return {"antes": antes, "depois": depois, "economia": economia}
+
+
+def _agrupar_dimensoes(dimensoes):
+    """Agrupa páginas consecutivas de mesmo tamanho e rotação: [{"paginas": "1-10", ...}]."""
+    grupos = []
+    for numero, (largura, altura, rotacao) in enumerate(dimensoes, start=1):
+        ultimo = grupos[-1] if grupos else None
+        if ultimo and (ultimo["largura"], ultimo["altura"], ultimo["rotacao"]) == (largura, altura, rotacao):
+            ultimo["fim"] = numero
+        else:
+            grupos.append({"inicio": numero, "fim": numero, "largura": largura, "altura": altura, "rotacao": rotacao})
+    for grupo in grupos:
+        inicio, fim = grupo.pop("inicio"), grupo.pop("fim")
+        grupo["paginas"] = str(inicio) if inicio == fim else f"{inicio}-{fim}"
+    return grupos
+
+
+def inspecionar_pdf(caminho):
+    """
+    Lê só o trailer, a tabela xref e a árvore de páginas de um PDF (via mmap,
+    sem interpretar o conteúdo das páginas) e retorna um dicionário com
+    tamanho, versão, produtor, criptografia, número de páginas e dimensões
+    (em pontos, agrupadas por faixas de páginas).
+    """
+    info = {"arquivo": caminho, "tamanho": os.path.getsize(caminho)}
+    with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        reader = PdfReader(dados)
+        info["versao"] = reader.pdf_header[len("%PDF-"):]
+        info["criptografado"] = reader.is_encrypted
+        if reader.is_encrypted and not reader.decrypt(""):
+            info["paginas"] = None  # Precisa de senha: a árvore de páginas não pode ser lida
+            return info
+        metadados = reader.metadata
+        info["produtor"] = str(metadados.producer) if metadados and metadados.producer else None
+        info["criador"] = str(metadados.creator) if metadados and metadados.creator else None
+        dimensoes = []
+        for pagina in reader.pages:
+            caixa = pagina.mediabox
+            dimensoes.append((round(float(caixa.width), 2), round(float(caixa.height), 2), int(pagina.get("/Rotate", 0)) % 360))
+    info["paginas"] = len(dimensoes)
+    info["dimensoes"] = _agrupar_dimensoes(dimensoes)
+    return info
+
+
+def _inspecionar_seguro(caminho):
+    try:
+        return inspecionar_pdf(caminho)
+    except Exception as e:
+        return {"arquivo": caminho, "erro": str(e)}
+
+
+def _listar_pdfs(pasta):
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(".pdf"):
+                yield os.path.join(raiz, nome)
+
+
+def inspecionar_pasta(pasta, saida=None, workers=None):
+    """
+    Inspeciona todos os PDFs de `pasta` (recursivamente) em um pool de
+    processos e grava uma linha JSON por arquivo em `saida` (caminho) ou na
+    saída padrão. Arquivos ilegíveis geram uma linha com "erro".
+
+    Returns:
+        tuple: (arquivos inspecionados, arquivos com erro).
+    """
+    total = erros = 0
+    destino = open(saida, "w", encoding="utf-8") if saida else sys.stdout
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for info in pool.map(_inspecionar_seguro, _listar_pdfs(pasta), chunksize=32):
+                destino.write(json.dumps(info, ensure_ascii=False) + "\n")
+                total += 1
+                erros += "erro" in info
+    finally:
+        if saida:
+            destino.close()
+    return total, erros
+
+
+def infos_pdf(caminho=None, saida=None, workers=None):
+    """
+    Mostra as informações de um PDF ou, se `caminho` for uma pasta, gera o
+    relatório JSON Lines de todos os PDFs dela (ver `inspecionar_pasta`).
+    Sem argumentos, pergunta no terminal.
+    """
+    interativo = caminho is None
+    if interativo:
+        caminho = input("📄 Caminho do PDF ou de uma pasta com PDFs: ").strip()
+    if not os.path.exists(caminho):
+        print(f"❌ Caminho '{caminho}' não encontrado.")
+        return None
+
+    if os.path.isdir(caminho):
+        if interativo:
+            saida = input("🧾 Arquivo .jsonl do relatório (vazio = mostrar na tela): ").strip() or None
+        total, erros = inspecionar_pasta(caminho, saida, workers)
+        print(f"✅ {total} PDF(s) inspecionado(s), {erros} com erro." + (f" Relatório: {saida}" if saida else ""))
+        return total, erros
+
+    info = _inspecionar_seguro(caminho)
+    if "erro" in info:
+        print(f"❌ Erro ao ler o PDF: {info['erro']}")
+        return None
+    print(f"📄 {info['arquivo']} ({_formatar_bytes(info['tamanho'])}, PDF {info['versao']})")
+    print(f"🔒 Criptografado: {'sim' if info['criptografado'] else 'não'}")
+    if info["paginas"] is None:
+        print("⚠️ O PDF exige senha: páginas não disponíveis.")
+        return info
+    print(f"🏭 Produtor: {info['produtor'] or '-'}  |  Criador: {info['criador'] or '-'}")
+    print(f"📑 Páginas: {info['paginas']}")
+    for grupo in info["dimensoes"]:
+        rotacao = f", girada {grupo['rotacao']}°" if grupo["rotacao"] else ""
+        print(f"   {grupo['paginas']}: {grupo['largura']:g} x {grupo['altura']:g} pt{rotacao}")
+    return info
+
+
+def _serializar_local(obj):
+    """Serializa um objeto do próprio arquivo, mantendo as referências como estão."""
+    buffer = BytesIO()
+    obj.write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+# Entradas da página original que a página nova substitui
+_CHAVES_SUBSTITUIDAS = {"/Contents", "/Resources"}
+
+
+def tamanho_exibido(pagina):
+    """Largura e altura da página como ela aparece, já considerando o /Rotate."""
+    largura, altura = float(pagina.mediabox.width), float(pagina.mediabox.height)
+    if int(pagina.get("/Rotate", 0)) % 180:
+        return altura, largura
+    return largura, altura
+
+
+def _matriz_exibicao(rotacao, caixa):
+    """
+    Matriz que leva um conteúdo desenhado no tamanho exibido, com origem em
+    (0, 0), para o espaço da página: compensa o /Rotate e a origem da
+    MediaBox. Retorna None quando nada precisa ser ajustado.
+    """
+    x0, y0, x1, y1 = caixa
+    matrizes = {
+        0: (1, 0, 0, 1, x0, y0),
+        90: (0, 1, -1, 0, x1, y0),
+        180: (-1, 0, 0, -1, x1, y1),
+        270: (0, -1, 1, 0, x0, y1),
+    }
+    matriz = matrizes[rotacao % 360]
+    return None if matriz == (1, 0, 0, 1, 0, 0) else matriz
+
+
+def substituir_paginas(caminho, novas, saida=None):
+    """
+    Substitui páginas de `caminho` pela primeira página de outros PDFs,
+    gravando só as diferenças como uma atualização incremental no fim do
+    arquivo. As páginas substituídas mantêm o mesmo número de objeto, a
+    posição, o tamanho, a rotação e as anotações; só o conteúdo e os
+    recursos mudam. A página nova deve ter o tamanho exibido da original
+    (ver `tamanho_exibido`): ela é posicionada para aparecer na mesma
+    orientação mesmo quando a original tem /Rotate.
+
+    Args:
+        caminho (str): PDF a alterar (no próprio arquivo, se não houver `saida`).
+        novas (dict): {índice 0-based: caminho do PDF com a página nova}.
+        saida (str): Se informado, o original é copiado para lá e fica intacto.
+    """
+    if saida and os.path.abspath(saida) != os.path.abspath(caminho):
+        shutil.copyfile(caminho, saida)
+        caminho = saida
+
+    originais = {}
+    with open(caminho, "rb") as f:
+        leitor = PdfReader(f)
+        if leitor.is_encrypted:
+            raise ValueError("PDFs criptografados não podem ser editados")
+        tamanho = int(leitor.trailer["/Size"])
+        trailer = {
+            chave: _serializar_local(leitor.trailer.raw_get(chave)).decode("latin-1")
+            for chave in ("/Root", "/Info", "/ID") if chave in leitor.trailer
+        }
+        paginas = leitor.pages
+        for indice in novas:
+            if not 0 <= indice < len(paginas):
+                raise ValueError(f"Página {indice + 1} não existe (o documento tem {len(paginas)} páginas)")
+            pagina = paginas[indice]  # Já traz os atributos herdados da árvore de páginas
+            corpo = b" ".join(
+                _serializar_local(chave) + b" " + _serializar_local(valor)
+                for chave, valor in pagina.items() if chave not in _CHAVES_SUBSTITUIDAS
+            )
+            ref = pagina.indirect_reference
+            caixa = [float(valor) for valor in pagina.mediabox]
+            matriz = _matriz_exibicao(int(pagina.get("/Rotate", 0)), caixa)
+            originais[indice] = (ref.idnum, ref.generation, corpo, matriz)
+
+    with AtualizacaoIncremental(caminho, tamanho, trailer) as atualizacao:
+        copiador = _CopiadorPdf(atualizacao)
+        for indice, (numero, geracao, corpo, matriz) in originais.items():
+            estado = _EstadoLeitor(novas[indice])
+            try:
+                nova = estado.leitor.pages[0]
+                partes = [b"<<", corpo]
+                if "/Resources" in nova:
+                    partes.append(b"/Resources " + copiador._serializar(nova.raw_get("/Resources"), estado))
+                if matriz is not None:
+                    partes.append(b"/Contents " + copiador.com_matriz(nova, estado, matriz))
+                elif "/Contents" in nova:
+                    partes.append(b"/Contents " + copiador._serializar(nova.raw_get("/Contents"), estado))
+                partes.append(b">>")
+                atualizacao.gravar(numero, b" ".join(partes), geracao=geracao)
+            finally:
+                estado.fechar()
+
+
+def editar_pdf(caminho=None, saida=None):
+    """
+    Edita o texto de páginas de um PDF existente pelo terminal.
+
+    Só as páginas alteradas são regeneradas (no tamanho original) e gravadas
+    como atualização incremental: as demais não são recodificadas e mantêm o
+    layout, e salvar custa proporcionalmente ao tamanho da edição.
+
+    Returns:
+        bool: True se alguma página foi atualizada.
+    """
+    from configs.config_manager import escolher_perfil, perfis
+    from modules.content_manager import editar_texto
+    from modules.pdf_generator import PdfGenerator
+
+    caminho = caminho or input("📄 Caminho do PDF a editar: ").strip()
+    if not os.path.exists(caminho):
+        print(f"❌ Arquivo '{caminho}' não encontrado.")
+        return False
+    try:
+        with open(caminho, "rb") as f:
+            leitor = PdfReader(f)
+            total = len(leitor.pages)
+            selecao = input(f"📑 Páginas a editar (ex.: 1,3-4; o PDF tem {total}, vazio = todas): ")
+            indices = intervalo_paginas(selecao, total)
+            textos = {i: leitor.pages[i].extract_text() or "" for i in indices}
+            tamanhos = {i: tamanho_exibido(leitor.pages[i]) for i in indices}
+    except Exception as e:
+        print(f"❌ Erro ao ler o PDF: {e}")
+        return False
+
+    editados = {}
+    for indice, texto in textos.items():
+        print(f"\n📄 Página {indice + 1} de {total}")
+        novo = editar_texto(texto)
+        if novo is not None and novo != texto:
+            editados[indice] = novo
+    if not editados:
+        print("ℹ️ Nenhuma página alterada.")
+        return False
+
+    if saida is None:
+        saida = input("💾 Salvar em outro arquivo? (vazio = no próprio PDF): ").strip() or None
+    try:
+        with tempfile.TemporaryDirectory() as pasta:
+            nome = escolher_perfil()
+            gerador = PdfGenerator(perfis().config(nome), perfis().compilado(nome))
+            novas = {}
+            for indice, texto in editados.items():
+                novas[indice] = os.path.join(pasta, f"pagina_{indice + 1}.pdf")
+                gerador.render_page(texto, novas[indice], tamanhos[indice])
+            substituir_paginas(caminho, novas, saida)
+    except Exception as e:
+        print(f"❌ Erro ao salvar a edição: {e}")
+        return False
+    print(f"✅ {len(editados)} página(s) atualizada(s) em {saida or caminho}.")
+    return True
+
+
+# Operações de página aceitas por `operar_paginas` (e pelo texto de `ler_operacoes`)
+OPERACOES_PAGINA = ("manter", "remover", "girar", "branca")
+
+
+def ler_operacoes(texto):
+    """
+    Converte operações escritas como "remover 2-4; girar 1,3 90; branca 0;
+    manter 5,1-4" em tuplas para `operar_paginas`.
+    """
+    operacoes = []
+    for parte in texto.split(";"):
+        palavras = parte.split()
+        if not palavras:
+            continue
+        nome = palavras[0].lower()
+        if nome not in OPERACOES_PAGINA:
+            raise ValueError(f"Operação desconhecida: '{palavras[0]}' (use {', '.join(OPERACOES_PAGINA)})")
+        if nome == "girar":
+            if len(palavras) != 3:
+                raise ValueError("Use: girar <páginas> <graus>")
+            operacoes.append((nome, palavras[1], int(palavras[2])))
+        elif nome == "branca":
+            operacoes.append((nome, int(palavras[1]) if len(palavras) > 1 else None))
+        else:
+            operacoes.append((nome, "".join(palavras[1:])))
+    return operacoes
+
+
+def planejar_paginas(total, operacoes):
+    """
+    Aplica as operações, em ordem, à lista de páginas de um documento com
+    `total` páginas, sem tocar no arquivo. As páginas de cada operação são
+    numeradas como estão naquele momento (depois das operações anteriores).
+
+    - ("manter", "3,1-2"): fica só com essas páginas, nessa ordem
+      (serve para reordenar, extrair e duplicar páginas);
+    - ("remover", "2-4"): tira as páginas;
+    - ("girar", "1,3", 90): gira as páginas (múltiplos de 90 graus);
+    - ("branca", n): insere uma página em branco depois da página n
+      (0 = no início, None = no fim).
+
+    Returns:
+        list: [índice da página de origem (None = em branco), rotação extra].
+    """
+    paginas = [[indice, 0] for indice in range(total)]
+    for operacao in operacoes:
+        nome = operacao[0]
+        if nome == "manter":
+            paginas = [list(paginas[i]) for i in intervalo_paginas(operacao[1], len(paginas))]
+        elif nome == "remover":
+            removidas = set(intervalo_paginas(operacao[1], len(paginas)))
+            paginas = [pagina for i, pagina in enumerate(paginas) if i not in removidas]
+        elif nome == "girar":
+            if operacao[2] % 90:
+                raise ValueError("A rotação precisa ser múltipla de 90 graus")
+            for i in set(intervalo_paginas(operacao[1], len(paginas))):
+                paginas[i][1] += operacao[2]
+        elif nome == "branca":
+            posicao = len(paginas) if operacao[1] is None else operacao[1]
+            if not 0 <= posicao <= len(paginas):
+                raise ValueError(f"Posição inválida para página em branco: {posicao}")
+            paginas.insert(posicao, [None, 0])
+        else:
+            raise ValueError(f"Operação desconhecida: {nome}")
+    if not paginas:
+        raise ValueError("As operações não deixam nenhuma página no documento")
+    return paginas
+
+
+def _tamanho_branca(plano, posicao, leitor):
+    """
+    Páginas em branco herdam o tamanho exibido da página vizinha (ou A4);
+    girar uma página em branco em 90 ou 270 graus troca largura e altura.
+    """
+    largura, altura = 595.2756, 841.8898
+    for vizinha in list(reversed(plano[:posicao])) + plano[posicao + 1:]:
+        if vizinha[0] is not None:
+            largura, altura = tamanho_exibido(leitor.pages[vizinha[0]])
+            if vizinha[1] % 180:
+                largura, altura = altura, largura
+            break
+    if plano[posicao][1] % 180:
+        largura, altura = altura, largura
+    return largura, altura
+
+
+# Entradas de um marcador que são regravadas (a árvore é remontada só com os que sobram)
+_CHAVES_MARCADOR = {"/Prev", "/Next", "/First", "/Last", "/Count", "/SE"}
+
+
+def _nome(obj):
+    return obj.decode("latin-1") if isinstance(obj, bytes) else str(obj)
+
+
+def _destinos_nomeados(leitor):
+    """
+    Destinos nomeados do documento: {nome: (chave, destino)} da árvore
+    /Names /Dests e {nome: destino} do dicionário /Dests do catálogo (PDF 1.1).
+    """
+    catalogo = leitor.trailer["/Root"]
+    arvore, antigos = {}, {}
+    pendentes = [catalogo["/Names"].get("/Dests")] if "/Names" in catalogo else []
+    vistos = set()
+    while pendentes:
+        no = pendentes.pop()
+        if no is None or id(no.get_object()) in vistos:
+            continue
+        no = no.get_object()
+        vistos.add(id(no))
+        nomes = no.get("/Names") or []
+        for i in range(0, len(nomes) - 1, 2):
+            arvore[_nome(nomes[i])] = (nomes[i], nomes[i + 1])
+        pendentes.extend(no.get("/Kids") or [])
+    if "/Dests" in catalogo:
+        for nome, destino in catalogo["/Dests"].items():
+            antigos[_nome(nome)] = destino
+    return arvore, antigos
+
+
+def _pagina_destino(destino, nomeados):
+    """idnum da página de origem de um destino (array, nome ou {/D ...}), ou None."""
+    arvore, antigos = nomeados
+    for _ in range(4):  # Nomes podem apontar para {/D nome}; o limite evita ciclos
+        destino = destino.get_object() if isinstance(destino, IndirectObject) else destino
+        if isinstance(destino, NameObject):
+            destino = antigos.get(_nome(destino))
+        elif isinstance(destino, (str, bytes)):
+            destino = arvore.get(_nome(destino), (None, None))[1]
+        elif isinstance(destino, DictionaryObject):
+            destino = destino.get("/D")
+        elif isinstance(destino, ArrayObject) and destino and isinstance(destino[0], IndirectObject):
+            return destino[0].idnum
+        else:
+            return None
+    return None
+
+
+def _copiar_destinos(copiador, estado, nomeados):
+    """
+    Copia os destinos nomeados cujas páginas continuam no documento e
+    retorna as entradas do catálogo que apontam para eles.
+    """
+    arvore, antigos = nomeados
+    catalogo = {}
+    vivos = [(chave, destino) for chave, destino in arvore.values() if _pagina_destino(destino, nomeados) in estado.paginas]
+    if vivos:
+        # As chaves da árvore ficam em ordem de bytes, com a codificação original
+        vivos.sort(key=lambda item: getattr(item[0], "original_bytes", item[0]))
+        itens = [copiador._serializar(chave, estado) + b" " + copiador._serializar(destino, estado) for chave, destino in vivos]
+        numero = copiador.writer.reservar()
+        copiador.writer.gravar(numero, b"<< /Names [" + b" ".join(itens) + b"] >>")
+        catalogo["/Names"] = f"<< /Dests {numero} 0 R >>"
+    vivos = [nome for nome, destino in antigos.items() if _pagina_destino(destino, nomeados) in estado.paginas]
+    if vivos:
+        itens = [copiador._serializar(NameObject(nome), estado) + b" " + copiador._serializar(antigos[nome], estado) for nome in vivos]
+        numero = copiador.writer.reservar()
+        copiador.writer.gravar(numero, b"<< " + b" ".join(itens) + b" >>")
+        catalogo["/Dests"] = f"{numero} 0 R"
+    return catalogo
+
+
+def _copiar_marcadores(copiador, estado, nomeados):
+    """
+    Copia os marcadores (outlines) que apontam para páginas que continuam no
+    documento, remapeados para as páginas novas. Um marcador cuja página saiu
+    só fica se algum filho ficar, e então perde o destino. Retorna o número
+    da raiz, ou None se não sobrar nenhum.
+    """
+    vistos = set()
+
+    def podar(item):
+        nos = []
+        while item is not None and id(item.get_object()) not in vistos:
+            item = item.get_object()
+            vistos.add(id(item))
+            filhos = podar(item.get("/First"))
+            acao = item.get("/A")
+            alvo = item.get("/Dest")
+            if alvo is None and acao is not None and acao.get("/S") == "/GoTo":
+                alvo = acao.get("/D")
+            valido = alvo is None or _pagina_destino(alvo, nomeados) in estado.paginas
+            if valido or filhos:
+                nos.append({"item": item, "filhos": filhos, "valido": valido, "numero": copiador.writer.reservar()})
+            item = item.get("/Next")
+        return nos
+
+    def gravar(nos, pai):
+        """Grava `nos` (filhos de `pai`) e retorna quantos ficam visíveis com `pai` aberto."""
+        visiveis = 0
+        for i, no in enumerate(nos):
+            extras = {"/Parent": f"{pai} 0 R".encode()}
+            if i > 0:
+                extras["/Prev"] = f"{nos[i - 1]['numero']} 0 R".encode()
+            if i < len(nos) - 1:
+                extras["/Next"] = f"{nos[i + 1]['numero']} 0 R".encode()
+            aberto = int(no["item"].get("/Count", 0)) > 0
+            if no["filhos"]:
+                abaixo = gravar(no["filhos"], no["numero"])
+                extras["/First"] = f"{no['filhos'][0]['numero']} 0 R".encode()
+                extras["/Last"] = f"{no['filhos'][-1]['numero']} 0 R".encode()
+                extras["/Count"] = str(abaixo if aberto else -abaixo).encode()
+                visiveis += abaixo if aberto else 0
+            ignorar = _CHAVES_MARCADOR if no["valido"] else _CHAVES_MARCADOR | {"/Dest", "/A"}
+            copiador.writer.gravar(no["numero"], copiador._dicionario(no["item"], estado, extras, ignorar))
+            visiveis += 1
+        return visiveis
+
+    catalogo = estado.leitor.trailer["/Root"]
+    raiz = catalogo.get("/Outlines")
+    nos = podar(raiz.get("/First")) if raiz is not None else []
+    if not nos:
+        return None
+    numero = copiador.writer.reservar()
+    total = gravar(nos, numero)
+    copiador.writer.gravar(numero, f"<< /Type /Outlines /First {nos[0]['numero']} 0 R /Last {nos[-1]['numero']} 0 R /Count {total} >>".encode())
+    return numero
+
+
+def operar_paginas(entrada, saida, operacoes):
+    """
+    Reordena, remove, extrai, gira e insere páginas em branco em um PDF sem
+    extrair texto nem renderizar nada: a árvore de páginas é remontada e
+    cada página é copiada como está (streams ainda comprimidos) direto para
+    a saída. Links internos, marcadores e destinos nomeados que apontam para
+    páginas que continuam no documento são preservados, mesmo se elas
+    mudarem de posição, assim como as informações do documento (/Info).
+    Rótulos de página (/PageLabels), campos de formulário (/AcroForm) e as
+    outras árvores de /Names (arquivos anexos, JavaScript) não são copiados.
+
+    Args:
+        entrada (str): PDF de origem.
+        saida (str): PDF de saída (pode ser o próprio `entrada`).
+        operacoes (list | str): Tuplas de `planejar_paginas` ou texto de `ler_operacoes`.
+
+    Returns:
+        bool: True se o PDF foi gravado, False caso contrário.
+    """
+    mesmo_arquivo = os.path.abspath(entrada) == os.path.abspath(saida)
+    destino = f"{saida}.tmp" if mesmo_arquivo else saida
+    estado = None
+    try:
+        if isinstance(operacoes, str):
+            operacoes = ler_operacoes(operacoes)
+        estado = _EstadoLeitor(entrada)
+        paginas = estado.leitor.pages
+        plano = planejar_paginas(len(paginas), operacoes)
+        with StreamingPdfWriter(destino, versao="1.7") as writer:
+            copiador = _CopiadorPdf(writer)
+            # Números reservados antes da cópia: links para páginas que vêm depois continuam válidos.
+            numeros = [writer.reservar() if indice is not None else None for indice, _ in plano]
+            for (indice, _), numero in zip(plano, numeros):
+                if indice is not None:
+                    estado.paginas.setdefault(paginas[indice].indirect_reference.idnum, numero)
+            for posicao, ((indice, rotacao), numero) in enumerate(zip(plano, numeros)):
+                if indice is None:
+                    writer.adicionar_pagina(*_tamanho_branca(plano, posicao, estado.leitor), b"")
+                    continue
+                pagina = paginas[indice]
+                nova_rotacao = int(pagina.get("/Rotate", 0)) + rotacao if rotacao else None
+                copiador.copiar_pagina(pagina, estado, numero, nova_rotacao)
+                estado.leitor.resolved_objects.clear()
+            nomeados = _destinos_nomeados(estado.leitor)
+            catalogo = _copiar_destinos(copiador, estado, nomeados)
+            marcadores = _copiar_marcadores(copiador, estado, nomeados)
+            if marcadores is not None:
+                catalogo["/Outlines"] = f"{marcadores} 0 R"
+            info = {chave: valor for chave, valor in (estado.leitor.metadata or {}).items() if isinstance(valor, str)}
+            writer.fechar(info=info or None, catalogo=catalogo)
+        estado.fechar()
+        estado = None
+        if mesmo_arquivo:
+            os.replace(destino, saida)
+        return True
+    except Exception as e:
+        print(f"❌ Erro nas operações de página: {e}")
+        if os.path.exists(destino):
+            os.remove(destino)
         return False
+    finally:
+        if estado is not None:
+            estado.fechar()
@@ -0,0 +1,424 @@
+import zlib
+import struct
+from io import BytesIO
+from PIL import Image
+
+# Imagens até 10% acima do alvo não compensam reduzir
+TOLERANCIA = 1.1
+
+_CORES = {"L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+_PNG_ASSINATURA = b"\x89PNG\r\n\x1a\n"
+ORIENTACAO_EXIF = 0x0112
+# Orientação EXIF -> transposição que deixa a imagem na posição de exibição
+_TRANSPOSICOES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+# Tipo de cor PNG -> (componentes, espaço de cor)
+_PNG_CORES = {0: (1, "/DeviceGray"), 2: (3, "/DeviceRGB"), 3: (1, None)}
+
+
+def _numero(valor):
+    """Formata um número para o PDF sem casas decimais desnecessárias."""
+    texto = f"{valor:.4f}".rstrip("0").rstrip(".")
+    return texto if texto not in ("", "-0") else "0"
+
+
+def _texto_pdf(texto):
+    """String PDF em UTF-16BE (aceita qualquer caractere)."""
+    return "<" + ("\ufeff" + str(texto)).encode("utf-16-be").hex().upper() + ">"
+
+
+def _gravar_objeto(arquivo, numero, geracao, corpo, stream=None):
+    arquivo.write(f"{numero} {geracao} obj\n".encode("latin-1"))
+    arquivo.write(corpo)
+    arquivo.write(b"\n")
+    if stream is not None:
+        arquivo.write(b"stream\n")
+        arquivo.write(stream)
+        arquivo.write(b"\nendstream\n")
+    arquivo.write(b"endobj\n")
+
+
+class StreamingPdfWriter:
+    """
+    Escritor de PDF mínimo que grava cada objeto no arquivo assim que ele
+    fica pronto. Só a tabela de offsets e a lista de páginas ficam na
+    memória, então o consumo não cresce com o tamanho das imagens já
+    gravadas. Usado na conversão de imagens e na mesclagem de PDFs, que
+    não precisam de layout.
+    """
+
+    def __init__(self, caminho, versao="1.5"):
+        self._arquivo = open(caminho, "wb")
+        self._offsets = {}
+        self._proximo = 1
+        self._paginas = []
+        self.raiz_paginas = self.reservar()
+        self._arquivo.write(f"%PDF-{versao}\n".encode("latin-1") + b"%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is None:
+            self.fechar()
+        else:
+            self._arquivo.close()
+
+    def reservar(self):
+        """Reserva o próximo número de objeto (todo número reservado precisa ser gravado)."""
+        numero = self._proximo
+        self._proximo += 1
+        return numero
+
+    def gravar(self, numero, corpo, stream=None):
+        """Grava o objeto `numero` com o corpo já serializado (bytes) e o stream opcional."""
+        self._offsets[numero] = self._arquivo.tell()
+        _gravar_objeto(self._arquivo, numero, 0, corpo, stream)
+
+    def registrar_pagina(self, numero):
+        """Acrescenta uma página já gravada (com /Parent em `raiz_paginas`) ao fim do documento."""
+        self._paginas.append(numero)
+
+    def _objeto(self, entradas, stream=None, numero=None):
+        numero = numero or self.reservar()
+        if stream is not None:
+            entradas = {**entradas, "/Length": str(len(stream))}
+        corpo = "<< " + " ".join(f"{chave} {valor}" for chave, valor in entradas.items()) + " >>"
+        self.gravar(numero, corpo.encode("latin-1"), stream)
+        return numero
+
+    def adicionar_imagem(self, imagem):
+        """Grava um XObject de imagem (ver `carregar_imagem`) e retorna o número do objeto."""
+        entradas = {
+            "/Type": "/XObject",
+            "/Subtype": "/Image",
+            "/Width": str(imagem["largura"]),
+            "/Height": str(imagem["altura"]),
+            "/ColorSpace": imagem["cor"],
+            "/BitsPerComponent": str(imagem.get("bpc", 8)),
+            "/Filter": imagem["filtro"],
+        }
+        if imagem.get("parametros"):
+            entradas["/DecodeParms"] = imagem["parametros"]
+        if imagem.get("decode"):
+            entradas["/Decode"] = imagem["decode"]
+        if imagem.get("smask"):
+            entradas["/SMask"] = f"{self.adicionar_imagem(imagem['smask'])} 0 R"
+        return self._objeto(entradas, imagem["dados"])
+
+    def adicionar_pagina(self, largura, altura, conteudo, xobjects=None):
+        """Grava uma página com o conteúdo (bytes) e os XObjects {nome: número} usados por ele."""
+        conteudo_num = self._objeto({}, conteudo)
+        recursos = ""
+        if xobjects:
+            recursos = "/XObject << " + " ".join(f"/{nome} {num} 0 R" for nome, num in xobjects.items()) + " >>"
+        pagina = self._objeto({
+            "/Type": "/Page",
+            "/Parent": f"{self.raiz_paginas} 0 R",
+            "/MediaBox": f"[0 0 {_numero(largura)} {_numero(altura)}]",
+            "/Resources": f"<< {recursos} >>",
+            "/Contents": f"{conteudo_num} 0 R",
+        })
+        self._paginas.append(pagina)
+        return pagina
+
+    def adicionar_pagina_imagem(self, imagem, largura, altura, x=0, y=0, largura_img=None, altura_img=None, matriz=None):
+        """
+        Página `largura` x `altura` pontos com a imagem desenhada em
+        (x, y, largura_img, altura_img). `matriz` substitui o posicionamento
+        padrão (usada, por exemplo, para girar a imagem).
+        """
+        imagem_num = self.adicionar_imagem(imagem)
+        if matriz is None:
+            matriz = (largura_img or largura, 0, 0, altura_img or altura, x, y)
+        conteudo = f"q {' '.join(_numero(v) for v in matriz)} cm /Im0 Do Q\n".encode("latin-1")
+        return self.adicionar_pagina(largura, altura, conteudo, {"Im0": imagem_num})
+
+    def fechar(self, info=None, catalogo=None):
+        """
+        Grava a árvore de páginas, o catálogo, a tabela xref e fecha o arquivo.
+        `catalogo` traz entradas extras do catálogo já serializadas, como
+        {"/Outlines": "12 0 R"}. Chamadas depois do fechamento são ignoradas.
+        """
+        if self._arquivo.closed:
+            return
+        kids = " ".join(f"{num} 0 R" for num in self._paginas)
+        self._objeto({"/Type": "/Pages", "/Kids": f"[{kids}]", "/Count": str(len(self._paginas))}, numero=self.raiz_paginas)
+        catalogo = self._objeto({"/Type": "/Catalog", "/Pages": f"{self.raiz_paginas} 0 R", **(catalogo or {})})
+        info_num = self._objeto({chave: _texto_pdf(valor) for chave, valor in (info or {"/Producer": "BorgePDF"}).items()})
+
+        inicio_xref = self._arquivo.tell()
+        linhas = [f"xref\n0 {self._proximo}\n", "0000000000 65535 f \n"]
+        linhas.extend(f"{self._offsets[num]:010d} 00000 n \n" for num in range(1, self._proximo))
+        linhas.append(f"trailer\n<< /Size {self._proximo} /Root {catalogo} 0 R /Info {info_num} 0 R >>\n")
+        linhas.append(f"startxref\n{inicio_xref}\n%%EOF\n")
+        self._arquivo.write("".join(linhas).encode("latin-1"))
+        self._arquivo.close()
+
+
+class AtualizacaoIncremental:
+    """
+    Acrescenta uma atualização incremental ao fim de um PDF existente: só os
+    objetos novos ou substituídos são gravados, seguidos de uma seção xref
+    (tabela ou stream, conforme a do arquivo) com /Prev apontando para a
+    anterior. Os bytes originais não são alterados nem relidos, então o
+    custo de salvar é proporcional ao tamanho da alteração. Se algo falhar
+    antes de `fechar`, o arquivo volta ao tamanho original.
+
+    `tamanho` é o /Size do trailer atual e `trailer` as entradas a repetir
+    ({"/Root": "1 0 R", "/Info": ..., "/ID": ...}, já serializadas).
+    """
+
+    def __init__(self, caminho, tamanho, trailer):
+        self._arquivo = open(caminho, "r+b")
+        self._inicio = self._arquivo.seek(0, 2)
+        self._arquivo.seek(max(0, self._inicio - 2048))
+        cauda = self._arquivo.read()
+        posicao = cauda.rfind(b"startxref")
+        if posicao < 0:
+            self._arquivo.close()
+            raise ValueError("startxref não encontrado: o PDF parece corrompido")
+        self.xref_anterior = int(cauda[posicao + len(b"startxref"):].split()[0])
+        self._arquivo.seek(self.xref_anterior)
+        self._xref_stream = self._arquivo.read(4) != b"xref"
+        self._arquivo.seek(self._inicio)
+        if not cauda.endswith(b"\n"):
+            self._arquivo.write(b"\n")
+        self._offsets = {}
+        self._proximo = tamanho
+        self._trailer = trailer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if tipo is None:
+            self.fechar()
+        else:
+            self._arquivo.truncate(self._inicio)
+            self._arquivo.close()
+
+    def reservar(self):
+        """Reserva um número de objeto novo (depois do /Size atual)."""
+        numero = self._proximo
+        self._proximo += 1
+        return numero
+
+    def gravar(self, numero, corpo, stream=None, geracao=0):
+        """Grava um objeto novo ou a nova versão de um objeto existente (mesmo número e geração)."""
+        self._offsets[numero] = (self._arquivo.tell(), geracao)
+        _gravar_objeto(self._arquivo, numero, geracao, corpo, stream)
+
+    def _trailer_entradas(self):
+        entradas = dict(self._trailer)
+        entradas["/Size"] = str(self._proximo)
+        entradas["/Prev"] = str(self.xref_anterior)
+        return entradas
+
+    def fechar(self):
+        inicio_xref = self._arquivo.tell()
+        if self._xref_stream:
+            self._gravar_xref_stream(inicio_xref)
+        else:
+            secoes = []
+            for numero in sorted(self._offsets):
+                if secoes and secoes[-1][0] + len(secoes[-1][1]) == numero:
+                    secoes[-1][1].append(numero)
+                else:
+                    secoes.append((numero, [numero]))
+            self._arquivo.write(b"xref\n")
+            for primeiro, numeros in secoes:
+                self._arquivo.write(f"{primeiro} {len(numeros)}\n".encode("latin-1"))
+                for numero in numeros:
+                    offset, geracao = self._offsets[numero]
+                    self._arquivo.write(f"{offset:010d} {geracao:05d} n\r\n".encode("latin-1"))
+            trailer = " ".join(f"{chave} {valor}" for chave, valor in self._trailer_entradas().items())
+            self._arquivo.write(f"trailer\n<< {trailer} >>\n".encode("latin-1"))
+        self._arquivo.write(f"startxref\n{inicio_xref}\n%%EOF\n".encode("latin-1"))
+        self._arquivo.close()
+
+    def _gravar_xref_stream(self, inicio_xref):
+        # Arquivos com xref em stream recebem a atualização no mesmo formato.
+        numero_xref = self.reservar()
+        self._offsets[numero_xref] = (inicio_xref, 0)
+        largura = max(4, (inicio_xref.bit_length() + 7) // 8)
+        linhas = []
+        indice = []
+        for numero in sorted(self._offsets):
+            offset, geracao = self._offsets[numero]
+            linhas.append(b"\x01" + offset.to_bytes(largura, "big") + geracao.to_bytes(2, "big"))
+            indice.append(f"{numero} 1")
+        entradas = self._trailer_entradas()
+        entradas.update({
+            "/Type": "/XRef",
+            "/W": f"[1 {largura} 2]",
+            "/Index": f"[{' '.join(indice)}]",
+            "/Filter": "/FlateDecode",
+        })
+        dados = zlib.compress(b"".join(linhas))
+        entradas["/Length"] = str(len(dados))
+        corpo = "<< " + " ".join(f"{chave} {valor}" for chave, valor in entradas.items()) + " >>"
+        _gravar_objeto(self._arquivo, numero_xref, 0, corpo.encode("latin-1"), dados)
+
+
+def _imagem_jpeg(caminho, img):
+    """JPEG embutido como está (DCTDecode), sem decodificar."""
+    with open(caminho, "rb") as f:
+        dados = f.read()
+    imagem = {"largura": img.width, "altura": img.height, "cor": _CORES[img.mode], "filtro": "/DCTDecode", "dados": dados}
+    if img.mode == "CMYK" and "adobe" in img.info:
+        imagem["decode"] = "[1 0 1 0 1 0 1 0]"  # JPEGs CMYK da Adobe são gravados invertidos
+    return imagem
+
+
+def _imagem_png(caminho):
+    """
+    PNG embutido sem decodificar: os blocos IDAT já são um stream Flate com
+    preditores PNG, que o PDF aceita diretamente. Retorna None para os casos
+    que exigem decodificação (entrelaçado, transparência, 16 bits com paleta).
+    """
+    with open(caminho, "rb") as f:
+        if f.read(8) != _PNG_ASSINATURA:
+            return None
+        idat = []
+        paleta = None
+        cabecalho = None
+        while True:
+            bruto = f.read(8)
+            if len(bruto) < 8:
+                return None
+            tamanho, tipo = struct.unpack(">I4s", bruto)
+            dados = f.read(tamanho)
+            f.read(4)  # CRC
+            if tipo == b"IHDR":
+                cabecalho = struct.unpack(">IIBBBBB", dados)
+            elif tipo == b"PLTE":
+                paleta = dados
+            elif tipo == b"tRNS":
+                return None
+            elif tipo == b"IDAT":
+                idat.append(dados)
+            elif tipo == b"IEND":
+                break
+
+    if cabecalho is None:
+        return None
+    largura, altura, bits, tipo_cor, _, _, entrelacado = cabecalho
+    if entrelacado or tipo_cor not in _PNG_CORES or (tipo_cor == 3 and (bits > 8 or not paleta)):
+        return None
+    componentes, cor = _PNG_CORES[tipo_cor]
+    if tipo_cor == 3:
+        cor = f"[/Indexed /DeviceRGB {len(paleta) // 3 - 1} <{paleta.hex().upper()}>]"
+    return {
+        "largura": largura,
+        "altura": altura,
+        "cor": cor,
+        "bpc": bits,
+        "filtro": "/FlateDecode",
+        "parametros": f"<< /Predictor 15 /Colors {componentes} /BitsPerComponent {bits} /Columns {largura} >>",
+        "dados": b"".join(idat),
+    }
+
+
+def _imagem_decodificada(img, jpeg=False, qualidade=90):
+    """Codifica uma imagem já decodificada: JPEG para fotos, Flate (sem perdas) para o resto."""
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    elif img.mode not in ("L", "RGB", "CMYK", "RGBA", "LA"):
+        img = img.convert("RGBA" if "A" in img.mode else ("L" if img.mode in ("1", "I", "I;16", "F") else "RGB"))
+
+    smask = None
+    if img.mode in ("RGBA", "LA"):
+        alfa = img.getchannel("A")
+        if alfa.getextrema() != (255, 255):
+            smask = _imagem_decodificada(alfa)
+        img = img.convert(img.mode[:-1] if img.mode == "LA" else "RGB")
+
+    if jpeg and img.mode in ("L", "RGB"):
+        saida = BytesIO()
+        img.save(saida, format="JPEG", quality=qualidade)
+        imagem = {"filtro": "/DCTDecode", "dados": saida.getvalue()}
+    else:
+        imagem = {"filtro": "/FlateDecode", "dados": zlib.compress(img.tobytes(), 6)}
+    imagem.update({"largura": img.width, "altura": img.height, "cor": _CORES[img.mode]})
+    if smask is not None:
+        imagem["smask"] = smask
+    return imagem
+
+
+def orientacao_exif(img):
+    """Valor da tag EXIF Orientation (1 a 8) de uma imagem aberta; 1 se ausente."""
+    try:
+        orientacao = img.getexif().get(ORIENTACAO_EXIF, 1)
+    except Exception:
+        return 1
+    return orientacao if orientacao in range(1, 9) else 1
+
+
+def matriz_orientacao(orientacao, x, y, largura, altura):
+    """
+    Matriz `cm` que desenha a imagem armazenada já na orientação EXIF, na
+    caixa (x, y, largura, altura) medida como ela é exibida. Permite girar
+    ou espelhar JPEGs sem recodificá-los.
+    """
+    return {
+        1: (largura, 0, 0, altura, x, y),
+        2: (-largura, 0, 0, altura, x + largura, y),
+        3: (-largura, 0, 0, -altura, x + largura, y + altura),
+        4: (largura, 0, 0, -altura, x, y + altura),
+        5: (0, -altura, -largura, 0, x + largura, y + altura),
+        6: (0, -altura, largura, 0, x, y + altura),
+        7: (0, altura, largura, 0, x, y),
+        8: (0, altura, -largura, 0, x + largura, y),
+    }[orientacao]
+
+
+def carregar_imagem(caminho, alvo_px=None, qualidade=90):
+    """
+    Prepara um arquivo de imagem para `StreamingPdfWriter.adicionar_imagem`.
+
+    JPEGs e PNGs que cabem em `alvo_px` (largura, altura em pixels, na
+    orientação armazenada) são embutidos sem decodificar nem recodificar;
+    a orientação EXIF fica em `imagem["orientacao"]` para ser aplicada no
+    desenho (`matriz_orientacao`). Imagens maiores são reduzidas já no
+    decodificador (`draft` para JPEG, `reduce` para os demais) antes do
+    ajuste fino; os outros formatos são decodificados e gravados sem perdas.
+    Imagens decodificadas saem já giradas (orientação 1).
+    """
+    with Image.open(caminho) as img:
+        largura, altura = img.size
+        orientacao = orientacao_exif(img)
+        reduzir = alvo_px is not None and (largura > alvo_px[0] * TOLERANCIA or altura > alvo_px[1] * TOLERANCIA)
+        imagem = None
+        if not reduzir:
+            if img.format == "JPEG" and img.mode in _CORES:
+                imagem = _imagem_jpeg(caminho, img)
+            elif img.format == "PNG":
+                imagem = _imagem_png(caminho)
+            if imagem is not None:
+                imagem["orientacao"] = orientacao
+                return imagem
+
+        formato = img.format
+        if reduzir and formato == "JPEG":
+            img.draft(img.mode, alvo_px)
+        elif reduzir:
+            fator = int(min(largura / alvo_px[0], altura / alvo_px[1]))
+            if fator >= 2:
+                img = img.reduce(fator)
+        if reduzir:
+            img.thumbnail(alvo_px, Image.LANCZOS)
+        else:
+            img.load()
+        if orientacao != 1:
+            img = img.transpose(_TRANSPOSICOES[orientacao])
+        imagem = _imagem_decodificada(img, jpeg=(reduzir and formato == "JPEG"), qualidade=qualidade)
+        imagem["orientacao"] = 1
+        return imagem
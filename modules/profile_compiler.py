@@ -0,0 +1,117 @@
+import copy
+import json
+from types import MappingProxyType
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import TableStyle
+
+from constants.globals import temas, modelos_pagina
+from .disk_cache import MemoryLRU, chave_hash
+from .font_registry import fontes
+from .validations import validar_fonte
+
+# Perfis já compilados neste processo, pela chave do conteúdo da configuração
+_compilados = MemoryLRU(32)
+
+_ALINHAMENTOS = {"esquerda": 0, "centro": 1, "justificado": 4}
+
+# Chaves da configuração que a compilação lê; as demais não mudam o perfil compilado
+CHAVES_PERFIL = (
+    "margem_esq", "margem_dir", "margem_sup", "margem_inf", "fonte", "tamanho_fonte",
+    "espacamento_linha", "alinhamento", "verificar_titulos", "tema", "tabela_estilo",
+    "tabela_estilos", "modelo_pagina", "diretorios_fontes",
+)
+
+
+def chave_config(config):
+    """Chave estável do conteúdo de uma configuração."""
+    return chave_hash(json.dumps(config, sort_keys=True, ensure_ascii=False, default=str))
+
+
+class PerfilCompilado:
+    """
+    Uma configuração validada e convertida, uma única vez, no que a
+    diagramação usa: página e margens em pontos, estilos de parágrafo,
+    estilo de tabela, modelo de página e fontes já registradas.
+
+    O objeto é imutável e compartilhado entre todos os documentos do
+    processo com a mesma configuração; os estilos não devem ser alterados
+    (crie um ParagraphStyle com `parent=` para variações).
+    """
+
+    def __init__(self, config):
+        atributos = {}
+        atributos["_valores"] = MappingProxyType({chave: copy.deepcopy(config.get(chave)) for chave in CHAVES_PERFIL})
+
+        for diretorio in config.get("diretorios_fontes", []):
+            fontes().adicionar_diretorio(diretorio)
+
+        pagesize = A4
+        margens = tuple(config.get(chave, padrao) * mm for chave, padrao in (
+            ("margem_esq", 40), ("margem_dir", 40), ("margem_sup", 50), ("margem_inf", 50)))
+        atributos["pagesize"] = pagesize
+        atributos["margens"] = margens
+        atributos["doc_width"] = pagesize[0] - margens[0] - margens[1]
+        atributos["doc_height"] = pagesize[1] - margens[2] - margens[3]
+
+        tema = temas.get(config.get("tema", "moderno"), temas["moderno"])
+        fonte = validar_fonte(config.get("fonte", "Helvetica"))
+        fonte_negrito = validar_fonte(fonte, bold=True)
+        atributos["styles"] = MappingProxyType(self._estilos(config, tema, fonte, fonte_negrito))
+
+        estilo_tabela = config.get("tabela_estilos", {}).get(config.get("tabela_estilo", "simples"), [])
+        atributos["table_style"] = TableStyle(estilo_tabela)
+        atributos["modelo_pagina"] = MappingProxyType(
+            modelos_pagina.get(config.get("modelo_pagina", "padrao"), modelos_pagina["padrao"]))
+
+        for nome, valor in atributos.items():
+            object.__setattr__(self, nome, valor)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("PerfilCompilado é imutável")
+
+    def serve_para(self, config):
+        """True se `config` compila para este mesmo perfil (mesmos valores em `CHAVES_PERFIL`)."""
+        return all(config.get(chave) == valor for chave, valor in self._valores.items())
+
+    @staticmethod
+    def _estilos(config, tema, fonte, fonte_negrito):
+        tamanho = config.get("tamanho_fonte", 12)
+        espacamento = config.get("espacamento_linha", 1.15)
+        alinhamento = _ALINHAMENTOS.get(config.get("alinhamento", "justificado"), 4)
+        # O controle de viúvas/órfãs é feito pelo layout do frame, não pelo parser.
+        allow_widows = 0 if config.get("verificar_titulos", True) else 1
+        texto, titulo = tema["cor_texto"], tema["cor_titulo"]
+        return {
+            "Body": ParagraphStyle(name="Body", fontSize=tamanho, fontName=fonte, textColor=texto, spaceAfter=6, leading=tamanho * espacamento, alignment=alinhamento, allowWidows=allow_widows, allowOrphans=0),
+            "Heading1": ParagraphStyle(name="Heading1", fontSize=tamanho + 4, fontName=fonte_negrito, textColor=titulo, spaceAfter=10, keepWithNext=1),
+            "Heading2": ParagraphStyle(name="Heading2", fontSize=tamanho + 2, fontName=fonte_negrito, textColor=titulo, spaceAfter=8, keepWithNext=1),
+            "ListItem": ParagraphStyle(name="ListItem", fontSize=tamanho, fontName=fonte, textColor=texto, leftIndent=20, spaceAfter=4, allowWidows=allow_widows, allowOrphans=0),
+            "Footnote": ParagraphStyle(name="Footnote", fontSize=tamanho - 2, fontName=fonte, textColor=texto, spaceAfter=4),
+            "Code": ParagraphStyle(name="Code", fontSize=tamanho - 2, fontName="Courier", textColor=texto, leading=(tamanho - 2) * 1.2, leftIndent=10, spaceAfter=6),
+            "CoverTitle": ParagraphStyle(name="CapaTitulo", fontSize=24, fontName=fonte_negrito, alignment=1, spaceAfter=20),
+            "CoverAuthor": ParagraphStyle(name="CapaAutor", fontSize=16, fontName=fonte, alignment=1, spaceAfter=20),
+            "CoverDate": ParagraphStyle(name="CapaData", fontSize=12, fontName=fonte, alignment=1),
+        }
+
+
+def perfil_em_cache(chave):
+    """`PerfilCompilado` guardado sob `chave` por `compilar_perfil`, ou None."""
+    return _compilados.obter(chave)
+
+
+def compilar_perfil(config, chave=None):
+    """
+    Retorna o `PerfilCompilado` de `config`, compilando-o só na primeira vez
+    em que essa configuração aparece no processo. `chave` (por exemplo, nome
+    do perfil + mtime do arquivo) evita serializar a configuração para
+    calcular a chave do conteúdo; sem ela, só as `CHAVES_PERFIL` entram na
+    chave, então configurações que diferem em outras opções compartilham o perfil.
+    """
+    chave = chave or chave_config({nome: config.get(nome) for nome in CHAVES_PERFIL})
+    perfil = _compilados.obter(chave)
+    if perfil is None:
+        perfil = PerfilCompilado(config)
+        _compilados.guardar(chave, perfil)
+    return perfil
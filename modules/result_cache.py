@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import hashlib
+import tempfile
+import threading
+
+from configs.config import CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from .disk_cache import DiskLRUCache, processo_vivo
+
+_cache_padrao = None
+
+
+# Imagens citadas no Markdown: ![alt](src), <img src="..."> e definições [id]: src.
+# Pegar caminhos a mais só deixa a chave mais estrita.
+_IMAGENS_MARKDOWN = re.compile(
+    r"""!\[[^\]]*\]\(\s*<?([^)\s>]+)"""
+    r"""|<img\b[^>]*?\bsrc\s*=\s*["']([^"']+)["']"""
+    r"""|^ {0,3}\[[^\]]+\]:\s*<?([^\s>]+)""",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _arquivos_referenciados(conversor, entradas, config):
+    """Caminhos que a conversão lê além das entradas: imagens da configuração e do Markdown."""
+    caminhos = [config.get(campo) for campo in ("imagem_fundo", "capa_imagem_path")] if config else []
+    if conversor == "txt":
+        for caminho in entradas:
+            with open(caminho, encoding="utf-8", errors="replace") as f:
+                for achado in _IMAGENS_MARKDOWN.finditer(f.read()):
+                    caminhos.append(next(g for g in achado.groups() if g))
+    return [c for c in caminhos if c and "://" not in c]
+
+
+def chave_conversao(conversor, entradas, config=None, opcoes=None):
+    """
+    Calcula a chave de cache de uma conversão: hash do conversor, das opções,
+    da configuração efetiva e dos bytes de cada arquivo de entrada, na ordem.
+    Os nomes dos arquivos não entram na chave. Arquivos referenciados (imagem
+    de fundo, de capa e imagens do Markdown) entram por caminho, tamanho e
+    mtime, para que trocar uma imagem no disco não reaproveite o PDF antigo.
+    """
+    h = hashlib.sha256()
+    for parte in (conversor, json.dumps(opcoes or {}, sort_keys=True, default=str),
+                  json.dumps(config or {}, sort_keys=True, default=str)):
+        dados = parte.encode("utf-8")
+        h.update(len(dados).to_bytes(8, "big"))
+        h.update(dados)
+    for caminho in entradas:
+        h.update(os.path.getsize(caminho).to_bytes(8, "big"))
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(bloco)
+    for caminho in _arquivos_referenciados(conversor, entradas, config):
+        try:
+            info = os.stat(caminho)
+            assinatura = f"{caminho}\0{info.st_size}\0{info.st_mtime_ns}"
+        except OSError:
+            assinatura = f"{caminho}\0ausente"  # Se aparecer depois, a chave muda
+        dados = assinatura.encode("utf-8")
+        h.update(len(dados).to_bytes(8, "big"))
+        h.update(dados)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache de PDFs gerados, com remoção LRU sob um orçamento de disco.
+
+    `obter_ou_gerar` agrupa pedidos idênticos simultâneos: o primeiro a chegar
+    cria um arquivo de trava `<chave>.lock` e gera o PDF; os demais (threads ou
+    processos que compartilham o diretório) esperam a trava sumir e usam o
+    resultado do cache em vez de repetir a conversão.
+
+    A trava guarda `host:pid` de quem gera e tem o mtime renovado a cada
+    `batimento` segundos enquanto a geração dura. Uma trava cujo processo
+    morreu (mesmo host) ou que ficou mais de 3 batimentos sem renovação é
+    considerada abandonada e assumida por quem está esperando.
+    """
+
+    def __init__(self, diretorio, max_bytes, espera_maxima=1800, intervalo=0.2, batimento=10):
+        self._disco = DiskLRUCache(diretorio, max_bytes, extensao=".pdf")
+        self.diretorio = diretorio
+        self.espera_maxima = espera_maxima
+        self.intervalo = intervalo
+        self.batimento = batimento
+
+    def obter(self, chave):
+        """Retorna o caminho do PDF em cache ou None."""
+        return self._disco.obter_caminho(chave)
+
+    def obter_ou_gerar(self, chave, gerar):
+        """
+        Retorna `(caminho, acerto)`. Em caso de falta, chama `gerar(caminho_saida)`,
+        que deve gravar o PDF e retornar True em caso de sucesso. Retorna
+        `(None, False)` se a geração falhar.
+
+        O caminho pode ser removido pela política LRU a qualquer momento; para
+        entregar o arquivo, use `abrir_ou_gerar`.
+        """
+        while True:
+            caminho = self.obter(chave)
+            if caminho is not None:
+                return caminho, True
+            trava = self._travar(chave)
+            if trava is not None:
+                break
+            self._esperar(chave)
+
+        terminou = threading.Event()
+        batimentos = threading.Thread(target=self._renovar, args=(trava, terminou), daemon=True)
+        batimentos.start()
+        try:
+            caminho = self.obter(chave)  # Outro processo pode ter terminado entre as duas checagens
+            if caminho is not None:
+                return caminho, True
+            fd, temporario = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            try:
+                if not gerar(temporario):
+                    return None, False
+                return self._disco.guardar_arquivo(chave, temporario), False
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+        finally:
+            terminou.set()
+            batimentos.join()
+            self._liberar(trava)
+
+    def abrir_ou_gerar(self, chave, gerar, tentativas=3):
+        """
+        Como `obter_ou_gerar`, mas retorna `(arquivo aberto em modo binário, acerto)`.
+        Com o arquivo aberto, a remoção LRU não afeta quem o está lendo; se a
+        entrada sumir antes da abertura, ela é obtida (ou gerada) de novo.
+        """
+        for _ in range(tentativas):
+            caminho, acerto = self.obter_ou_gerar(chave, gerar)
+            if caminho is None:
+                return None, False
+            try:
+                return open(caminho, "rb"), acerto
+            except FileNotFoundError:
+                continue
+        return None, False
+
+    def _caminho_trava(self, chave):
+        return self._disco.caminho(chave) + ".lock"
+
+    def _travar(self, chave):
+        caminho = self._caminho_trava(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        try:
+            fd = os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        os.write(fd, f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}".encode())
+        os.close(fd)
+        return caminho
+
+    def _renovar(self, trava, terminou):
+        while not terminou.wait(self.batimento):
+            try:
+                os.utime(trava, None)
+            except OSError:
+                return
+
+    def _liberar(self, trava):
+        try:
+            os.remove(trava)
+        except OSError:
+            pass
+
+    def _esperar(self, chave):
+        """Espera a geração em andamento terminar; remove travas abandonadas."""
+        caminho = self._caminho_trava(chave)
+        inicio = time.time()
+        while True:
+            try:
+                with open(caminho, encoding="utf-8") as f:
+                    dono = f.read()
+                idade = time.time() - os.path.getmtime(caminho)
+            except OSError:
+                return  # A trava sumiu: a geração terminou (ou falhou)
+            if self._abandonada(dono, idade) or time.time() - inicio > self.espera_maxima:
+                self._assumir(caminho, dono)
+                return
+            time.sleep(self.intervalo)
+
+    def _abandonada(self, dono, idade):
+        if idade > 3 * self.batimento:
+            return True
+        host, _, resto = dono.partition(":")
+        pid = resto.partition(":")[0]
+        return host == socket.gethostname() and pid.isdigit() and not processo_vivo(int(pid))
+
+    def _assumir(self, caminho, dono):
+        """
+        Remove uma trava abandonada, desde que ainda seja a mesma que foi
+        examinada: outro processo pode tê-la assumido e criado uma nova.
+        """
+        descartada = f"{caminho}.{uuid.uuid4().hex}"
+        try:
+            os.rename(caminho, descartada)
+        except OSError:
+            return
+        try:
+            with open(descartada, encoding="utf-8") as f:
+                outra = f.read() != dono
+            if outra:
+                os.link(descartada, caminho)  # Devolve a trava nova; falha se já houver outra
+        except OSError:
+            pass
+        finally:
+            self._liberar(descartada)
+
+
+def cache_resultados():
+    """Instância do cache de resultados compartilhada pelo processo."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = ResultCache(os.path.join(CACHE_DIR, "resultados"), RESULT_CACHE_MAX_BYTES)
+    return _cache_padrao
@@ -1,9 +1,8 @@
 import os
 import re
 from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.pdfmetrics import getRegisteredFontNames
-from reportlab.pdfbase.ttfonts import TTFont
+
+from .font_registry import fontes
 
 # Validação de cores
 def validar_cor(cor):
@@ -16,35 +15,24 @@ def validar_cor(cor):
 
 # Validação de fontes
 def validar_fonte(fonte, bold=False, regular=False):
-    fontes_disponiveis = getRegisteredFontNames()
-    fonte_base = fonte
-    fonte_completa = f"{fonte}-Bold" if bold else fonte
-    fontes_completa = f"{fonte}-Regular" if regular else fonte
-    if fonte_completa in fontes_disponiveis:
-        return fonte_completa
-    if fonte_base in fontes_disponiveis:
-        return fonte_base
-    print(f"⚠️ Fonte '{fonte_completa}' não encontrada. Usando 'Helvetica'.")
+    nome = fontes().resolver(fonte, bold=bold)
+    if nome:
+        return nome
+    print(f"⚠️ Fonte '{f'{fonte}-Bold' if bold else fonte}' não encontrada. Usando 'Helvetica'.")
     return "Helvetica"
 
 
 # Registrar fontes
 def registrar_fontes():
-    fontes_padrao = [
-        "Helvetica",
-        "Times-Roman",
-        "Courier",
-        "Roboto"
-    ]  # Fontes embutidas do ReportLab
     diretorio_fontes = (
         input(
-            "📂 Diretório das fontes .ttf (ex.: /sdcard/fonts, ou Enter para usar fontes padrão): "
+            "📂 Diretório extra de fontes .ttf (ex.: /sdcard/fonts, ou Enter para usar as fontes do projeto): "
         )
         or ""
     )
 
     if not diretorio_fontes:
-        print("ℹ️ Usando fontes padrão do ReportLab (Helvetica, Times-Roman, Courier).")
+        print("ℹ️ Usando as fontes padrão do ReportLab e as da pasta fonts/.")
         return
 
     if not os.path.isdir(diretorio_fontes):
@@ -53,17 +41,9 @@ def registrar_fontes():
         )
         return
 
-    for arquivo in os.listdir(diretorio_fontes):
-        if arquivo.endswith(".ttf"):
-            try:
-                caminho = os.path.join(diretorio_fontes, arquivo)
-                nome_fonte = os.path.splitext(arquivo)[0]
-                pdfmetrics.registerFont(TTFont(nome_fonte, caminho))
-                print(f"✅ Fonte '{nome_fonte}' registrada com sucesso.")
-            except Exception as e:
-                print(
-                    f"⚠️ Erro ao registrar fonte '{arquivo}': {str(e)}. Usando fonte padrão."
-                )
+    # As fontes só são lidas quando usadas; aqui elas apenas entram no índice.
+    novas = fontes().adicionar_diretorio(diretorio_fontes)
+    print(f"✅ {novas} fonte(s) de '{diretorio_fontes}' disponível(is).")
 
 # Validação de tabelas Markdown
 def validar_tabela_markdown(texto):